@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import gc
+import os
+import copy
+import time
+import argparse
+
+from transform import apply_mapping, apply_defaults_with_skip, compile_transform, load_json_file
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECORDS_DEFAULT = 100000
+REPEAT_DEFAULT = 3
+
+
+def make_records(template, count):
+    """
+    'count' copies of the sample input record with distinct values, so the
+    benchmark isn't measuring a single hot record.
+    """
+    records = []
+    for i in range(count):
+        record = copy.deepcopy(template)
+        for k, v in record.items():
+            if isinstance(v, str):
+                record[k] = f"{v}{i % 1000}" if k != "status" else v
+        records.append(record)
+    return records
+
+
+def best_time(func, repeat):
+    """
+    Best wall time of 'repeat' runs, with the garbage collector off (as timeit
+    does) so collections triggered by the other variant don't add noise.
+    """
+    best = None
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            gc.collect()
+    finally:
+        gc.enable()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the interpreted mapping (apply_mapping + apply_defaults_with_skip) with the "
+            "compiled one (compile_transform) on the sample specs of this folder."
+        )
+    )
+    parser.add_argument('--input-json', default=os.path.join(HERE, 'input.json'),
+                        help="JSON array whose first record is used as the template.")
+    parser.add_argument('--from-to-json', default=os.path.join(HERE, 'from_to.sample.json'))
+    parser.add_argument('--mapping-json', default=os.path.join(HERE, 'mapping.sample.json'))
+    parser.add_argument('--default-values-json', default=os.path.join(HERE, 'default_values.sample.json'))
+    parser.add_argument('--records', type=int, default=RECORDS_DEFAULT,
+                        help=f"Number of records to transform (default: {RECORDS_DEFAULT})")
+    parser.add_argument('--repeat', type=int, default=REPEAT_DEFAULT,
+                        help=f"Runs per variant, the best one is reported (default: {REPEAT_DEFAULT})")
+    args = parser.parse_args()
+
+    from_to_map = load_json_file(args.from_to_json)
+    value_mapping = load_json_file(args.mapping_json)
+    default_values = load_json_file(args.default_values_json)
+    records = make_records(load_json_file(args.input_json)[0], args.records)
+
+    def interpreted():
+        out = []
+        for obj in records:
+            out_obj = apply_mapping(obj, from_to_map, value_mapping)
+            apply_defaults_with_skip(out_obj, default_values)
+            out.append(out_obj)
+        return out
+
+    transform_record = compile_transform(from_to_map, value_mapping, default_values)
+
+    def compiled():
+        return [transform_record(obj) for obj in records]
+
+    if interpreted() != compiled():
+        print("[ERROR] Compiled and interpreted mappings give different records.")
+        raise SystemExit(1)
+
+    interpreted_time = best_time(interpreted, args.repeat)
+    compiled_time = best_time(compiled, args.repeat)
+    print(f"{args.records} records, best of {args.repeat}:")
+    print(f"  interpreted: {interpreted_time:.3f}s ({args.records / interpreted_time:,.0f} records/s)")
+    print(f"  compiled:    {compiled_time:.3f}s ({args.records / compiled_time:,.0f} records/s)")
+    print(f"  speedup:     {interpreted_time / compiled_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
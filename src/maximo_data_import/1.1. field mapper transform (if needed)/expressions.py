@@ -0,0 +1,550 @@
+import ast
+import time
+import inspect
+import functools
+import operator
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+DATE_MEMO_SIZE = 65536  # distinct (value, formats) remembered by date()
+
+# name -> (function, elementwise). An elementwise function called with a list
+# as its first argument is applied to every element of the list.
+EXPRESSION_FUNCTIONS = {}
+
+# expression text -> [evaluations, nanoseconds], filled when timing is on.
+EXPRESSION_STATS = {}
+_timing = False
+
+# Formats date() tries after ISO 8601 when it has no 'in_format', see set_date_formats.
+_date_formats = ()
+
+
+class ExpressionError(ValueError):
+    """
+    An expression that can't be compiled: syntax error, unknown function or
+    a construct outside of the expression language.
+    """
+
+
+def expression_function(name, elementwise=True):
+    """
+    Register a function callable from expressions under `name`. Functions
+    must be pure (same arguments, same result): calls with constant arguments
+    are evaluated once at compile time.
+    """
+    def decorator(function):
+        EXPRESSION_FUNCTIONS[name] = (function, elementwise)
+        return function
+    return decorator
+
+
+@expression_function("concat", elementwise=False)
+def concat(*values):
+    return "".join(str(value) for value in values if value is not None)
+
+
+@expression_function("coalesce", elementwise=False)
+def coalesce(*values):
+    """
+    The first value that is neither null nor an empty string.
+    """
+    for value in values:
+        if value is not None and value != "":
+            return value
+    return None
+
+
+@expression_function("len", elementwise=False)
+def length(value):
+    return None if value is None else len(value)
+
+
+@expression_function("str")
+def to_str(value):
+    return "" if value is None else str(value)
+
+
+@expression_function("upper")
+def upper(value):
+    return None if value is None else str(value).upper()
+
+
+@expression_function("lower")
+def lower(value):
+    return None if value is None else str(value).lower()
+
+
+@expression_function("trim")
+def trim(value):
+    return None if value is None else str(value).strip()
+
+
+@expression_function("left")
+def left(value, count):
+    return None if value is None else str(value)[:count]
+
+
+@expression_function("right")
+def right(value, count):
+    if value is None:
+        return None
+    return str(value)[-count:] if count else ""
+
+
+@expression_function("substr")
+def substr(value, start, count=None):
+    """
+    'count' characters of the value from 'start' (0-based), or the rest of it.
+    """
+    if value is None:
+        return None
+    text = str(value)
+    return text[start:] if count is None else text[start:start + count]
+
+
+@expression_function("lpad")
+def lpad(value, width, fill="0"):
+    return None if value is None else str(value).rjust(width, fill)
+
+
+@expression_function("replace")
+def replace(value, old, new):
+    return None if value is None else str(value).replace(old, new)
+
+
+@expression_function("split")
+def split(value, separator, index):
+    """
+    Part 'index' of the value split on 'separator', null when there's no such part.
+    """
+    if value is None:
+        return None
+    parts = str(value).split(separator)
+    return parts[index] if -len(parts) <= index < len(parts) else None
+
+
+@expression_function("to_int")
+def to_int(value):
+    """
+    The value as an integer ('12', '12.0', 12.7 -> 12), null when it isn't a number.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+
+@expression_function("to_float")
+def to_float(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@expression_function("round")
+def round_number(value, digits=0):
+    """
+    The value rounded half up (2.5 -> 3) to 'digits' decimals, an integer
+    without 'digits'.
+    """
+    number = to_float(value)
+    if number is None or number != number or number in (float("inf"), float("-inf")):
+        return None
+    rounded = Decimal(repr(number)).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP)
+    return float(rounded) if digits else int(rounded)
+
+
+@functools.lru_cache(maxsize=DATE_MEMO_SIZE)
+def reformat_date(value, in_format, out_format):
+    if in_format:
+        try:
+            parsed = datetime.strptime(value, in_format)
+        except ValueError:
+            return None
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            for fmt in _date_formats:
+                try:
+                    parsed = datetime.strptime(value, fmt)
+                    break
+                except ValueError:
+                    pass
+            else:
+                return None
+    return parsed.strftime(out_format) if out_format else parsed.isoformat()
+
+
+def set_date_formats(formats):
+    """
+    The strptime formats date() tries after ISO 8601 (transform.py passes the
+    ones csv_to_json.py recognizes). Only ISO 8601 until this is called.
+    """
+    global _date_formats
+    _date_formats = tuple(formats)
+    reformat_date.cache_clear()
+
+
+@expression_function("date")
+def date(value, in_format=None, out_format=None):
+    """
+    Reformat a date: parsed with 'in_format' (by default ISO 8601 or one of
+    the formats of set_date_formats), written with 'out_format' (by default
+    ISO 8601). Null when the value isn't such a date.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+    return reformat_date(text, in_format, out_format)
+
+
+def _add(left_value, right_value):
+    # '+' concatenates as soon as one side is text (null counting as empty).
+    if isinstance(left_value, str) or isinstance(right_value, str):
+        return ("" if left_value is None else str(left_value)) + ("" if right_value is None else str(right_value))
+    if left_value is None or right_value is None:
+        return None
+    return left_value + right_value
+
+
+def _numeric(op):
+    def apply(left_value, right_value):
+        if left_value is None or right_value is None:
+            return None
+        try:
+            return op(left_value, right_value)
+        except ZeroDivisionError:
+            return None
+    return apply
+
+
+BINARY_OPERATORS = {
+    ast.Add: _add,
+    ast.Sub: _numeric(operator.sub),
+    ast.Mult: _numeric(operator.mul),
+    ast.Div: _numeric(operator.truediv),
+    ast.FloorDiv: _numeric(operator.floordiv),
+    ast.Mod: _numeric(operator.mod),
+}
+
+
+def _ordering(op):
+    # Comparing null with anything but == / != is false rather than an error.
+    def apply(left_value, right_value):
+        if left_value is None or right_value is None:
+            return False
+        return op(left_value, right_value)
+    return apply
+
+
+COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: _ordering(operator.lt),
+    ast.LtE: _ordering(operator.le),
+    ast.Gt: _ordering(operator.gt),
+    ast.GtE: _ordering(operator.ge),
+    ast.In: lambda left_value, right_value: right_value is not None and left_value in right_value,
+    ast.NotIn: lambda left_value, right_value: right_value is None or left_value not in right_value,
+}
+
+
+def _dot_path(node):
+    """
+    'asset.assetnum' parses as attribute access: turn it back into a dot path.
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dot_path(node.value)
+        return None if base is None else f"{base}.{node.attr}"
+    return None
+
+
+class _Compiler:
+    """
+    Turn the AST of one expression into nested closures, each taking the
+    record. Nodes are returned as (evaluate, constant): sub-expressions without
+    any field reference are evaluated once here and kept as constants.
+    """
+
+    NOT_CONSTANT = object()
+
+    def __init__(self, text, compile_path):
+        self.text = text
+        self.compile_path = compile_path
+
+    def error(self, message):
+        return ExpressionError(f"Expression '{self.text}': {message}")
+
+    def constant(self, value):
+        return (lambda obj: value), value
+
+    def fold(self, evaluate, *children):
+        # All children constant: evaluate now, once.
+        if all(constant is not self.NOT_CONSTANT for _, constant in children):
+            return self.constant(evaluate(None))
+        return evaluate, self.NOT_CONSTANT
+
+    def compile(self, node):
+        method = getattr(self, "compile_" + type(node).__name__, None)
+        if method is None:
+            raise self.error(f"'{ast.unparse(node)}' is not supported")
+        return method(node)
+
+    def compile_Expression(self, node):
+        return self.compile(node.body)
+
+    def compile_Constant(self, node):
+        if not isinstance(node.value, (str, int, float, bool, type(None))):
+            raise self.error(f"unsupported constant {node.value!r}")
+        return self.constant(node.value)
+
+    def compile_Name(self, node):
+        if node.id in ("null", "None"):
+            return self.constant(None)
+        if node.id in ("true", "false"):
+            return self.constant(node.id == "true")
+        return self.compile_path(node.id), self.NOT_CONSTANT
+
+    def compile_Attribute(self, node):
+        path = _dot_path(node)
+        if path is not None:
+            return self.compile_path(path), self.NOT_CONSTANT
+        # A field of a computed value, e.g. items[0].personid
+        get_value, _ = self.compile(node.value)
+        key = node.attr
+
+        def attribute(obj):
+            value = get_value(obj)
+            return value.get(key) if isinstance(value, dict) else None
+        return attribute, self.NOT_CONSTANT
+
+    def compile_Subscript(self, node):
+        get_value, _ = self.compile(node.value)
+        index_node = self.compile(node.slice)
+        get_index = index_node[0]
+
+        def subscript(obj):
+            value, index = get_value(obj), get_index(obj)
+            if isinstance(value, list) and isinstance(index, int):
+                return value[index] if -len(value) <= index < len(value) else None
+            if isinstance(value, dict):
+                return value.get(index)
+            return None
+        return subscript, self.NOT_CONSTANT
+
+    def compile_List(self, node):
+        items = [self.compile(item) for item in node.elts]
+        getters = tuple(get for get, _ in items)
+        return self.fold(lambda obj: [get(obj) for get in getters], *items)
+
+    compile_Tuple = compile_List
+
+    def compile_BinOp(self, node):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise self.error(f"operator '{ast.unparse(node)}' is not supported")
+        left_node, right_node = self.compile(node.left), self.compile(node.right)
+        get_left, get_right = left_node[0], right_node[0]
+        return self.fold(lambda obj: op(get_left(obj), get_right(obj)), left_node, right_node)
+
+    def compile_UnaryOp(self, node):
+        operand = self.compile(node.operand)
+        get = operand[0]
+        if isinstance(node.op, ast.Not):
+            return self.fold(lambda obj: not get(obj), operand)
+        if isinstance(node.op, ast.USub):
+            def negate(obj):
+                value = get(obj)
+                return None if value is None else -value
+            return self.fold(negate, operand)
+        raise self.error(f"operator '{ast.unparse(node)}' is not supported")
+
+    def compile_BoolOp(self, node):
+        values = [self.compile(value) for value in node.values]
+        getters = tuple(get for get, _ in values)
+        if isinstance(node.op, ast.And):
+            def evaluate(obj):
+                result = None
+                for get in getters:
+                    result = get(obj)
+                    if not result:
+                        return result
+                return result
+        else:
+            def evaluate(obj):
+                result = None
+                for get in getters:
+                    result = get(obj)
+                    if result:
+                        return result
+                return result
+        return self.fold(evaluate, *values)
+
+    def compile_Compare(self, node):
+        operands = [self.compile(node.left)] + [self.compile(comparator) for comparator in node.comparators]
+        ops = []
+        for op in node.ops:
+            if type(op) not in COMPARE_OPERATORS:
+                raise self.error(f"comparison '{ast.unparse(node)}' is not supported")
+            ops.append(COMPARE_OPERATORS[type(op)])
+        getters = tuple(get for get, _ in operands)
+        ops = tuple(ops)
+
+        def evaluate(obj):
+            left_value = getters[0](obj)
+            for op, get_right in zip(ops, getters[1:]):
+                right_value = get_right(obj)
+                if not op(left_value, right_value):
+                    return False
+                left_value = right_value
+            return True
+        return self.fold(evaluate, *operands)
+
+    def compile_IfExp(self, node):
+        test, body, orelse = self.compile(node.test), self.compile(node.body), self.compile(node.orelse)
+        get_test, get_body, get_orelse = test[0], body[0], orelse[0]
+        if test[1] is not self.NOT_CONSTANT:
+            return body if test[1] else orelse
+        return (lambda obj: get_body(obj) if get_test(obj) else get_orelse(obj)), self.NOT_CONSTANT
+
+    def compile_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise self.error(f"'{ast.unparse(node)}': only calls like name(arg, ...) are supported")
+        name = node.func.id
+        if name == "field":
+            # field('some field') for field names that aren't identifiers.
+            if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant) or not isinstance(node.args[0].value, str):
+                raise self.error("field() takes one constant field path")
+            return self.compile_path(node.args[0].value), self.NOT_CONSTANT
+        if name not in EXPRESSION_FUNCTIONS:
+            raise self.error(f"unknown function '{name}'. Available: field, {', '.join(sorted(EXPRESSION_FUNCTIONS))}")
+        function, elementwise = EXPRESSION_FUNCTIONS[name]
+        try:
+            inspect.signature(function).bind(*node.args)
+        except TypeError as ex:
+            raise self.error(f"{name}(): {ex}") from None
+        args = [self.compile(arg) for arg in node.args]
+        getters = tuple(get for get, _ in args)
+
+        if elementwise and len(getters) == 1:
+            get = getters[0]
+
+            def evaluate(obj):
+                value = get(obj)
+                if isinstance(value, list):
+                    return [function(item) for item in value]
+                return function(value)
+        elif elementwise and getters:
+            get_first, rest_getters = getters[0], getters[1:]
+
+            def evaluate(obj):
+                value = get_first(obj)
+                rest = [get(obj) for get in rest_getters]
+                if isinstance(value, list):
+                    return [function(item, *rest) for item in value]
+                return function(value, *rest)
+        elif len(getters) == 1:
+            get = getters[0]
+
+            def evaluate(obj):
+                return function(get(obj))
+        else:
+            def evaluate(obj):
+                return function(*[get(obj) for get in getters])
+        return self.fold(evaluate, *args)
+
+
+def set_expression_timing(enabled):
+    """
+    Time every evaluation of the expressions compiled from now on (see
+    EXPRESSION_STATS). Off by default: timing costs two clock reads per call.
+    """
+    global _timing
+    _timing = enabled
+
+
+def compile_expression(text, compile_path):
+    """
+    Compile an expression once into a function of the record. 'compile_path'
+    turns a dot path into a getter (transform.compile_path).
+
+    Expressions use Python syntax, restricted to field paths (asset.assetnum,
+    field('odd name'), items[0]), constants, + - * / // %, comparisons, and /
+    or / not, 'a if cond else b' and the functions of EXPRESSION_FUNCTIONS.
+    They are parsed with ast and never evaluated with eval().
+    """
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as ex:
+        raise ExpressionError(f"Expression '{text}': {ex.msg}") from None
+    try:
+        compiled, _ = _Compiler(text, compile_path).compile(tree)
+    except (TypeError, ValueError) as ex:
+        if isinstance(ex, ExpressionError):
+            raise
+        raise ExpressionError(f"Expression '{text}': {ex}") from None
+
+    def evaluate(obj):
+        try:
+            return compiled(obj)
+        except (TypeError, ValueError, AttributeError) as ex:
+            raise ExpressionError(f"Expression '{text}' failed on a record: {ex}") from ex
+    if not _timing:
+        return evaluate
+
+    stats = EXPRESSION_STATS.setdefault(text, [0, 0])
+    clock = time.perf_counter_ns
+
+    def evaluate_timed(obj):
+        start = clock()
+        try:
+            return evaluate(obj)
+        finally:
+            stats[0] += 1
+            stats[1] += clock() - start
+    return evaluate_timed
+
+
+def take_expression_stats():
+    """
+    Return the stats gathered since the last call and reset them (worker
+    processes send theirs back with every task).
+    """
+    taken = {text: tuple(stats) for text, stats in EXPRESSION_STATS.items() if stats[0]}
+    for stats in EXPRESSION_STATS.values():
+        stats[0] = stats[1] = 0
+    return taken
+
+
+def merge_expression_stats(total, stats):
+    for text, (evaluations, nanoseconds) in stats.items():
+        entry = total.setdefault(text, [0, 0])
+        entry[0] += evaluations
+        entry[1] += nanoseconds
+
+
+def print_expression_stats(stats):
+    """
+    Print the evaluation time of every expression, slowest first.
+    """
+    if not stats:
+        print("No expression was evaluated.")
+        return
+    print("Expression timings (total, evaluations, per evaluation):")
+    for text, (evaluations, nanoseconds) in sorted(stats.items(), key=lambda item: -item[1][1]):
+        per_call = nanoseconds / evaluations / 1000 if evaluations else 0
+        print(f"  {nanoseconds / 1e6:10.1f} ms  {evaluations:>10}  {per_call:8.2f} us  {text}")
@@ -0,0 +1,166 @@
+import os
+import csv
+import json
+import sqlite3
+import functools
+
+# Reference files larger than this get a disk index when the index type is 'auto'.
+MEMORY_INDEX_MAX_BYTES = 200 * 1024 * 1024
+DISK_INDEX_SUFFIX = ".lookup.sqlite"
+DISK_INDEX_BATCH = 10000
+DISK_INDEX_CACHE_SIZE = 65536  # rows remembered per disk index, most keys repeat
+KEY_SEPARATOR = "\x1f"
+INDEX_TYPES = ("auto", "memory", "disk")
+
+# (path, key columns, index type) -> opened index, so each reference file is
+# loaded once per process however many mapping fields use it.
+_open_indexes = {}
+
+
+def lookup_key(values):
+    """
+    Normalize the key value(s) of a record or reference row: strings, trimmed,
+    joined for composite keys. Returns None when any part is missing/empty.
+    """
+    parts = []
+    for value in values:
+        if value is None:
+            return None
+        text = str(value).strip()
+        if not text:
+            return None
+        parts.append(text)
+    return KEY_SEPARATOR.join(parts)
+
+
+def iter_reference_rows(path):
+    """
+    Rows of a reference file as dicts: CSV (header row), NDJSON / JSONL
+    (one object per line) or a JSON array of objects.
+    """
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+    elif lower.endswith((".ndjson", ".jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise ValueError(f"Lookup file '{path}' must contain a JSON array of objects.")
+        yield from rows
+
+
+def _row_key(row, key_columns):
+    if not isinstance(row, dict):
+        return None
+    return lookup_key(row.get(column) for column in key_columns)
+
+
+class MemoryIndex:
+    """
+    Hash index of a reference file held in memory: key -> row.
+    The first row wins when a key is repeated.
+    """
+
+    def __init__(self, path, key_columns):
+        self.rows = {}
+        self.duplicates = 0
+        for row in iter_reference_rows(path):
+            key = _row_key(row, key_columns)
+            if key is None:
+                continue
+            if key in self.rows:
+                self.duplicates += 1
+            else:
+                self.rows[key] = row
+
+    def get(self, key):
+        return self.rows.get(key)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class DiskIndex:
+    """
+    Hash index of a large reference file kept on disk in a SQLite file next
+    to it ('<file>.<key>.lookup.sqlite'), built once and rebuilt only when the
+    reference file is newer. Lookups are one primary-key query each, behind
+    a bounded memo cache.
+    """
+
+    def __init__(self, path, key_columns):
+        self.path = f"{path}.{'+'.join(key_columns)}{DISK_INDEX_SUFFIX}"
+        self.duplicates = 0
+        if not os.path.exists(self.path) or os.path.getmtime(self.path) < os.path.getmtime(path):
+            self._build(path, key_columns)
+        self.pid = None
+        self.count = self._connection().execute("SELECT COUNT(*) FROM lookup").fetchone()[0]
+        self.get = functools.lru_cache(maxsize=DISK_INDEX_CACHE_SIZE)(self._get)
+
+    def _connection(self):
+        # A SQLite connection must not cross a fork: worker processes open their own.
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path)
+            self.pid = os.getpid()
+        return self.connection
+
+    def _build(self, path, key_columns):
+        # Built under a temporary name, so a reader never sees a half-built index.
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute("CREATE TABLE lookup (k TEXT PRIMARY KEY, row TEXT NOT NULL)")
+            batch = []
+            seen = 0
+            for row in iter_reference_rows(path):
+                key = _row_key(row, key_columns)
+                if key is None:
+                    continue
+                seen += 1
+                batch.append((key, json.dumps(row, ensure_ascii=False)))
+                if len(batch) == DISK_INDEX_BATCH:
+                    connection.executemany("INSERT OR IGNORE INTO lookup VALUES (?, ?)", batch)
+                    batch = []
+            if batch:
+                connection.executemany("INSERT OR IGNORE INTO lookup VALUES (?, ?)", batch)
+            connection.commit()
+            stored = connection.execute("SELECT COUNT(*) FROM lookup").fetchone()[0]
+            self.duplicates = seen - stored
+        finally:
+            connection.close()
+        os.replace(tmp_path, self.path)
+
+    def _get(self, key):
+        found = self._connection().execute("SELECT row FROM lookup WHERE k = ?", (key,)).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def __len__(self):
+        return self.count
+
+
+def open_lookup_index(path, key_columns, index_type="auto"):
+    """
+    Load (or reuse) the index of reference file 'path' on 'key_columns'.
+    'auto' keeps it in memory unless the file is over MEMORY_INDEX_MAX_BYTES.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown lookup index '{index_type}'. Must be one of: {', '.join(INDEX_TYPES)}")
+    key_columns = tuple(key_columns)
+    cache_key = (os.path.abspath(path), key_columns, index_type)
+    index = _open_indexes.get(cache_key)
+    if index is None:
+        if index_type == "auto":
+            index_type = "disk" if os.path.getsize(path) > MEMORY_INDEX_MAX_BYTES else "memory"
+        index = MemoryIndex(path, key_columns) if index_type == "memory" else DiskIndex(path, key_columns)
+        if index.duplicates:
+            print(f"Lookup '{os.path.basename(path)}': {index.duplicates} repeated key(s) ignored, first row kept.")
+        _open_indexes[cache_key] = index
+    return index
@@ -5,12 +5,80 @@ import json
 import glob
 import argparse
 import sys
+import itertools
+import queue
+import threading
 import traceback
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '2. send to maximo'))
+from record_io import (BinaryRecordWriter, is_binary, is_ndjson, is_record_file, iter_json_array, iter_ndjson,
+                       open_records, pack_record)
+from csv_to_json import POSSIBLE_DATE_FORMATS, write_split_output
+from fingerprint_index import FingerprintIndex, spec_fingerprint
+from lookup_index import lookup_key, open_lookup_index
+from expressions import (EXPRESSION_STATS, compile_expression, merge_expression_stats, print_expression_stats,
+                         set_date_formats, set_expression_timing, take_expression_stats)
+from value_rules import RULES_KEY, compile_value_map
+
+STREAM_BATCH_SIZE = 1000  # records handed to the split writer at a time in --stream mode
+PARALLEL_RANGE_SIZE = 10000  # records per task with --workers, when the input isn't split into parts
+LOOKUP_MISSING_MODES = ("default", "drop", "reject")
+REJECT_SUFFIX = "_rejected.ndjson"
+FANOUT_QUEUE_SIZE = 4  # chunks buffered per output between the reader and its writer thread
+OUTPUT_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+BARE_PATH_PATTERN = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$')  # e.g. asset.assetnum
+EXPRESSION_CONSTANTS = ("null", "None", "true", "false", "True", "False")
+
+# date() in expressions recognizes the same formats as csv_to_json.py date parsing.
+set_date_formats(POSSIBLE_DATE_FORMATS)
+
+class RecordDropped(Exception):
+    """
+    Raised while transforming a record that must be left out of the output
+    (a lookup miss with "missing": "drop" or "reject"). Rejected records are
+    also written to the reject file.
+    """
+    def __init__(self, reason, reject=False):
+        super().__init__(reason)
+        self.reason = reason
+        self.reject = reject
+
+class RejectLog:
+    """
+    Counts dropped records and writes rejected ones, with the reason, to an
+    NDJSON reject file (only created once something is rejected).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.dropped = 0
+        self.rejected = 0
+
+    def add(self, reason, record, reject):
+        if not reject:
+            self.dropped += 1
+            return
+        if self.file is None:
+            self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write(json.dumps({"reason": reason, "record": record}, ensure_ascii=False) + "\n")
+        self.rejected += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.dropped:
+            print(f"{self.dropped} record(s) dropped (lookup miss).")
+        if self.rejected:
+            print(f"{self.rejected} record(s) rejected to '{self.path}'.")
 
 def find_input_files(input_path):
     """
     If input_path ends with '_<number>.json', gather all numbered parts
     (mydata_1.json, mydata_2.json, ...).
+    Split output of csv_to_json.py names its first part without a number
+    (mydata.json, mydata_2.json, ...), so that first part is included too,
+    and 'mydata.json' also picks up the numbered parts next to it.
     Otherwise, return just [input_path].
     """
     directory = os.path.dirname(input_path) or '.'
@@ -18,20 +86,42 @@ def find_input_files(input_path):
     filename_no_ext, ext = os.path.splitext(basename)
 
     match = re.match(r'^(.*)_(\d+)$', filename_no_ext)
-    if match:
-        prefix = match.group(1)
-        pattern = os.path.join(directory, f"{prefix}_*{ext}")
-        all_parts = glob.glob(pattern)
-
-        def extract_part_number(filepath):
-            name = os.path.splitext(os.path.basename(filepath))[0]
-            return int(name.split('_')[-1])
+    prefix = match.group(1) if match else filename_no_ext
+    part_pattern = re.compile(re.escape(prefix) + r'_(\d+)' + re.escape(ext) + '$')
+    numbered = []
+    for path in glob.glob(os.path.join(directory, f"{glob.escape(prefix)}_*{ext}")):
+        part_match = part_pattern.match(os.path.basename(path))
+        if part_match:
+            numbered.append((int(part_match.group(1)), path))
 
-        all_parts.sort(key=extract_part_number)
-        return all_parts
-    else:
+    if not match and not numbered:
         return [input_path]
 
+    all_parts = [path for _, path in sorted(numbered)]
+    first_part = os.path.join(directory, prefix + ext)
+    if os.path.exists(first_part):
+        all_parts.insert(0, first_part)
+    return all_parts
+
+def iter_input_records(input_path):
+    """
+    Stream the records of the input one by one: a manifest or binary record
+    file, or every part of a (split) JSON array / NDJSON export. Parts are
+    read incrementally, so memory doesn't grow with the size of the input.
+    """
+    if is_record_file(input_path):
+        yield from open_records(input_path)
+        return
+
+    input_files = find_input_files(input_path)
+    if not input_files:
+        raise FileNotFoundError(f"No matching input files for '{input_path}'.")
+    for fp in input_files:
+        if is_ndjson(fp):
+            yield from iter_ndjson(fp)
+        else:
+            yield from iter_json_array(fp)
+
 def load_json_file(path):
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -71,6 +161,10 @@ def apply_mapping(input_obj, mapping_spec, value_mapping):
     - Else, nested object mapping.
     - value_mapping is { fieldName: { rawVal: mappedVal } }.
 
+    This is the reference interpreter of the base spec format; transform.py
+    runs records through compile_mapping, which also supports "lookup", "expr"
+    and "$rules" in value maps.
+
     Example:
       if mapping_spec == "priority":
         raw_val = get_value_by_path(input_obj, "priority")
@@ -139,6 +233,588 @@ def apply_defaults_with_skip(obj, defaults):
                 # type mismatch => do nothing
                 pass
 
+def compile_path(path_str):
+    """
+    Compile a dot path once into a getter behaving like get_value_by_path.
+    """
+    if not path_str:
+        return lambda obj: None
+    parts = tuple(path_str.split('.'))
+    if len(parts) == 1:
+        key = parts[0]
+
+        def get_one(obj):
+            if isinstance(obj, dict):
+                return obj.get(key)
+            return None
+        return get_one
+
+    def get_nested(obj):
+        current = obj
+        for p in parts:
+            if isinstance(current, dict) and p in current:
+                current = current[p]
+            else:
+                return None
+        return current
+    return get_nested
+
+def compile_lookup(lookup_spec, base_dir=None):
+    """
+    Compile a {"lookup": {...}} construct: join the record against a keyed
+    reference file (CSV, JSON array or NDJSON), indexed once per process.
+        file    - reference file, relative to the from-to json (to the
+                  fan-out spec for an inline from_to, see load_fanout_spec)
+        key     - key column(s) of the reference file
+        on      - dot path(s) of the record holding the key value(s)
+        value   - column to return, a list of columns (returns an object),
+                  or nothing for the whole reference row
+        missing - "default" (return "default", null if unset), "drop" (leave
+                  the record out) or "reject" (leave it out and write it to
+                  the reject file)
+        index   - "auto" (default), "memory" or "disk" (SQLite, for large tables)
+    """
+    path = lookup_spec["file"]
+    if base_dir and not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    key_columns = lookup_spec["key"]
+    key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+    on_paths = lookup_spec.get("on", key_columns)
+    on_paths = [on_paths] if isinstance(on_paths, str) else list(on_paths)
+    if len(on_paths) != len(key_columns):
+        raise ValueError(f"Lookup on '{lookup_spec['file']}': 'on' and 'key' must have the same number of fields.")
+    missing = lookup_spec.get("missing", "default")
+    if missing not in LOOKUP_MISSING_MODES:
+        raise ValueError(f"Lookup on '{lookup_spec['file']}': 'missing' must be one of: {', '.join(LOOKUP_MISSING_MODES)}")
+
+    index = open_lookup_index(path, key_columns, lookup_spec.get("index", "auto"))
+    getters = tuple(compile_path(on) for on in on_paths)
+    value = lookup_spec.get("value")
+    default = lookup_spec.get("default")
+    reject = missing == "reject"
+    name = os.path.basename(path)
+
+    def lookup(obj):
+        key = lookup_key(get(obj) for get in getters)
+        row = index.get(key) if key is not None else None
+        if row is None:
+            if missing == "default":
+                return default
+            if key is None:
+                raise RecordDropped(f"lookup {name}: no value for {'+'.join(on_paths)}", reject)
+            raise RecordDropped(f"lookup {name}: no row for {'+'.join(on_paths)}={key}", reject)
+        if value is None:
+            return dict(row)
+        if isinstance(value, list):
+            return {column: row.get(column) for column in value}
+        return row.get(value)
+    return lookup
+
+def compile_mapping(mapping_spec, value_mapping, base_dir=None):
+    """
+    Compile 'mapping_spec' once into a closure doing what apply_mapping does,
+    without looking at the spec again for every record: paths are split,
+    value maps are resolved and nested objects become lists of
+    (out_field, compiled sub-spec) pairs.
+    """
+    if isinstance(mapping_spec, str):
+        get = compile_path(mapping_spec)
+        if mapping_spec not in value_mapping:
+            return get
+        sub_map = value_mapping[mapping_spec]
+        if RULES_KEY in sub_map:
+            map_value = compile_value_map(mapping_spec, sub_map)
+
+            def get_matched(obj):
+                return map_value(get(obj))
+            return get_matched
+
+        def get_mapped(obj):
+            raw_val = get(obj)
+            if raw_val in sub_map:
+                return sub_map[raw_val]
+            return raw_val
+        return get_mapped
+
+    if isinstance(mapping_spec, dict):
+        if isinstance(mapping_spec.get("lookup"), dict) and "file" in mapping_spec["lookup"]:
+            return compile_lookup(mapping_spec["lookup"], base_dir)
+
+        if isinstance(mapping_spec.get("expr"), str) and len(mapping_spec) == 1:
+            # Computed field, see expressions.compile_expression. Before expressions, this
+            # was a nested object with one field "expr" copied from a path: refuse a bare
+            # path rather than silently changing what such a spec outputs.
+            text = mapping_spec["expr"].strip()
+            if BARE_PATH_PATTERN.match(text) and text not in EXPRESSION_CONSTANTS:
+                raise ValueError(
+                    f"{{\"expr\": \"{text}\"}} is ambiguous: an object with a single \"expr\" key is a computed "
+                    f"field, not a nested object with a field \"expr\". Write the path itself (\"{text}\") to "
+                    f"copy the field, or give the nested object a second field."
+                )
+            return compile_expression(mapping_spec["expr"], compile_path)
+
+        if "arrayPath" in mapping_spec and "itemMap" in mapping_spec:
+            get_array = compile_path(mapping_spec["arrayPath"])
+            map_item = compile_mapping(mapping_spec["itemMap"], value_mapping, base_dir)
+
+            def map_array(obj):
+                arr_val = get_array(obj)
+                if isinstance(arr_val, list):
+                    return [map_item(item) for item in arr_val]
+                return []
+            return map_array
+
+        # Plain single-key paths without a value map are read inline with
+        # dict.get; everything else goes through its compiled sub-spec.
+        fields = []
+        for out_field, sub_spec in mapping_spec.items():
+            if isinstance(sub_spec, str) and sub_spec and '.' not in sub_spec and sub_spec not in value_mapping:
+                fields.append((out_field, sub_spec, None))
+            else:
+                fields.append((out_field, None, compile_mapping(sub_spec, value_mapping, base_dir)))
+        fields = tuple(fields)
+
+        def map_object(obj):
+            if isinstance(obj, dict):
+                get = obj.get
+                return {out_field: get(key) if map_field is None else map_field(obj)
+                        for out_field, key, map_field in fields}
+            return {out_field: None if map_field is None else map_field(obj)
+                    for out_field, key, map_field in fields}
+        return map_object
+
+    # Constants are returned as they are (the same object), like apply_mapping does.
+    return lambda obj: mapping_spec
+
+def compile_defaults(defaults):
+    """
+    Compile 'defaults' once into a closure doing what apply_defaults_with_skip
+    does: the scalar defaults to set, and the nested objects / array items to
+    merge into, are sorted out up front instead of for every record.
+    """
+    if not isinstance(defaults, dict):
+        return lambda obj: None
+
+    scalars = []
+    objects = []
+    arrays = []
+    for k, default_val in defaults.items():
+        if not isinstance(default_val, (dict, list)):
+            scalars.append((k, default_val))
+        elif isinstance(default_val, dict):
+            objects.append((k, compile_defaults(default_val)))
+        elif default_val and isinstance(default_val[0], dict):
+            arrays.append((k, compile_defaults(default_val[0])))
+    scalars = tuple(scalars)
+    objects = tuple(objects)
+    arrays = tuple(arrays)
+
+    def apply_defaults(obj):
+        if not isinstance(obj, dict):
+            return
+        for k, default_val in scalars:
+            if k not in obj:
+                obj[k] = default_val
+        for k, apply_nested in objects:
+            nested = obj.get(k)
+            if isinstance(nested, dict):
+                apply_nested(nested)
+        for k, apply_item in arrays:
+            items = obj.get(k)
+            if isinstance(items, list):
+                for element in items:
+                    if isinstance(element, dict):
+                        apply_item(element)
+    return apply_defaults
+
+def compile_transform(from_to_map, value_mapping, default_values, base_dir=None):
+    """
+    Compile the three specs into one function: raw record -> transformed record.
+    Same result as apply_mapping followed by apply_defaults_with_skip.
+    The function raises RecordDropped for records to leave out.
+    'base_dir' is the folder lookup files are relative to.
+    """
+    map_record = compile_mapping(from_to_map, value_mapping, base_dir)
+    apply_defaults = compile_defaults(default_values)
+
+    def transform_record(obj):
+        out_obj = map_record(obj)
+        apply_defaults(out_obj)
+        return out_obj
+    return transform_record
+
+def load_spec(value, base_dir):
+    """
+    A spec of a fan-out output: inline JSON, or a JSON file relative to base_dir.
+    """
+    if isinstance(value, str):
+        return load_json_file(value if os.path.isabs(value) else os.path.join(base_dir, value))
+    return value
+
+def resolve_lookup_files(spec, spec_dir):
+    """
+    Copy of a from-to spec whose relative lookup files are made absolute
+    against 'spec_dir', the folder of the from-to json they are written in.
+    """
+    if isinstance(spec, dict):
+        resolved = {key: resolve_lookup_files(value, spec_dir) for key, value in spec.items()}
+        lookup = spec.get("lookup")
+        if isinstance(lookup, dict) and isinstance(lookup.get("file"), str) and not os.path.isabs(lookup["file"]):
+            resolved["lookup"] = dict(lookup, file=os.path.join(spec_dir, lookup["file"]))
+        return resolved
+    if isinstance(spec, list):
+        return [resolve_lookup_files(value, spec_dir) for value in spec]
+    return spec
+
+def load_fanout_spec(path):
+    """
+    Load a fan-out spec: several named outputs produced from the same input in
+    one pass, each with its own from-to, mapping and default value specs
+    (file names relative to the fan-out spec, or inline JSON):
+        {
+          "outputs": {
+            "item":        {"from_to": "item_from_to.json", "defaults": "item_defaults.json"},
+            "inventory":   {"from_to": "inventory_from_to.json", "mapping": "mapping.json"},
+            "invbalances": {"from_to": {"itemnum": "ITEM", "curbal": "QTY"}}
+          }
+        }
+    Lookup files are relative to the from-to json using them, as in a single
+    output run; those of an inline from_to are relative to the fan-out spec.
+    Returns the list of (name, from_to_map, value_mapping, default_values).
+    """
+    spec = load_json_file(path)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    named = spec.get("outputs") if isinstance(spec, dict) else None
+    if not isinstance(named, dict) or not named:
+        raise ValueError(f"Fan-out spec '{path}' must contain an \"outputs\" object of name: specs.")
+    outputs = []
+    for name, entry in named.items():
+        if not OUTPUT_NAME_PATTERN.match(name):
+            raise ValueError(f"Fan-out output name '{name}' may only contain letters, digits, '.', '_' and '-'.")
+        if not isinstance(entry, dict) or "from_to" not in entry:
+            raise ValueError(f"Fan-out output '{name}' needs a \"from_to\" spec.")
+        from_to_map = load_spec(entry["from_to"], base_dir)
+        if isinstance(entry["from_to"], str):
+            from_to_path = entry["from_to"] if os.path.isabs(entry["from_to"]) else os.path.join(base_dir, entry["from_to"])
+            from_to_map = resolve_lookup_files(from_to_map, os.path.dirname(from_to_path))
+        outputs.append((name,
+                        from_to_map,
+                        load_spec(entry.get("mapping", {}), base_dir),
+                        load_spec(entry.get("defaults", {}), base_dir)))
+    return outputs
+
+def fanout_output_path(output_path, name):
+    """
+    'out.json' -> 'out_<name>.json': the file of one fan-out output.
+    """
+    prefix, ext = os.path.splitext(output_path)
+    return f"{prefix}_{name}{ext}"
+
+def lookup_file_stamps(outputs, base_dir=None):
+    """
+    (file, size, mtime) of every reference file the lookups of the outputs
+    read, so a run after a reference file changed is not compared against
+    records enriched with the old one.
+    """
+    files = []
+
+    def walk(spec):
+        if isinstance(spec, dict):
+            lookup = spec.get("lookup")
+            if isinstance(lookup, dict) and isinstance(lookup.get("file"), str):
+                files.append(lookup["file"])
+            for value in spec.values():
+                walk(value)
+        elif isinstance(spec, list):
+            for value in spec:
+                walk(value)
+
+    for _, from_to_map, _, _ in outputs:
+        walk(from_to_map)
+    stamps = []
+    for name in sorted(set(files)):
+        path = name if not base_dir or os.path.isabs(name) else os.path.join(base_dir, name)
+        stat = os.stat(path)
+        stamps.append((name, stat.st_size, stat.st_mtime_ns))
+    return stamps
+
+def compile_outputs(outputs, base_dir=None):
+    """
+    Compile the specs of every output: [(name, transform_record), ...].
+    """
+    return [(name, compile_transform(from_to_map, value_mapping, default_values, base_dir))
+            for name, from_to_map, value_mapping, default_values in outputs]
+
+def write_transformed(chunks, output_path, ndjson=False, manifest=False):
+    """
+    Write chunks of transformed records as they come: compact JSON (or NDJSON)
+    split into ~100MB parts like csv_to_json.py output, or a single .mpk file.
+    Records may already be serialized by a worker (JSON bytes, or MessagePack
+    bytes for .mpk). Returns the number of records written.
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for chunk in chunks:
+            count += len(chunk)
+            yield chunk
+
+    if is_binary(output_path):
+        record_writer = BinaryRecordWriter(output_path)
+        try:
+            for chunk in counted():
+                for row in chunk:
+                    record_writer.write_packed(row if isinstance(row, bytes) else pack_record(row))
+        finally:
+            record_writer.close()
+        return count
+
+    parts = write_split_output(counted(), output_path, ndjson, manifest)
+    if parts > 1:
+        print(f"Output split into {parts} files.")
+    return count
+
+def transform_batch(records, transforms, serialize=None):
+    """
+    Run every record through the transform of each output (a list of
+    (name, transform_record), see compile_outputs). Returns (one list of
+    transformed records per output, dropped records as (reason, record,
+    reject) tuples). A record dropped from one output still goes to the others.
+    """
+    outputs = [[] for _ in transforms]
+    dropped = []
+    for obj in records:
+        for (name, transform_record), rows in zip(transforms, outputs):
+            try:
+                out_obj = transform_record(obj)
+            except RecordDropped as ex:
+                dropped.append((f"{name}: {ex.reason}" if name else ex.reason, obj, ex.reject))
+                continue
+            rows.append(serialize(out_obj) if serialize else out_obj)
+    return outputs, dropped
+
+def write_outputs(groups, output_paths, ndjson=False, manifest=False):
+    """
+    Write groups of chunks (one chunk per output, see transform_batch) to the
+    output files, with write_transformed. With several outputs, each one is
+    written by its own thread fed through a small queue, so a single pass over
+    the input feeds them all. Returns the number of records written per output.
+    """
+    if len(output_paths) == 1:
+        return [write_transformed((group[0] for group in groups), output_paths[0], ndjson, manifest)]
+
+    queues = [queue.Queue(maxsize=FANOUT_QUEUE_SIZE) for _ in output_paths]
+    counts = [0] * len(output_paths)
+    errors = [None] * len(output_paths)
+
+    def writer(position):
+        chunk_queue = queues[position]
+        done = False
+
+        def chunks():
+            nonlocal done
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is None:
+                    done = True
+                    return
+                yield chunk
+
+        try:
+            counts[position] = write_transformed(chunks(), output_paths[position], ndjson, manifest)
+        except Exception as ex:
+            errors[position] = ex
+            # Keep consuming, so the reader never blocks on this output's queue.
+            while not done and chunk_queue.get() is not None:
+                pass
+
+    threads = [threading.Thread(target=writer, args=(position,), daemon=True) for position in range(len(output_paths))]
+    for thread in threads:
+        thread.start()
+    try:
+        for group in groups:
+            for chunk_queue, chunk in zip(queues, group):
+                chunk_queue.put(chunk)
+    finally:
+        for chunk_queue in queues:
+            chunk_queue.put(None)
+        for thread in threads:
+            thread.join()
+    for ex in errors:
+        if ex is not None:
+            raise ex
+    return counts
+
+def transform_stream(records, output_paths, transforms, reject_log, ndjson=False, manifest=False):
+    """
+    Transform records one batch at a time and write them as they come (see
+    write_outputs). Only one batch of records is held in memory at a time.
+    Returns the number of records written per output.
+    """
+    def groups():
+        while True:
+            batch = list(itertools.islice(records, STREAM_BATCH_SIZE))
+            if not batch:
+                return
+            outputs, dropped = transform_batch(batch, transforms)
+            for reason, record, reject in dropped:
+                reject_log.add(reason, record, reject)
+            yield outputs
+
+    return write_outputs(groups(), output_paths, ndjson, manifest)
+
+def write_output_file(records, output_path):
+    """
+    Write all the transformed records at once: an indented JSON array, or a
+    .mpk binary record file.
+    """
+    if is_binary(output_path):
+        record_writer = BinaryRecordWriter(output_path)
+        for out_obj in records:
+            record_writer.write(out_obj)
+        record_writer.close()
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+# Set in every worker process by init_worker.
+_worker_transforms = None
+_worker_serialize = None
+_worker_records = {}
+
+def init_worker(outputs, base_dir, serialize, expression_timing=False):
+    """
+    Pool initializer: the specs are shipped once per worker and compiled
+    there (compiled closures can't be pickled).
+    """
+    global _worker_transforms, _worker_serialize
+    set_expression_timing(expression_timing)
+    _worker_transforms = compile_outputs(outputs, base_dir)
+    if serialize == 'msgpack':
+        _worker_serialize = pack_record
+    else:
+        def _worker_serialize(out_obj):
+            return json.dumps(out_obj, ensure_ascii=False).encode('utf-8')
+
+def transform_task(task):
+    """
+    Transform one task in a worker process and return transform_batch's
+    result, with the records serialized as JSON or MessagePack bytes, and the
+    expression timings of the task. A task is
+      ('part', path)               - a whole JSON array / NDJSON part
+      ('range', path, start, end)  - records start..end-1 of a manifest / .mpk
+      ('records', [record, ...])   - records read by the main process
+    """
+    kind = task[0]
+    if kind == 'part':
+        records = iter_ndjson(task[1]) if is_ndjson(task[1]) else iter_json_array(task[1])
+    elif kind == 'range':
+        _, path, start, end = task
+        source = _worker_records.get(path)
+        if source is None:
+            source = _worker_records[path] = open_records(path)
+        records = (source[index] for index in range(start, end))
+    else:
+        records = task[1]
+    groups, dropped = transform_batch(records, _worker_transforms, _worker_serialize)
+    return groups, dropped, take_expression_stats()
+
+def iter_transform_tasks(input_path, record_filter=None):
+    """
+    Split the input into independent tasks for transform_task, in input order:
+    record ranges of a manifest / .mpk, one task per part of a split export,
+    or batches of records for a single JSON / NDJSON file. With a
+    'record_filter' (records -> records), the records are always read and
+    filtered here and sent in batches.
+    """
+    if record_filter is not None:
+        records = record_filter(iter_input_records(input_path))
+        while True:
+            batch = list(itertools.islice(records, PARALLEL_RANGE_SIZE))
+            if not batch:
+                return
+            yield ('records', batch)
+
+    if is_record_file(input_path):
+        source = open_records(input_path)
+        total = len(source)
+        source.close()
+        for start in range(0, total, PARALLEL_RANGE_SIZE):
+            yield ('range', os.path.abspath(input_path), start, min(start + PARALLEL_RANGE_SIZE, total))
+        return
+
+    input_files = find_input_files(input_path)
+    if not input_files:
+        raise FileNotFoundError(f"No matching input files for '{input_path}'.")
+    if len(input_files) > 1:
+        for fp in input_files:
+            yield ('part', fp)
+        return
+
+    records = iter_input_records(input_path)
+    while True:
+        batch = list(itertools.islice(records, PARALLEL_RANGE_SIZE))
+        if not batch:
+            return
+        yield ('records', batch)
+
+def transform_parallel(input_path, output_paths, outputs, base_dir, workers, reject_log,
+                       ndjson=False, manifest=False, expression_timing=False, record_filter=None):
+    """
+    Transform the input in 'workers' processes and write the records in input
+    order (see write_outputs). Records are serialized in the workers, so
+    only bytes come back. At most workers * 2 tasks are in flight, so a slow
+    writer doesn't let results pile up. Expression timings of the workers are
+    added to EXPRESSION_STATS.
+    Returns the number of records written per output.
+    """
+    serialize = 'msgpack' if is_binary(output_paths[0]) else 'json'
+    in_flight = threading.Semaphore(workers * 2)
+    stop = threading.Event()
+
+    def bounded_tasks():
+        for task in iter_transform_tasks(input_path, record_filter):
+            in_flight.acquire()
+            if stop.is_set():
+                return
+            yield task
+
+    with multiprocessing.Pool(workers, initializer=init_worker,
+                              initargs=(outputs, base_dir, serialize, expression_timing)) as pool:
+        def results():
+            try:
+                for groups, dropped, stats in pool.imap(transform_task, bounded_tasks()):
+                    in_flight.release()
+                    merge_expression_stats(EXPRESSION_STATS, stats)
+                    for reason, record, reject in dropped:
+                        reject_log.add(reason, record, reject)
+                    yield groups
+            finally:
+                # On an error, unblock the pool's task feeder so the pool can shut down.
+                stop.set()
+                in_flight.release()
+
+        return write_outputs(results(), output_paths, ndjson, manifest)
+
+def run_and_finish(run, reject_log, fingerprints=None, deletions_file=None):
+    """
+    Call 'run' (returns the number of records written per output), then close
+    the reject log and commit the fingerprint index; if the run fails, the
+    index is left as it was.
+    """
+    try:
+        counts = run()
+    except BaseException:
+        if fingerprints is not None:
+            fingerprints.abort()
+        raise
+    finally:
+        reject_log.close()
+    if fingerprints is not None:
+        fingerprints.commit(deletions_file)
+    return counts
+
 def main():
     try:
         parser = argparse.ArgumentParser(
@@ -149,51 +825,125 @@ def main():
             )
         )
         parser.add_argument('--input-json', required=True,
-                            help="Path to input JSON array (may be split). E.g. 'data_1.json'.")
-        parser.add_argument('--from-to-json', required=True,
+                            help="Path to input JSON array (may be split) or NDJSON file. E.g. 'data_1.json', "
+                                 "or the '.manifest.json' / '.mpk' written by csv_to_json.py --manifest / --binary.")
+        parser.add_argument('--from-to-json', required=False,
                             help="Mapping spec (nested/array) to transform input -> output.")
         parser.add_argument('--mapping-json', required=False,
                             help="Value mapping: { fieldName: { rawVal: mappedVal } }.")
         parser.add_argument('--default-values-json', required=False,
                             help="Nested default values, only set if the parent object/array already exists.")
         parser.add_argument('--output-json', required=True,
-                            help="Destination file for transformed JSON array.")
+                            help="Destination file for transformed JSON array. A '.mpk' name writes the "
+                                 "compact binary record format instead (needs 'pip install msgpack').")
+        parser.add_argument('--stream', action='store_true',
+                            help="Transform record by record in constant memory and write compact JSON split into "
+                                 "~100MB parts (output.json, output_2.json, ...) like csv_to_json.py.")
+        parser.add_argument('--ndjson', action='store_true',
+                            help="With --stream, write NDJSON (one object per line) instead of JSON arrays.")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="With --stream, transform in this many worker processes (default: 1). Parts of a "
+                                 "split export (or record ranges of a manifest / .mpk) are transformed in parallel "
+                                 "and written in the original order.")
+        parser.add_argument('--manifest', action='store_true',
+                            help="With --stream, also write <output>.manifest.json and <output>.idx "
+                                 "(see csv_to_json.py --manifest).")
+        parser.add_argument('--fanout-spec', required=False,
+                            help="Instead of --from-to-json / --mapping-json / --default-values-json: a JSON spec of "
+                                 "several named outputs, each with its own specs, all produced in one pass over the "
+                                 "input. Output '<name>' is written to <output>_<name>.json (same extension as "
+                                 "--output-json).")
+        parser.add_argument('--expr-stats', action='store_true',
+                            help="Time every \"expr\" field of the specs and print the time spent in each at the end.")
+        parser.add_argument('--fingerprint-index', required=False,
+                            help="Incremental run over a refreshed full export: only transform and write the input "
+                                 "records that are new or changed since the run that wrote this index (content "
+                                 "fingerprints by --key; a change to the specs or to a lookup file makes a full run).")
+        parser.add_argument('--key', nargs='+', required=False, metavar='FIELD',
+                            help="Business key field(s) of the input records, for --fingerprint-index.")
+        parser.add_argument('--deletions', required=False,
+                            help="With --fingerprint-index, write the keys of the records that are no longer in "
+                                 "the input to this JSON file.")
+        parser.add_argument('--reject-file', required=False,
+                            help="Where records rejected by a lookup (\"missing\": \"reject\") are written, as NDJSON "
+                                 "with the reason (default: <output>" + REJECT_SUFFIX + ").")
 
         args = parser.parse_args()
+        if (args.ndjson or args.manifest) and not args.stream:
+            parser.error("--ndjson and --manifest need --stream.")
+        if args.workers < 1:
+            parser.error("--workers must be at least 1.")
+        if args.workers > 1 and not args.stream:
+            parser.error("--workers needs --stream.")
+        if args.fanout_spec and (args.from_to_json or args.mapping_json or args.default_values_json):
+            parser.error("--fanout-spec replaces --from-to-json, --mapping-json and --default-values-json.")
+        if not args.fanout_spec and not args.from_to_json:
+            parser.error("--from-to-json (or --fanout-spec) is required.")
+        if args.fingerprint_index and not args.key:
+            parser.error("--fingerprint-index needs --key.")
+        if (args.key or args.deletions) and not args.fingerprint_index:
+            parser.error("--key and --deletions need --fingerprint-index.")
 
-        from_to_map = load_json_file(args.from_to_json)
+        if args.fanout_spec:
+            outputs = load_fanout_spec(args.fanout_spec)
+            base_dir = os.path.dirname(os.path.abspath(args.fanout_spec))
+            output_paths = [fanout_output_path(args.output_json, name) for name, *_ in outputs]
+        else:
+            from_to_map = load_json_file(args.from_to_json)
 
-        value_mapping = {}
-        if args.mapping_json:
-            value_mapping = load_json_file(args.mapping_json)
+            value_mapping = {}
+            if args.mapping_json:
+                value_mapping = load_json_file(args.mapping_json)
 
-        default_values = {}
-        if args.default_values_json:
-            default_values = load_json_file(args.default_values_json)
+            default_values = {}
+            if args.default_values_json:
+                default_values = load_json_file(args.default_values_json)
 
-        input_files = find_input_files(args.input_json)
-        if not input_files:
-            print(f"[ERROR] No matching input files for '{args.input_json}'. Exiting.")
-            sys.exit(1)
+            outputs = [("", from_to_map, value_mapping, default_values)]
+            base_dir = os.path.dirname(os.path.abspath(args.from_to_json))
+            output_paths = [args.output_json]
 
-        all_input_data = []
-        for fp in input_files:
-            part = load_json_file(fp)
-            if not isinstance(part, list):
-                print(f"[ERROR] File '{fp}' is not a JSON array. Exiting.")
-                sys.exit(1)
-            all_input_data.extend(part)
-
-        transformed_data = []
-        for obj in all_input_data:
-            out_obj = apply_mapping(obj, from_to_map, value_mapping)
-            apply_defaults_with_skip(out_obj, default_values)
-            transformed_data.append(out_obj)
-
-        with open(args.output_json, 'w', encoding='utf-8') as f:
-            json.dump(transformed_data, f, ensure_ascii=False, indent=2)
-
-        print(f"Done! Wrote {len(transformed_data)} record(s) to '{args.output_json}'.")
+        set_expression_timing(args.expr_stats)
+        transforms = compile_outputs(outputs, base_dir)
+        reject_log = RejectLog(args.reject_file or os.path.splitext(args.output_json)[0] + REJECT_SUFFIX)
+
+        fingerprints = None
+        record_filter = None
+        if args.fingerprint_index:
+            # Input records are compared, so the specs and the lookup files they read are part of the index context.
+            context = spec_fingerprint(outputs, lookup_file_stamps(outputs, base_dir))
+            fingerprints = FingerprintIndex(args.fingerprint_index, args.key, context=context)
+            record_filter = fingerprints.filter
+
+        if args.stream and args.workers > 1:
+            def run():
+                return transform_parallel(args.input_json, output_paths, outputs, base_dir, args.workers,
+                                          reject_log, args.ndjson, args.manifest, args.expr_stats, record_filter)
+        elif args.stream:
+            def run():
+                records = iter_input_records(args.input_json)
+                if record_filter is not None:
+                    records = record_filter(records)
+                return transform_stream(records, output_paths, transforms, reject_log, args.ndjson, args.manifest)
+        else:
+            def run():
+                # Same reader as --stream (split JSON, NDJSON, manifest or .mpk), but
+                # every output is held in memory and written as one JSON array.
+                records = iter_input_records(args.input_json)
+                if record_filter is not None:
+                    records = record_filter(records)
+                transformed_outputs, dropped = transform_batch(records, transforms)
+                for reason, record, reject in dropped:
+                    reject_log.add(reason, record, reject)
+                for transformed_data, output_path in zip(transformed_outputs, output_paths):
+                    write_output_file(transformed_data, output_path)
+                return [len(transformed_data) for transformed_data in transformed_outputs]
+
+        counts = run_and_finish(run, reject_log, fingerprints, args.deletions)
+        for count, output_path in zip(counts, output_paths):
+            print(f"Done! Wrote {count} record(s) to '{output_path}'.")
+        if args.expr_stats:
+            print_expression_stats(take_expression_stats())
     except Exception as e:
         print("[FATAL ERROR]", e)
         traceback.print_exc()
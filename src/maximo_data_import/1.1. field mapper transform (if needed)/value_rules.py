@@ -0,0 +1,132 @@
+import re
+import functools
+
+RULES_KEY = "$rules"
+RULE_MATCH_TYPES = ("exact", "prefix", "regex")
+RULES_MEMO_SIZE = 65536  # distinct raw values remembered per field
+# Regex constructs that break (or change meaning) once a pattern is one branch
+# of a combined alternation: backreferences (group numbers shift), named groups
+# (names may repeat across rules), conditionals and global inline flags.
+# Lookbehinds are caught too; that only costs them the combined fast path.
+UNCOMBINABLE_REGEX = re.compile(r"\\[1-9]|\\g|\(\?P[<=]|\(\?<|\(\?\(|\(\?[aiLmsux]+\)")
+
+
+def check_rule(field, rule):
+    if not isinstance(rule, dict) or "pattern" not in rule or "value" not in rule:
+        raise ValueError(f"Value mapping rules of '{field}' need a \"pattern\" and a \"value\": {rule!r}")
+    match = rule.get("match", "exact")
+    if match not in RULE_MATCH_TYPES:
+        raise ValueError(f"Value mapping rule of '{field}': \"match\" must be one of: {', '.join(RULE_MATCH_TYPES)}")
+    return match, str(rule["pattern"]), bool(rule.get("ignore_case"))
+
+
+class RuleMatcher:
+    """
+    The rules of a field, compiled into one matcher: raw text -> (matched, value).
+    The first rule (in spec order) matching the whole value wins.
+
+    Rules are split by kind so no value is tried against every rule in turn:
+    exact rules are dict lookups, prefix rules a dict lookup per distinct
+    prefix length (a flattened trie), and regex rules one alternation, each
+    rule in its own group, so a single regex call tries them all and
+    m.lastindex tells which one matched. Regex rules that cannot be a branch
+    of the alternation (see UNCOMBINABLE_REGEX) are matched on their own.
+    Keys of case-insensitive rules are lower-cased. Results are memoized per
+    distinct raw value.
+    """
+
+    def __init__(self, field, rules):
+        if not isinstance(rules, list):
+            raise ValueError(f"\"{RULES_KEY}\" of '{field}' must be a list of rules.")
+        self.values = [rule.get("value") if isinstance(rule, dict) else None for rule in rules]
+        # {ignore_case: {key: rule index}} and {ignore_case: {prefix length: {prefix: rule index}}}
+        self.exact = {False: {}, True: {}}
+        self.prefixes = {False: {}, True: {}}
+        parts = []
+        self.regex_rules = {}  # group number -> rule index
+        self.separate_rules = []  # (rule index, fullmatch) of the rules matched on their own
+        combined = []  # (rule index, compiled regex) of the rules in the alternation
+        group = 1
+        for index, rule in enumerate(rules):
+            match, pattern, ignore_case = check_rule(field, rule)
+            key = pattern.lower() if ignore_case else pattern
+            if match == "exact":
+                self.exact[ignore_case].setdefault(key, index)
+            elif match == "prefix":
+                self.prefixes[ignore_case].setdefault(len(key), {}).setdefault(key, index)
+            else:
+                flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+                try:
+                    compiled = re.compile(pattern, flags)
+                except re.error as ex:
+                    raise ValueError(f"Value mapping rule of '{field}': bad regex '{pattern}': {ex}") from None
+                if UNCOMBINABLE_REGEX.search(pattern):
+                    self.separate_rules.append((index, compiled.fullmatch))
+                    continue
+                combined.append((index, compiled))
+                parts.append(f"((?i:{pattern}))" if ignore_case else f"({pattern})")
+                self.regex_rules[group] = index
+                group += 1 + compiled.groups
+        self.fullmatch = None
+        if parts:
+            try:
+                self.fullmatch = re.compile("|".join(parts), re.DOTALL).fullmatch
+            except re.error:
+                # Not expected once the constructs above are set apart: match them all on their own then.
+                self.separate_rules = sorted(self.separate_rules + [(index, compiled.fullmatch)
+                                                                    for index, compiled in combined])
+                self.regex_rules = {}
+        self.first_regex = min(list(self.regex_rules.values()) + [index for index, _ in self.separate_rules],
+                               default=None)
+        self.match = functools.lru_cache(maxsize=RULES_MEMO_SIZE)(self._match)
+
+    def _match(self, text):
+        best = None
+        for ignore_case in (False, True):
+            key = text.lower() if ignore_case else text
+            index = self.exact[ignore_case].get(key)
+            if index is not None and (best is None or index < best):
+                best = index
+            for length, prefixes in self.prefixes[ignore_case].items():
+                index = prefixes.get(key[:length]) if len(key) >= length else None
+                if index is not None and (best is None or index < best):
+                    best = index
+        # The regex rules only matter if one of them comes before the best match so far.
+        if self.first_regex is not None and (best is None or self.first_regex < best):
+            if self.fullmatch is not None:
+                m = self.fullmatch(text)
+                if m is not None:
+                    index = self.regex_rules[m.lastindex]
+                    if best is None or index < best:
+                        best = index
+            for index, fullmatch in self.separate_rules:
+                if best is not None and index > best:
+                    break
+                if fullmatch(text) is not None:
+                    best = index
+                    break
+        if best is None:
+            return False, None
+        return True, self.values[best]
+
+
+def compile_value_map(field, sub_map):
+    """
+    Compile the value map of a field that has "$rules": exact entries are
+    looked up first, as before, then the rules are tried on text and number
+    values. Unmatched values are kept as they are.
+    """
+    exact = {raw: mapped for raw, mapped in sub_map.items() if raw != RULES_KEY}
+    match_rules = RuleMatcher(field, sub_map[RULES_KEY]).match
+
+    def map_value(raw_val):
+        if raw_val in exact:
+            return exact[raw_val]
+        if isinstance(raw_val, str):
+            matched, mapped = match_rules(raw_val)
+        elif isinstance(raw_val, (int, float)) and not isinstance(raw_val, bool):
+            matched, mapped = match_rules(str(raw_val))
+        else:
+            return raw_val
+        return mapped if matched else raw_val
+    return map_value
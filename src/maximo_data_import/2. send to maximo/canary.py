@@ -0,0 +1,267 @@
+import time
+import random
+
+from concurrent.futures import ThreadPoolExecutor
+
+CANARY_FRACTION_DEFAULT = 0.005
+CANARY_MIN_RECORDS_DEFAULT = 20
+CANARY_MAX_RECORDS_DEFAULT = 500
+CANARY_STRATA_DEFAULT = ["siteid", "type", "worktype"]
+CANARY_LEVELS_DEFAULT = [1, 2, 3]
+CANARY_CHUNK_SIZES_DEFAULT = [50, 100, 200]
+CANARY_MAX_ERROR_RATE_DEFAULT = 0.2
+CANARY_MAX_LATENCY_FACTOR_DEFAULT = 2.0
+
+
+def allocate_shares(sizes, budget):
+    """
+    Split `budget` between strata of `sizes` (largest first) in proportion to
+    their size, by largest remainder: every stratum gets the whole part of its
+    quota and the records left go to the largest fractional parts, so the
+    shares add up to the budget. Every stratum gets at least one record while
+    the budget allows it (the largest ones first), taken back from the most
+    over-served strata; no share exceeds its stratum.
+    """
+    if budget <= len(sizes):
+        return [1] * budget + [0] * (len(sizes) - budget)
+
+    total = sum(sizes)
+    quotas = [budget * size / total for size in sizes]
+    shares = [min(size, max(1, int(quota))) for size, quota in zip(sizes, quotas)]
+    left = budget - sum(shares)
+
+    while left < 0:
+        over = max((i for i, share in enumerate(shares) if share > 1), key=lambda i: shares[i] - quotas[i])
+        shares[over] -= 1
+        left += 1
+
+    by_remainder = sorted(range(len(sizes)), key=lambda i: quotas[i] - int(quotas[i]), reverse=True)
+    while left > 0:
+        open_strata = [i for i in by_remainder if shares[i] < sizes[i]]
+        if not open_strata:
+            break
+        for i in open_strata[:left]:
+            shares[i] += 1
+        left -= min(left, len(open_strata))
+    return shares
+
+
+def stratified_sample(pairs, strata_fields, fraction, min_records, max_records, seed=0):
+    """
+    Pick a sample of (index, record) pairs spread across the strata defined
+    by `strata_fields` (e.g. site and type), see allocate_shares: the sample
+    has exactly `budget` records.
+    The sample is returned in original index order.
+    """
+    budget = int(round(len(pairs) * fraction))
+    budget = max(min_records, min(max_records, budget))
+    budget = min(budget, len(pairs))
+    if budget <= 0:
+        return []
+
+    strata = {}
+    for pair in pairs:
+        key = tuple(str(pair[1].get(f)) for f in strata_fields)
+        strata.setdefault(key, []).append(pair)
+
+    rng = random.Random(seed)
+    ordered = sorted(strata.values(), key=len, reverse=True)
+    shares = allocate_shares([len(members) for members in ordered], budget)
+
+    picked = []
+    for members, share in zip(ordered, shares):
+        picked.extend(rng.sample(members, share))
+
+    return sorted(picked, key=lambda pair: pair[0])
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[pos]
+
+
+def _run_step(segment, send_record, concurrency, submit_interval):
+    """
+    Send `segment` with `concurrency` workers. Returns the measurements of the step.
+    The `submit_interval` pause is taken by each worker after its request (and
+    left out of the latency), so the rate scales with the concurrency instead
+    of capping every level at the same submission rate.
+    """
+    latencies = []
+    errors = {}
+
+    def timed_send(idx, rec):
+        start = time.perf_counter()
+        ok, code = send_record(idx, rec)
+        latency = time.perf_counter() - start
+        if submit_interval:
+            time.sleep(submit_interval)
+        return ok, code, latency
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for idx, rec in segment:
+            futures.append(executor.submit(timed_send, idx, rec))
+        for fut in futures:
+            try:
+                ok, code, latency = fut.result()
+            except Exception:
+                ok, code, latency = False, "EXCEPTION", 0.0
+            latencies.append(latency)
+            if not ok:
+                errors[code] = errors.get(code, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "records": len(segment),
+        "errors": errors,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "per_record_p50": _percentile(latencies, 50),
+        "throughput": len(segment) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _run_bulk_step(segment, send_chunk, chunk_size):
+    """
+    Send `segment` in BULK chunks of `chunk_size`. Latencies are per chunk;
+    the per-record latency divides each one by the records its chunk really
+    held, as the last chunk may be short.
+    """
+    errors = {}
+    latencies = []
+    per_record = []
+    start = time.perf_counter()
+    for pos in range(0, len(segment), chunk_size):
+        chunk = segment[pos:pos + chunk_size]
+        chunk_start = time.perf_counter()
+        try:
+            results = send_chunk(chunk)
+        except Exception:
+            results = [(idx, False, "EXCEPTION") for idx, _ in chunk]
+        latencies.append(time.perf_counter() - chunk_start)
+        per_record.append(latencies[-1] / len(chunk))
+        for _, ok, code in results:
+            if not ok:
+                errors[code] = errors.get(code, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "records": len(segment),
+        "errors": errors,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "per_record_p50": _percentile(per_record, 50),
+        "throughput": len(segment) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _fillable_levels(levels, sample_size):
+    """
+    The bulk chunk sizes the sample can fill: the largest ones are dropped
+    until every segment holds at least a full chunk. The smallest level is
+    always kept, so errors are still measured on a small sample.
+    """
+    kept = sorted(levels)
+    while len(kept) > 1 and kept[-1] > sample_size // len(kept):
+        kept.pop()
+    return [level for level in levels if level in kept]
+
+
+def _split(sample, parts):
+    """
+    Split `sample` into `parts` interleaved segments so every segment sees
+    the same mix of strata.
+    """
+    return [sample[i::parts] for i in range(parts)]
+
+
+def run_canary(pairs, canary_config, send_record=None, send_chunk=None, submit_interval=0.1):
+    """
+    Send a stratified sample of `pairs` before the main run.
+
+    The sample is split in one segment per concurrency level (or per bulk
+    chunk size when `send_chunk` is given); each segment is sent at its
+    level while latency, throughput and errors per BMXAA code are measured.
+
+    Args:
+        pairs          (list): (index, record) pairs of the whole run.
+        canary_config  (dict): The "canary" entry of the sender config.
+        send_record    (callable): (index, record) -> (success, error_code).
+        send_chunk     (callable): [(index, record)] -> [(index, success, error_code)].
+        submit_interval (float): Pause of each worker after a request.
+
+    Returns:
+        dict: report with 'sample' (indices sent), 'steps', 'errors',
+              'error_rate', 'abort' and the chosen 'concurrency' / 'chunk_size'.
+    """
+    sample = stratified_sample(
+        pairs,
+        canary_config.get("strata", CANARY_STRATA_DEFAULT),
+        canary_config.get("fraction", CANARY_FRACTION_DEFAULT),
+        canary_config.get("min_records", CANARY_MIN_RECORDS_DEFAULT),
+        canary_config.get("max_records", CANARY_MAX_RECORDS_DEFAULT),
+    )
+
+    if send_chunk:
+        levels = canary_config.get("chunk_sizes", CANARY_CHUNK_SIZES_DEFAULT)
+        fillable = _fillable_levels(levels, len(sample))
+        if len(fillable) < len(levels):
+            skipped = [level for level in levels if level not in fillable]
+            print(f"Canary: chunk size(s) {', '.join(map(str, skipped))} skipped, "
+                  f"the sample of {len(sample)} record(s) can't fill them.")
+        levels = fillable
+    else:
+        levels = canary_config.get("concurrency_levels", CANARY_LEVELS_DEFAULT)
+
+    steps = []
+    for level, segment in zip(levels, _split(sample, len(levels))):
+        if not segment:
+            continue
+        if send_chunk:
+            step = _run_bulk_step(segment, send_chunk, level)
+        else:
+            step = _run_step(segment, send_record, level, submit_interval)
+        step["level"] = level
+        steps.append(step)
+        print(
+            f"Canary step {level}: {step['records']} record(s), "
+            f"{sum(step['errors'].values())} error(s), p50={step['p50']:.2f}s, "
+            f"p95={step['p95']:.2f}s, {step['throughput']:.2f} records/s"
+        )
+
+    errors = {}
+    for step in steps:
+        for code, count in step["errors"].items():
+            errors[code] = errors.get(code, 0) + count
+    error_rate = sum(errors.values()) / len(sample) if sample else 0.0
+    max_error_rate = canary_config.get("max_error_rate", CANARY_MAX_ERROR_RATE_DEFAULT)
+
+    # Best throughput among the levels whose latency didn't blow up compared to the first one.
+    # A higher level has to be clearly faster (5%) to be preferred over a lower one.
+    chosen = steps[0]["level"] if steps else None
+    if steps:
+        max_factor = canary_config.get("max_latency_factor", CANARY_MAX_LATENCY_FACTOR_DEFAULT)
+        baseline = steps[0]["per_record_p50"]
+        best_throughput = -1.0
+        for step in steps:
+            per_record = step["per_record_p50"]
+            if baseline and per_record > baseline * max_factor:
+                continue
+            if step["throughput"] > best_throughput * 1.05:
+                best_throughput = step["throughput"]
+                chosen = step["level"]
+
+    return {
+        "sample": [idx for idx, _ in sample],
+        "steps": steps,
+        "errors": errors,
+        "error_rate": error_rate,
+        "abort": error_rate > max_error_rate,
+        "concurrency": None if send_chunk else chosen,
+        "chunk_size": chosen if send_chunk else None,
+    }
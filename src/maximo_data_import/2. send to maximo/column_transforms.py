@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import functools
+
+MEMO_SIZE_DEFAULT = 65536  # distinct values remembered per memoized column
+STEP_SEPARATOR = "|"
+
+# name -> (factory, memoize_by_default). A factory takes the optional argument
+# of the step ('prefix:SITE-' -> 'SITE-', None without one) and returns the
+# function applied to every value of the column.
+TRANSFORMS = {}
+
+# Transforms whose argument is a file path, resolved relative to the spec file.
+PATH_ARGUMENT_TRANSFORMS = {"lookup"}
+
+
+def register_transform(name, memoize=False):
+    """
+    Register a column transform factory under `name`. Transforms that are
+    costly per value but see the same values over and over (e.g. person
+    names) should set `memoize`, so their results are cached per column.
+    """
+    def decorator(factory):
+        TRANSFORMS[name] = (factory, memoize)
+        return factory
+    return decorator
+
+
+def transform_person(value):
+    """
+    Transform a person name by taking the first letter of the first name
+    and concatenating it with the entire last name, all in uppercase.
+    For example, 'Karl Humphrey' becomes 'KHUMPHREY'.
+    """
+    if not value.strip():
+        return value
+    parts = value.strip().split()
+    if len(parts) < 2:
+        return value
+    return (parts[0][0] + parts[-1]).upper()
+
+
+@register_transform("person", memoize=True)
+def person_transform(arg=None):
+    return transform_person
+
+
+@register_transform("trim")
+def trim_transform(arg=None):
+    return str.strip
+
+
+@register_transform("upper")
+def upper_transform(arg=None):
+    return str.upper
+
+
+@register_transform("lower")
+def lower_transform(arg=None):
+    return str.lower
+
+
+PHONE_STRIP_PATTERN = re.compile(r"[^\d]")
+
+
+@register_transform("phone", memoize=True)
+def phone_transform(arg=None):
+    """
+    Keep the digits of a phone number (and a leading '+'). With an argument,
+    e.g. 'phone:+1', numbers without a '+' get that country prefix. Values
+    without any digit are left unchanged.
+    """
+    def normalize(value):
+        trimmed = value.strip()
+        if not trimmed:
+            return value
+        digits = PHONE_STRIP_PATTERN.sub("", trimmed)
+        if not digits:
+            return value
+        if trimmed.startswith("+"):
+            return "+" + digits
+        return (arg or "") + digits
+    return normalize
+
+
+@register_transform("prefix")
+def prefix_transform(arg=None):
+    """
+    Prepend the argument to non-empty values that don't start with it yet,
+    e.g. 'prefix:BEDFORD-' for site-qualified codes.
+    """
+    if not arg:
+        raise ValueError("The 'prefix' transform needs an argument, e.g. prefix:SITE-")
+
+    def add_prefix(value):
+        if not value.strip() or value.startswith(arg):
+            return value
+        return arg + value
+    return add_prefix
+
+
+@register_transform("default")
+def default_transform(arg=None):
+    """
+    Replace empty values with the argument.
+    """
+    def fill(value):
+        return value if value.strip() else (arg or "")
+    return fill
+
+
+@register_transform("lookup")
+def lookup_transform(arg=None):
+    """
+    Map values through a JSON object file ('lookup:sites.json'); values
+    missing from the file are left unchanged.
+    """
+    if not arg:
+        raise ValueError("The 'lookup' transform needs a JSON file, e.g. lookup:sites.json")
+    with open(arg, "r", encoding="utf-8") as f:
+        table = json.load(f)
+    if not isinstance(table, dict):
+        raise ValueError(f"Lookup file '{arg}' must contain a JSON object.")
+    table = {str(k): "" if v is None else str(v) for k, v in table.items()}
+    get = table.get
+
+    def lookup(value):
+        return get(value, value)
+    return lookup
+
+
+def parse_steps(steps, base_dir=None):
+    """
+    Turn 'trim|upper|prefix:SITE-' (or a list of 'name[:arg]') into a tuple of
+    (name, arg) steps, checking every name against the registry.
+    """
+    if isinstance(steps, str):
+        steps = steps.split(STEP_SEPARATOR)
+    parsed = []
+    for step in steps:
+        name, sep, arg = step.strip().partition(":")
+        if name not in TRANSFORMS:
+            raise ValueError(f"Unknown transform '{name}'. Available: {', '.join(sorted(TRANSFORMS))}")
+        arg = arg if sep else None
+        if arg and base_dir and name in PATH_ARGUMENT_TRANSFORMS and not os.path.isabs(arg):
+            arg = os.path.join(base_dir, arg)
+        parsed.append((name, arg))
+    return tuple(parsed)
+
+
+def column_spec(value, base_dir=None):
+    """
+    Normalize one column entry into a hashable (steps, memo_size) spec.
+
+    An entry is a step string ('trim|upper'), a list of steps, or an object
+    {"transforms": [...], "memo": N}. Without "memo", the chain is memoized
+    (MEMO_SIZE_DEFAULT) when one of its transforms asks for it; "memo": 0
+    turns memoization off.
+    """
+    memo = None
+    if isinstance(value, dict):
+        memo = value.get("memo")
+        value = value.get("transforms", [])
+    steps = parse_steps(value, base_dir)
+    if memo is None:
+        memo = MEMO_SIZE_DEFAULT if any(TRANSFORMS[name][1] for name, _ in steps) else 0
+    return steps, int(memo)
+
+
+def normalize_column_transforms(mapping, base_dir=None):
+    """
+    {column: entry} -> {lower-cased column: (steps, memo_size)}, see column_spec.
+    """
+    return {column.lower(): column_spec(value, base_dir) for column, value in (mapping or {}).items()}
+
+
+def load_transform_spec(path):
+    """
+    Load a JSON transform spec, e.g.
+        {
+          "reportedby": "person",
+          "siteid": ["trim", "upper"],
+          "location": {"transforms": ["trim", "prefix:BEDFORD-"], "memo": 10000}
+        }
+    Lookup files are relative to the spec file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise ValueError(f"Transform spec '{path}' must contain a JSON object of column: transforms.")
+    return normalize_column_transforms(spec, os.path.dirname(os.path.abspath(path)))
+
+
+@functools.lru_cache(maxsize=None)
+def compile_column_transform(steps, memo_size=0):
+    """
+    Compile a column's (name, arg) steps once into a single function applying
+    them in order, wrapped in a bounded memo cache when memo_size > 0.
+    Compiled chains are cached, so every chunk (and every worker) reuses them.
+    """
+    functions = tuple(TRANSFORMS[name][0](arg) for name, arg in steps)
+    if len(functions) == 1:
+        chain = functions[0]
+    else:
+        def chain(value):
+            for function in functions:
+                value = function(value)
+            return value
+    if memo_size:
+        chain = functools.lru_cache(maxsize=memo_size)(chain)
+    return chain
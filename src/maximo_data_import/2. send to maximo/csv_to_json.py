@@ -1,15 +1,37 @@
 import csv
+import codecs
+import io
 import json
+import mmap
 import threading
+import multiprocessing
 from queue import Queue
 import argparse
 import os
 import re
+import functools
+import itertools
+import pickle
+import traceback
+from contextlib import closing
 from datetime import datetime
 
+from xlsx_reader import (is_workbook, iter_sheet_rows, open_sheet, require_openpyxl, row_text,
+                         typed_date_positions, untyped_row_text)
+from column_transforms import (TRANSFORMS, compile_column_transform, load_transform_spec,
+                               normalize_column_transforms, transform_person)
+from record_io import BINARY_SUFFIX, BinaryRecordWriter, ManifestWriter, pack_record, require_msgpack
+from fingerprint_index import FingerprintIndex
+
 CHUNK_SIZE_DEFAULT = 10000
 THREADS_DEFAULT = 4
+BACKENDS = ('threads', 'processes')
+READ_MODES = ('sequential', 'mmap')
+MIN_RANGE_SIZE = 64 * 1024  # smallest byte range handed to a worker in mmap read mode
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
+DATE_SAMPLE_ROWS_DEFAULT = 1000
+LINE_NUMBER_FIELD = '_csvline'  # with --line-numbers, the CSV line each record starts on
+DATE_COLUMN_MIN_RATIO = 0.5  # share of sampled non-empty values that must parse for a date column
 
 INDEXED_BRACKET_PATTERN = re.compile(r'^([^,\[\{]+)\[(\d+)\]\[([^,\]]+)\]$')
 BRACKET_PATTERN = re.compile(r'^([^,\[\{]+)\[([^,\]]+)\]$')
@@ -45,18 +67,158 @@ def parse_date_if_match(value):
     return None
 
 
-def transform_person(value):
+# Regex fragments for the strptime directives the fast date parser understands.
+DATE_DIRECTIVE_PATTERNS = {
+    'Y': r'(?P<year>\d{4})',
+    'm': r'(?P<month>\d{1,2})',
+    'd': r'(?P<day>\d{1,2})',
+    'H': r'(?P<hour>\d{1,2})',
+    'M': r'(?P<minute>\d{1,2})',
+    'S': r'(?P<second>\d{1,2})',
+}
+
+
+def _compile_date_format(fmt):
+    """
+    Turn a strptime format into an anchored regex with named groups,
+    or None if it uses a directive the fast parser doesn't know.
     """
-    Transform a person name by taking the first letter of the first name
-    and concatenating it with the entire last name, all in uppercase.
-    For example, 'Karl Humphrey' becomes 'KHUMPHREY'.
+    parts = []
+    seen = set()
+    pos = 0
+    while pos < len(fmt):
+        char = fmt[pos]
+        if char == '%' and pos + 1 < len(fmt):
+            directive = fmt[pos + 1]
+            if directive not in DATE_DIRECTIVE_PATTERNS or directive in seen:
+                return None
+            seen.add(directive)
+            parts.append(DATE_DIRECTIVE_PATTERNS[directive])
+            pos += 2
+        elif char.isspace():
+            parts.append(r'\s+')
+            pos += 1
+        else:
+            parts.append(re.escape(char))
+            pos += 1
+    if not {'Y', 'm', 'd'} <= seen:
+        return None
+    return re.compile(''.join(parts))
+
+
+@functools.lru_cache(maxsize=None)
+def make_date_parser(formats):
     """
-    if not value.strip():
-        return value
-    parts = value.strip().split()
-    if len(parts) < 2:
-        return value 
-    return (parts[0][0] + parts[-1]).upper()
+    Build the parser of a date column from its inferred format(s).
+
+    Formats made of %Y %m %d %H %M %S are matched with one precompiled regex each
+    instead of datetime.strptime; any other format falls back to strptime.
+    The parser returns the ISO 8601 string, or the value unchanged when it
+    doesn't match the column's format(s).
+    """
+    matchers = []
+    for fmt in formats:
+        pattern = _compile_date_format(fmt)
+        if pattern is not None:
+            matchers.append((pattern, None))
+        else:
+            matchers.append((None, fmt))
+
+    def parse(val):
+        trimmed = val.strip()
+        if not trimmed:
+            return val
+        for pattern, fmt in matchers:
+            try:
+                if pattern is None:
+                    return datetime.strptime(trimmed, fmt).isoformat()
+                match = pattern.fullmatch(trimmed)
+                if match:
+                    parts = match.groupdict()
+                    return datetime(
+                        int(parts['year']), int(parts['month']), int(parts['day']),
+                        int(parts.get('hour') or 0), int(parts.get('minute') or 0), int(parts.get('second') or 0)
+                    ).isoformat()
+            except ValueError:
+                pass
+        return val
+
+    return parse
+
+
+def infer_date_columns(headers, sample_rows, min_ratio=DATE_COLUMN_MIN_RATIO):
+    """
+    Decide from a sample of rows which columns hold dates and in which format(s).
+
+    A column is a date column when at least 'min_ratio' of its non-empty sampled
+    values parse with one of POSSIBLE_DATE_FORMATS. Its formats are every known
+    format that matched, except that month-first and day-first variants never
+    go together: the one matching more values wins, and when both match every
+    value (e.g. only days <= 12 in the sample) month-first is kept and the
+    column is flagged as ambiguous.
+
+    Returns:
+        dict: { header: {'formats': [...], 'matched': int, 'values': int, 'ambiguous': bool} }
+              for the date columns only.
+    """
+    counts = [dict.fromkeys(POSSIBLE_DATE_FORMATS, 0) for _ in headers]
+    values = [0] * len(headers)
+    parsed = [0] * len(headers)
+
+    for row in sample_rows:
+        for position, val in enumerate(row[:len(headers)]):
+            trimmed = val.strip()
+            if not trimmed:
+                continue
+            values[position] += 1
+            matched_any = False
+            for fmt in POSSIBLE_DATE_FORMATS:
+                try:
+                    datetime.strptime(trimmed, fmt)
+                except ValueError:
+                    continue
+                counts[position][fmt] += 1
+                matched_any = True
+            if matched_any:
+                parsed[position] += 1
+
+    plan = {}
+    for position, header in enumerate(headers):
+        if not values[position] or parsed[position] < values[position] * min_ratio:
+            continue
+        column_counts = counts[position]
+        formats = [fmt for fmt in POSSIBLE_DATE_FORMATS if column_counts[fmt]]
+        ambiguous = False
+        for month_first, day_first in (('%m/%d/%Y', '%d/%m/%Y'), ('%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S')):
+            if month_first in formats and day_first in formats:
+                if column_counts[day_first] > column_counts[month_first]:
+                    formats.remove(month_first)
+                else:
+                    ambiguous = ambiguous or column_counts[day_first] == column_counts[month_first]
+                    formats.remove(day_first)
+        plan[header] = {
+            'formats': formats,
+            'matched': parsed[position],
+            'values': values[position],
+            'ambiguous': ambiguous,
+        }
+    return plan
+
+
+def print_date_plan(plan, typed_columns=()):
+    """
+    Report the inferred date columns, so they can be checked and overridden with --date-columns.
+    'typed_columns' are the workbook columns holding typed date cells, which need no parsing.
+    """
+    if not plan and not typed_columns:
+        print("Date inference: no date columns found in the sample.")
+        return
+    print("Date inference (override with --date-columns COLUMN=FORMAT or COLUMN=none):")
+    for header in typed_columns:
+        print(f"  {header}: typed date cells, converted without parsing")
+    for header, info in plan.items():
+        note = " (ambiguous: no day above 12 in the sample, month first assumed)" if info['ambiguous'] else ""
+        print(f"  {header}: {' | '.join(info['formats'])} - {info['matched']}/{info['values']} sampled values{note}")
 
 
 def is_empty_value(val):
@@ -72,9 +234,157 @@ def is_empty_value(val):
     return val is None
 
 
-def parse_csv_chunk(chunk, headers, parse_dates=False, person_transform_columns=None, ignore_empty=False):
+# Kinds of target a column can be written to (see compile_header_plan).
+# --person-transform COLUMN is the same as --transform COLUMN=person (memoized).
+PERSON_COLUMN_SPEC = normalize_column_transforms({'person': 'person'})['person']
+
+PLAIN_COLUMN = 0    # header            -> row_dict[header]
+INDEXED_COLUMN = 1  # field[N][sub]     -> row_dict[field][N][sub]
+ARRAY_COLUMN = 2    # field[sub]        -> row_dict[field][0][sub]
+OBJECT_COLUMN = 3   # field{sub}        -> row_dict[field][sub]
+
+
+def parse_date_value(val):
+    """
+    Column transform used with 'parse_dates': convert the value if it matches a
+    known date/time format, otherwise return it unchanged.
+    """
+    if val.strip():
+        parsed = parse_date_if_match(val)
+        if parsed is not None:
+            return parsed
+    return val
+
+
+@functools.lru_cache(maxsize=32)
+def compile_header_plan(headers, parse_dates=False, person_transform_columns=None, date_formats=None,
+                        column_transforms=None):
+    """
+    Compile the CSV headers once into a row-builder plan, so rows are assembled
+    without matching any header pattern again.
+
+    Args:
+        headers (tuple[str]): CSV headers, already lower-cased.
+        parse_dates (bool): Add the date transform to every column.
+        person_transform_columns (frozenset[str]): Headers getting the person transform
+            (same as a 'person' entry in column_transforms).
+        date_formats (tuple): Per-column tuple of date formats (or None), as inferred by
+            infer_date_columns; only those columns get a date parser.
+        column_transforms (tuple): Sorted (header, (steps, memo_size)) pairs, see
+            column_transforms.column_spec; each column's steps are compiled once into
+            a single function, applied after the date parser.
+
+    Returns:
+        dict: {
+            'columns': list of (position, kind, field, index, subfield, transforms),
+            'indexed_fields': fields built from field[N][sub] headers,
+            'container_fields': fields built from field[sub] / field{sub} headers,
+        }
+    Plans are cached per headers/options, so runs on the same template reuse them.
+    """
+    columns = []
+    indexed_fields = []
+    container_fields = []
+    column_transforms = dict(column_transforms or ())
+
+    for position, h in enumerate(headers):
+        transforms = []
+        if date_formats is not None:
+            if position < len(date_formats) and date_formats[position]:
+                transforms.append(make_date_parser(date_formats[position]))
+        elif parse_dates:
+            transforms.append(parse_date_value)
+        if h in column_transforms:
+            transforms.append(compile_column_transform(*column_transforms[h]))
+        elif person_transform_columns and h in person_transform_columns:
+            transforms.append(compile_column_transform(*PERSON_COLUMN_SPEC))
+
+        indexed_bracket_match = INDEXED_BRACKET_PATTERN.match(h)
+        bracket_match = BRACKET_PATTERN.match(h)
+        brace_match = BRACE_PATTERN.match(h)
+        if indexed_bracket_match:
+            field = indexed_bracket_match.group(1)
+            columns.append((position, INDEXED_COLUMN, field,
+                            int(indexed_bracket_match.group(2)), indexed_bracket_match.group(3), tuple(transforms)))
+            if field not in indexed_fields:
+                indexed_fields.append(field)
+        elif bracket_match:
+            field = bracket_match.group(1)
+            columns.append((position, ARRAY_COLUMN, field, 0, bracket_match.group(2), tuple(transforms)))
+            if field not in container_fields:
+                container_fields.append(field)
+        elif brace_match:
+            field = brace_match.group(1)
+            columns.append((position, OBJECT_COLUMN, field, None, brace_match.group(2), tuple(transforms)))
+            if field not in container_fields:
+                container_fields.append(field)
+        else:
+            columns.append((position, PLAIN_COLUMN, h, None, None, tuple(transforms)))
+
+    return {
+        'columns': columns,
+        'indexed_fields': indexed_fields,
+        'container_fields': container_fields,
+    }
+
+
+def build_row(row, plan, ignore_empty=False):
+    """
+    Assemble one CSV row into a row-object following a compiled header plan.
+    With 'ignore_empty', cells still empty after their transforms are skipped
+    and empty objects/arrays are pruned once, after the whole row has been placed.
+    """
+    row_dict = {}
+    row_len = len(row)
+
+    for position, kind, field, index, subfield, transforms in plan['columns']:
+        if position >= row_len:
+            break
+        val = row[position]
+        # Transforms run first: 'default' exists to fill the empty cells.
+        for transform in transforms:
+            val = transform(val)
+        if ignore_empty and isinstance(val, str) and not val.strip():
+            continue
+
+        if kind == PLAIN_COLUMN:
+            row_dict[field] = val
+        elif kind == OBJECT_COLUMN:
+            if field not in row_dict:
+                row_dict[field] = {}
+            row_dict[field][subfield] = val
+        elif kind == ARRAY_COLUMN:
+            if field not in row_dict:
+                row_dict[field] = [{}]
+            row_dict[field][0][subfield] = val
+        else:
+            if field not in row_dict:
+                row_dict[field] = []
+            items = row_dict[field]
+            while len(items) <= index:
+                items.append({})
+            items[index][subfield] = val
+
+    if ignore_empty:
+        for field in plan['indexed_fields']:
+            if field in row_dict:
+                items = [obj for obj in row_dict[field] if not is_empty_value(obj)]
+                if items:
+                    row_dict[field] = items
+                else:
+                    del row_dict[field]
+        for field in plan['container_fields']:
+            if field in row_dict and is_empty_value(row_dict[field]):
+                del row_dict[field]
+
+    return row_dict
+
+
+def parse_csv_chunk(chunk, headers, parse_dates=False, person_transform_columns=None, ignore_empty=False,
+                    date_formats=None, line_numbers=None, column_transforms=None):
     """
     Convert a list of CSV rows (chunk) into a list of row-objects (dicts).
+      - Headers in the form field[N][subfield] go into row_dict["field"][N]["subfield"].
       - Headers in the form field[subfield] go into row_dict["field"][0]["subfield"].
       - Headers in the form field{subfield} go into row_dict["field"]["subfield"].
       - All other headers go into row_dict[header].
@@ -82,166 +392,400 @@ def parse_csv_chunk(chunk, headers, parse_dates=False, person_transform_columns=
     If 'parse_dates' is True, only fields matching any known date/time
     format are converted to UTC ISO8601 strings.
 
+    If 'date_formats' is given (one tuple of formats or None per header, see
+    infer_date_columns), only those columns are parsed, each with its own
+    format(s); 'parse_dates' is then ignored.
+
     If 'person_transform_columns' is provided (as a list of header names),
     then for any header in that list, the corresponding value is transformed
     using the person name rule (first letter of the first name + last name, all uppercase).
 
     If 'ignore_empty' is True, empty values will be excluded from the output.
     For objects and arrays, if all nested values are empty, the entire structure is excluded.
+
+    If 'line_numbers' is given (one CSV line number per row of the chunk),
+    each row-object gets it under LINE_NUMBER_FIELD.
+
+    If 'column_transforms' is given ({header: (steps, memo_size)}, see
+    column_transforms.normalize_column_transforms), each listed column goes
+    through its chain of registered transforms; it takes precedence over
+    'person_transform_columns' for the columns it lists.
+
+    The headers are compiled once into a plan (see compile_header_plan) and
+    every row is assembled through it.
     """
-    row_objects = []
-    for row in chunk:
-        row_dict = {}
-    
-        for h, val in zip(headers, row):
-            if ignore_empty and is_empty_value(val):
-                continue
+    plan = compile_header_plan(
+        tuple(headers),
+        parse_dates,
+        frozenset(person_transform_columns) if person_transform_columns else None,
+        tuple(date_formats) if date_formats is not None else None,
+        tuple(sorted(column_transforms.items())) if column_transforms else None
+    )
+    row_objects = [build_row(row, plan, ignore_empty) for row in chunk]
+    if line_numbers is not None:
+        for row_dict, line in zip(row_objects, line_numbers):
+            row_dict[LINE_NUMBER_FIELD] = line
+    return row_objects
 
-            if parse_dates and val.strip():
-                parsed = parse_date_if_match(val)
-                if parsed is not None:
-                    val = parsed
-            if person_transform_columns and h in person_transform_columns:
-                val = transform_person(val)
-
-            indexed_bracket_match = INDEXED_BRACKET_PATTERN.match(h)
-            if indexed_bracket_match:
-                field = indexed_bracket_match.group(1)
-                index = int(indexed_bracket_match.group(2))
-                subfield = indexed_bracket_match.group(3)
-                
-                if field not in row_dict:
-                    row_dict[field] = []
-                while len(row_dict[field]) <= index:
-                    row_dict[field].append({})
-                row_dict[field][index][subfield] = val
-                
-                # Clean up empty objects in arrays if ignore_empty is True
-                if ignore_empty:
-                    row_dict[field] = [obj for obj in row_dict[field] if not is_empty_value(obj)]
-                    if not row_dict[field]:
-                        del row_dict[field]
-                        
-            else:
-                bracket_match = BRACKET_PATTERN.match(h)
-                brace_match   = BRACE_PATTERN.match(h)
-                if bracket_match:
-                    field    = bracket_match.group(1)
-                    subfield = bracket_match.group(2)
-                    if field not in row_dict:
-                        row_dict[field] = [{}]
-                    row_dict[field][0][subfield] = val
-                    
-                    # Clean up empty objects in arrays if ignore_empty is True
-                    if ignore_empty and is_empty_value(row_dict[field][0]):
-                        del row_dict[field]
-                        
-                elif brace_match:
-                    field    = brace_match.group(1)
-                    subfield = brace_match.group(2)
-                    if field not in row_dict:
-                        row_dict[field] = {}
-                    row_dict[field][subfield] = val
-                    
-                    # Clean up empty objects if ignore_empty is True
-                    if ignore_empty and is_empty_value(row_dict[field]):
-                        del row_dict[field]
-                        
-                else:
-                    row_dict[h] = val
-        row_objects.append(row_dict)
+
+def iter_rows_with_lines(reader):
+    """
+    Yield (line_number, row) for every row of a csv.reader, where line_number
+    is the physical line the row starts on (rows may span several lines
+    when a quoted value contains newlines).
+    """
+    start = reader.line_num + 1
+    for row in reader:
+        yield start, row
+        start = reader.line_num + 1
+
+
+class ChunkFailure:
+    """
+    Placed onto the output queue by a worker whose chunk raised, in place of
+    the chunk's rows. The traceback does not survive the trip from a worker
+    process, so its text travels along; with 'check_pickle', an exception
+    that cannot be pickled is replaced by a RuntimeError carrying its message.
+    """
+
+    def __init__(self, seq, error, check_pickle=False):
+        self.seq = seq
+        self.traceback = traceback.format_exc()
+        if check_pickle:
+            try:
+                pickle.dumps(error)
+            except Exception:
+                error = RuntimeError(f"{type(error).__name__}: {error}")
+        self.error = error
+
+
+def convert_chunk(chunk, headers, options, serialize=None):
+    """
+    Convert one (sequence, rows, line_numbers) chunk into a list of
+    row-objects ('options' are the keyword arguments of parse_csv_chunk); in
+    mmap read mode 'rows' is a byte range tokenized here. With 'serialize',
+    every row-object is turned into UTF-8 JSON bytes ('json') or MessagePack
+    bytes ('msgpack').
+    """
+    seq, rows, line_numbers = chunk
+    if isinstance(rows, tuple):
+        rows, line_numbers = read_byte_range(*rows)
+    row_objects = parse_csv_chunk(rows, headers, line_numbers=line_numbers, **options)
+    if serialize == 'msgpack':
+        row_objects = [pack_record(row) for row in row_objects]
+    elif serialize:
+        row_objects = [json.dumps(row, ensure_ascii=False).encode('utf-8') for row in row_objects]
     return row_objects
 
 
-def worker(input_queue, output_queue, headers, parse_dates=False, person_transform_columns=None, ignore_empty=False):
+def worker(input_queue, output_queue, headers, options, serialize=None, check_pickle=False):
     """
     Worker thread function:
-      - Receives chunks of rows from 'input_queue'
-      - Converts them into a list of dictionaries
-      - Places that list onto 'output_queue'
+      - Receives (sequence, rows, line_numbers) chunks from 'input_queue'
+      - Converts them with convert_chunk and places (sequence, list) onto 'output_queue'
+      - If a chunk raises, places a ChunkFailure instead and discards the rest
+        of its input, so the reader is never left blocked on a full queue
+      - Places None onto 'output_queue' when done, so the consumer can
+        tell when every worker has finished
+    """
+    failed = False
+    try:
+        while True:
+            chunk = input_queue.get()
+            if chunk is None:
+                break
+            if failed:
+                continue
+            try:
+                row_objects = convert_chunk(chunk, headers, options, serialize)
+            except Exception as ex:
+                output_queue.put(ChunkFailure(chunk[0], ex, check_pickle))
+                failed = True
+                continue
+            output_queue.put((chunk[0], row_objects))
+    finally:
+        output_queue.put(None)
+
+
+def process_worker(input_queue, output_queue, headers, options, serialize='json'):
+    """
+    Worker process function (processes backend): same as worker, but with
+    'serialize' the rows travel back as bytes, so the writer never
+    re-serializes them, and failures are made safe to pickle.
+    """
+    worker(input_queue, output_queue, headers, options, serialize, check_pickle=True)
+
+
+def iter_row_chunks(rows, chunk_size, line_numbers=False):
+    """
+    Group rows into (rows, line_numbers) chunks of 'chunk_size'; line_numbers
+    is None unless 'rows' yields (line_number, row) pairs.
+    """
+    chunk_data = []
+    chunk_lines = [] if line_numbers else None
+    for item in rows:
+        if line_numbers:
+            line, row = item
+            chunk_lines.append(line)
+        else:
+            row = item
+        chunk_data.append(row)
+        if len(chunk_data) == chunk_size:
+            yield chunk_data, chunk_lines
+            chunk_data = []
+            chunk_lines = [] if line_numbers else None
+
+    if chunk_data:
+        yield chunk_data, chunk_lines
+
+
+def read_chunks(tasks, input_queue, num_workers, in_flight, stop, status):
+    """
+    Reader thread function:
+      - Tags every (rows, line_numbers) task with a sequence number and places
+        it onto 'input_queue' ('rows' is a list of CSV rows, or a byte range of
+        the file in mmap read mode)
+      - Takes an 'in_flight' slot per task, so reading never gets more than
+        a bounded number of chunks ahead of the consumer
+      - Stops early once 'stop' is set
+      - Records the number of tasks (or the exception raised) in 'status'
+        and always ends with one None per worker
+    """
+    seq = 0
+    try:
+        for rows, line_numbers in tasks:
+            in_flight.acquire()
+            if stop.is_set():
+                return
+            input_queue.put((seq, rows, line_numbers))
+            seq += 1
+    except Exception as ex:
+        status['error'] = ex
+    finally:
+        status['chunks'] = seq
+        for _ in range(num_workers):
+            input_queue.put(None)
+
+
+def supports_byte_ranges(encoding):
+    """
+    Byte ranges can only be cut at newlines when newline, quote and comma are
+    single ASCII bytes in the file's encoding (not the case for UTF-16).
+    """
+    try:
+        return '\n",'.encode(encoding) == b'\n",'
+    except LookupError:
+        return False
+
+
+def next_record_boundary(mm, pos, inside_quotes=False):
+    """
+    Return the offset just after the first newline at or after 'pos' that is
+    not inside a quoted value, given whether 'pos' itself is inside one.
+    Quote parity is enough to tell, since quotes inside a quoted value are doubled.
+    Returns len(mm) if there is none.
     """
     while True:
-        chunk = input_queue.get()
-        if chunk is None:
-            input_queue.task_done()
-            break
+        newline = mm.find(b'\n', pos)
+        if newline == -1:
+            return len(mm)
+        if mm[pos:newline].count(b'"') % 2:
+            inside_quotes = not inside_quotes
+        if not inside_quotes:
+            return newline + 1
+        pos = newline + 1
 
-        row_objects = parse_csv_chunk(
-            chunk,
-            headers,
-            parse_dates=parse_dates,
-            person_transform_columns=person_transform_columns,
-            ignore_empty=ignore_empty
-        )
-        output_queue.put(row_objects)
-        input_queue.task_done()
 
+def split_byte_ranges(mm, data_start, range_size):
+    """
+    Split the data part of a memory-mapped CSV into (start, end, first_line)
+    byte ranges of about 'range_size' bytes, each ending at a record boundary,
+    so every range can be tokenized on its own. 'first_line' is the CSV line
+    the range starts on.
+    """
+    ranges = []
+    start = data_start
+    line = mm[:data_start].count(b'\n') + 1
+    size = len(mm)
+    while start < size:
+        target = start + range_size
+        if target >= size:
+            end = size
+        else:
+            inside_quotes = mm[start:target].count(b'"') % 2 == 1
+            end = next_record_boundary(mm, target, inside_quotes)
+        ranges.append((start, end, line))
+        line += mm[start:end].count(b'\n')
+        start = end
+    return ranges
+
+
+# A quote with a non-separator character on both sides (e.g. 12" pipe) is a literal quote in an
+# unquoted value: it breaks quote parity, so such files can't be split into byte ranges.
+UNSAFE_QUOTE_PATTERN = re.compile(rb'[^,\r\n"]"[^,\r\n"]')
+
+
+def plan_byte_ranges(input_file, encoding, chunk_size):
+    """
+    Memory-map the CSV and plan the byte ranges of the mmap read mode.
+    Ranges hold about 'chunk_size' rows, estimated from the first megabyte.
+
+    Returns:
+        list: (input_file, start, end, encoding, first_line) per range, or None
+              when the file can't be split safely (encoding or quoting), in
+              which case the sequential reader must be used.
+    """
+    if not supports_byte_ranges(encoding):
+        return None
+    if encoding.lower().replace('_', '-') == 'utf-8-sig':
+        encoding = 'utf-8'
+
+    with open(input_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if UNSAFE_QUOTE_PATTERN.search(mm):
+                return None
+
+            bom = len(codecs.BOM_UTF8) if mm[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8 else 0
+            data_start = next_record_boundary(mm, bom)
+            if data_start >= len(mm):
+                return []
+
+            sample = mm[data_start:data_start + 1024 * 1024]
+            bytes_per_row = len(sample) / max(1, sample.count(b'\n'))
+            range_size = max(MIN_RANGE_SIZE, int(chunk_size * bytes_per_row))
+
+            ranges = split_byte_ranges(mm, data_start, range_size)
+            if ranges and mm[ranges[-1][0]:].count(b'"') % 2:
+                return None  # ends inside a quoted value
 
-def open_new_file(file_index, base_filename):
+    return [(input_file, start, end, encoding, first_line) for start, end, first_line in ranges]
+
+
+def read_byte_range(input_file, start, end, encoding, first_line, line_numbers=False):
+    """
+    Tokenize one byte range of the CSV (mmap read mode), in the worker.
+    Returns (rows, line numbers or None) like a chunk of the sequential reader.
+    """
+    with open(input_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = mm[start:end].decode(encoding)
+
+    reader = csv.reader(io.StringIO(text, newline=''), delimiter=',')
+    if not line_numbers:
+        return list(reader), None
+
+    rows = []
+    lines = []
+    for line, row in iter_rows_with_lines(reader):
+        rows.append(row)
+        lines.append(first_line + line - 1)
+    return rows, lines
+
+
+def open_new_file(file_index, base_filename, ndjson=False, manifest=None):
     """
     Helper to open a new JSON file named <base>_fileIndex.json
-    and write the initial '['.
+    and write the initial '[' (nothing for NDJSON, one object per line).
+    With a 'manifest' (record_io.ManifestWriter), the new part is registered in it.
     Returns the file handle, plus a state dict for tracking.
     """
     prefix, ext = os.path.splitext(base_filename)
     if not ext:
-        ext = '.json'
+        ext = '.ndjson' if ndjson else '.json'
     
     # Only add the file index if it's greater than 1 (meaning we've split the file)
     new_filename = f"{prefix}{ext}" if file_index == 1 else f"{prefix}_{file_index}{ext}"
     
-    f_out = open(new_filename, 'w', encoding='utf-8')
-    f_out.write("[")
+    f_out = open(new_filename, 'wb')
+    if not ndjson:
+        f_out.write(b"[")
     state = {
         'first_object': True,
-        'current_size': 1
+        'current_size': 0 if ndjson else 1,
+        'ndjson': ndjson,
+        'manifest': manifest
     }
+    if manifest is not None:
+        manifest.start_part(new_filename)
     return f_out, state, new_filename
 
 
-def writer(output_queue, base_filename):
+def close_file(f_out, state):
     """
-    Writer thread function:
-      - Consumes lists of row-objects from 'output_queue'
-      - Writes them into JSON files (each a valid array)
-        up to a maximum size limit (100 MB by default).
-      - Each file: [object1,object2,...]
-      - Only splits into multiple files if size exceeds MAX_FILE_SIZE
+    Helper to terminate the JSON array (if any) and close the file.
     """
-    file_index = 1
-    f_out, state, current_filename = open_new_file(file_index, base_filename)
+    if not state['ndjson']:
+        f_out.write(b"]")
+    f_out.close()
 
-    while True:
-        chunk_of_rows = output_queue.get()
-        if chunk_of_rows is None:
-            output_queue.task_done()
-            break
 
-        for row_dict in chunk_of_rows:
-            row_json = json.dumps(row_dict, ensure_ascii=False)
-            size_needed = len(row_json)
-            if not state['first_object']:
-                size_needed += 1 
+def write_rows(chunk_of_rows, f_out, state, file_index, base_filename):
+    """
+    Append one chunk of row-objects (dicts, or JSON bytes already serialized
+    by the processes backend) to the current file, starting a new file
+    whenever the next row would push it over MAX_FILE_SIZE. Sizes are counted
+    in UTF-8 bytes, so they are also exact byte offsets for the manifest.
+      - JSON file: [object1,object2,...]
+      - NDJSON file: one object per line
+    Returns the (possibly new) file handle, state and file index.
+    """
+    ndjson = state['ndjson']
+    separator = b"\n" if ndjson else b","
+    closing = 0 if ndjson else 1
 
-            if (state['current_size'] + size_needed + 1) > MAX_FILE_SIZE and not state['first_object']:
-                f_out.write("]")
-                f_out.close()
+    for row in chunk_of_rows:
+        if isinstance(row, bytes):
+            row_json = row
+        else:
+            row_json = json.dumps(row, ensure_ascii=False).encode('utf-8')
+        size_needed = len(row_json)
+        if ndjson or not state['first_object']:
+            size_needed += 1
 
-                file_index += 1
-                f_out, state, current_filename = open_new_file(file_index, base_filename)
+        if (state['current_size'] + size_needed + closing) > MAX_FILE_SIZE and not state['first_object']:
+            close_file(f_out, state)
 
-            if not state['first_object']:
-                f_out.write(",")
-                state['current_size'] += 1
+            file_index += 1
+            f_out, state, _ = open_new_file(file_index, base_filename, ndjson, state['manifest'])
 
-            f_out.write(row_json)
-            state['current_size'] += len(row_json)
-            state['first_object'] = False
+        if not ndjson and not state['first_object']:
+            f_out.write(separator)
+            state['current_size'] += 1
 
-        output_queue.task_done()
+        if state['manifest'] is not None:
+            state['manifest'].add(state['current_size'], len(row_json))
+        f_out.write(row_json)
+        state['current_size'] += len(row_json)
+        if ndjson:
+            f_out.write(separator)
+            state['current_size'] += 1
+        state['first_object'] = False
 
-    f_out.write("]")
-    f_out.close()
+    return f_out, state, file_index
+
+
+def write_split_output(chunks, output_file, ndjson=False, manifest=False):
+    """
+    Write chunks of row-objects (or serialized JSON bytes) to '<base>.json',
+    '<base>_2.json', ... split at MAX_FILE_SIZE, optionally with a manifest.
+    Also used by transform.py, so every stage splits its output the same way.
+
+    Returns:
+        int: number of files written.
+    """
+    manifest_writer = ManifestWriter(output_file, 'ndjson' if ndjson else 'json') if manifest else None
+    file_index = 1
+    f_out, state, _ = open_new_file(file_index, output_file, ndjson, manifest_writer)
+    try:
+        for chunk_of_rows in chunks:
+            f_out, state, file_index = write_rows(chunk_of_rows, f_out, state, file_index, output_file)
+    finally:
+        close_file(f_out, state)
+        if manifest_writer is not None:
+            manifest_writer.close()
+    return file_index
 
 
 def open_csv_with_fallback(filename, encodings=None):
@@ -269,79 +813,334 @@ def open_csv_with_fallback(filename, encodings=None):
     raise UnicodeDecodeError(f"Could not decode {filename} using these encodings: {encodings}")
 
 
-def csv_to_json_threads(input_file,
-                        output_file,
-                        num_threads=THREADS_DEFAULT,
-                        chunk_size=CHUNK_SIZE_DEFAULT,
-                        enc=None,
-                        parse_dates=False,
-                        person_transform_columns=None,
-                        ignore_empty=False):
+def iter_csv_chunks(input_file,
+                    num_threads=THREADS_DEFAULT,
+                    chunk_size=CHUNK_SIZE_DEFAULT,
+                    enc=None,
+                    parse_dates=False,
+                    person_transform_columns=None,
+                    ignore_empty=False,
+                    backend='threads',
+                    date_columns=None,
+                    date_sample_rows=DATE_SAMPLE_ROWS_DEFAULT,
+                    line_numbers=False,
+                    serialize=None,
+                    read_mode='sequential',
+                    sheet=None,
+                    column_transforms=None):
     """
-    Convert a CSV to JSON array-of-objects, but split output into ~100 MB files.
+    Run the conversion pipeline (reader thread -> workers -> this generator) and
+    yield the converted chunks as soon as they are ready.
 
-    Args:
-        input_file   (str): Path to the input CSV file.
-        output_file  (str): Base path for the output JSON files.
-        num_threads  (int): Number of worker threads for parallel chunk parsing.
-        chunk_size   (int): Number of CSV rows to read per chunk.
-        enc          (str): (Optional) Encoding to use. If None, try fallback encodings.
-        parse_dates  (bool): If True, only parse values matching known date/time formats.
-        person_transform_columns (list[str]): Optional list of CSV header names for which
-            the person transformation should be applied.
-        ignore_empty (bool): If True, empty values will be excluded from the output.
+    Chunks finish in any order, so they are held in a reorder buffer and yielded
+    strictly in CSV order: record indices (records_to_process, start_index)
+    always match the source rows. Reading never gets more than num_threads * 4
+    chunks ahead of the consumer, so memory stays bounded however slow the
+    consumer is (e.g. the sender).
+
+    Takes the same arguments as csv_to_json_threads, plus:
+        serialize (str): With the processes backend, yield rows as UTF-8 JSON ('json')
+            or MessagePack ('msgpack') bytes serialized in the workers instead of dicts.
+        read_mode (str): 'sequential' (default): one reader thread tokenizes the CSV.
+            'mmap': the file is memory-mapped and split into byte ranges at record
+            boundaries, and every worker tokenizes its own ranges. Falls back to
+            'sequential' when the encoding or the quoting makes safe splitting impossible.
+        sheet (str): For an Excel workbook (.xlsx/.xlsm), the sheet name or 1-based number
+            (default: the active sheet).
+        column_transforms (dict): {column: (steps, memo_size)} as returned by
+            column_transforms.normalize_column_transforms or load_transform_spec.
+
+    An Excel workbook is streamed in read-only mode and goes through the same
+    pipeline: the first non-blank row holds the headers, line numbers are sheet
+    row numbers, and typed date cells are written as ISO 8601 without going
+    through string date parsing.
+
+    Yields:
+        list: row-objects of one chunk.
     """
-    input_queue = Queue(maxsize=num_threads * 2)
-    output_queue = Queue(maxsize=num_threads * 2)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Must be one of: {', '.join(BACKENDS)}")
+    if read_mode not in READ_MODES:
+        raise ValueError(f"Unknown read mode '{read_mode}'. Must be one of: {', '.join(READ_MODES)}")
 
-    if enc:
+    workbook = is_workbook(input_file)
+    if workbook:
+        book, worksheet = open_sheet(input_file, sheet)
+        print(f"Opened {input_file}, sheet '{worksheet.title}' (read-only)")
+        f_in = closing(book)
+        if read_mode == 'mmap':
+            print("Workbooks can't be split into byte ranges, reading the sheet sequentially.")
+            read_mode = 'sequential'
+    elif enc:
         print(f"Opening {input_file} using encoding='{enc}'")
         f_in = open(input_file, 'r', encoding=enc, newline='')
+        used_enc = enc
     else:
         f_in, used_enc = open_csv_with_fallback(input_file)
         print(f"Opened {input_file} successfully with encoding='{used_enc}'")
 
+    status = {}
     with f_in:
-        reader = csv.reader(f_in, delimiter=',')
-        try:
-            headers = next(reader)
-            headers = [h.lstrip('\ufeff').lower() for h in headers]
-        except StopIteration:
-            raise ValueError("CSV file is empty or missing headers.")
+        if workbook:
+            sheet_rows = iter_sheet_rows(worksheet)
+            try:
+                _, header_values = next(sheet_rows)
+            except StopIteration:
+                raise ValueError("Sheet is empty or missing headers.")
+            headers = [h.lower() for h in row_text(header_values)]
+        else:
+            reader = csv.reader(f_in, delimiter=',')
+            try:
+                headers = next(reader)
+                headers = [h.lstrip('\ufeff').lower() for h in headers]
+            except StopIteration:
+                raise ValueError("CSV file is empty or missing headers.")
+            rows = iter_rows_with_lines(reader) if line_numbers else reader
 
-        workers = []
-        for _ in range(num_threads):
-            t = threading.Thread(
-                target=worker,
-                args=(input_queue, output_queue, headers, parse_dates, person_transform_columns, ignore_empty)
+        options = {'ignore_empty': ignore_empty}
+        column_transforms = dict(column_transforms or {})
+        for column in person_transform_columns or ():
+            column_transforms.setdefault(column.lower(), PERSON_COLUMN_SPEC)
+        for column in column_transforms:
+            if column not in headers:
+                print(f"Warning: transform column '{column}' is not in the CSV headers.")
+        if column_transforms:
+            # Fail on a bad spec (unknown transform, missing lookup file) before any worker starts.
+            for spec in column_transforms.values():
+                compile_column_transform(*spec)
+            options['column_transforms'] = column_transforms
+        # Overriding the date plan only means something with the date parsing on.
+        if parse_dates or date_columns:
+            typed_columns = []
+            if workbook:
+                raw_sample = list(itertools.islice(sheet_rows, date_sample_rows))
+                sheet_rows = itertools.chain(raw_sample, sheet_rows)
+                # Typed date cells are left out of the inference: they are converted as they are read.
+                sample = [untyped_row_text(values) for _, values in raw_sample]
+                typed = typed_date_positions(values for _, values in raw_sample)
+                typed_columns = [h for position, h in enumerate(headers) if position in typed]
+            else:
+                sample = list(itertools.islice(rows, date_sample_rows))
+                rows = itertools.chain(sample, rows)
+                if line_numbers:
+                    sample = [row for _, row in sample]
+            date_plan = infer_date_columns(headers, sample)
+            print_date_plan(date_plan, typed_columns)
+            formats = {header: info['formats'] for header, info in date_plan.items()}
+            for header, column_formats in (date_columns or {}).items():
+                if header.lower() not in headers:
+                    print(f"Warning: --date-columns column '{header}' is not in the CSV headers.")
+                formats[header.lower()] = column_formats
+            options['date_formats'] = tuple(
+                tuple(formats[h]) if formats.get(h) else None for h in headers
             )
-            t.start()
-            workers.append(t)
 
-        writer_thread = threading.Thread(
-            target=writer,
-            args=(output_queue, output_file)
+        if workbook:
+            if line_numbers:
+                rows = ((row_number, row_text(values)) for row_number, values in sheet_rows)
+            else:
+                rows = (row_text(values) for _, values in sheet_rows)
+
+        tasks = None
+        if read_mode == 'mmap':
+            ranges = plan_byte_ranges(input_file, used_enc, chunk_size)
+            if ranges is None:
+                print("Cannot split this file into byte ranges safely (encoding or quoting), "
+                      "falling back to the sequential reader.")
+            else:
+                print(f"Reading {len(ranges)} byte range(s) in parallel.")
+                tasks = ((byte_range + (line_numbers,), None) for byte_range in ranges)
+        if tasks is None:
+            tasks = iter_row_chunks(rows, chunk_size, line_numbers)
+
+        workers = []
+        if backend == 'processes':
+            input_queue = multiprocessing.Queue(maxsize=num_threads * 2)
+            output_queue = multiprocessing.Queue(maxsize=num_threads * 2)
+            for _ in range(num_threads):
+                p = multiprocessing.Process(
+                    target=process_worker,
+                    args=(input_queue, output_queue, headers, options, serialize),
+                    daemon=True
+                )
+                p.start()
+                workers.append(p)
+        else:
+            input_queue = Queue(maxsize=num_threads * 2)
+            output_queue = Queue(maxsize=num_threads * 2)
+            for _ in range(num_threads):
+                t = threading.Thread(
+                    target=worker,
+                    args=(input_queue, output_queue, headers, options),
+                    daemon=True
+                )
+                t.start()
+                workers.append(t)
+
+        # Chunks read but not yet consumed; bounds the reorder buffer.
+        in_flight = threading.Semaphore(num_threads * 4)
+        stop = threading.Event()
+        reader_thread = threading.Thread(
+            target=read_chunks,
+            args=(tasks, input_queue, num_threads, in_flight, stop, status),
+            daemon=True
         )
-        writer_thread.start()
+        reader_thread.start()
+
+        pending = {}
+        next_seq = 0
+        finished = 0
+        try:
+            while finished < num_threads:
+                item = output_queue.get()
+                if item is None:
+                    finished += 1
+                    continue
+                if isinstance(item, ChunkFailure):
+                    # The finally below stops the reader and drains the workers.
+                    if backend == 'processes':
+                        raise item.error from RuntimeError(f"Worker process traceback:\n{item.traceback}")
+                    raise item.error
+
+                seq, chunk_of_rows = item
+                pending[seq] = chunk_of_rows
+                while next_seq in pending:
+                    chunk_of_rows = pending.pop(next_seq)
+                    next_seq += 1
+                    yield chunk_of_rows
+                    in_flight.release()
+        finally:
+            if finished < num_threads:
+                # The consumer stopped early: stop reading and let the workers wind down.
+                stop.set()
+                in_flight.release()
+                while finished < num_threads:
+                    if output_queue.get() is None:
+                        finished += 1
+            reader_thread.join()
+            for w in workers:
+                w.join()
 
-        chunk_data = []
-        for i, row in enumerate(reader, start=1):
-            chunk_data.append(row)
-            if i % chunk_size == 0:
-                input_queue.put(chunk_data)
-                chunk_data = []
+    if 'error' in status:
+        raise status['error']
+    if next_seq != status.get('chunks'):
+        raise RuntimeError("A worker stopped before converting all of its chunks.")
 
-        if chunk_data:
-            input_queue.put(chunk_data)
 
-    for _ in range(num_threads):
-        input_queue.put(None)
-    input_queue.join()
+def iter_csv_records(input_file, **kwargs):
+    """
+    Yield the converted records of a CSV one by one, in CSV order, while the
+    rest of the file is still being converted. Takes the same keyword
+    arguments as csv_to_json_threads (except output_file).
+    """
+    for chunk_of_rows in iter_csv_chunks(input_file, **kwargs):
+        yield from chunk_of_rows
 
-    output_queue.put(None)
-    output_queue.join()
 
-    writer_thread.join()
+def csv_to_json_threads(input_file,
+                        output_file,
+                        num_threads=THREADS_DEFAULT,
+                        chunk_size=CHUNK_SIZE_DEFAULT,
+                        enc=None,
+                        parse_dates=False,
+                        person_transform_columns=None,
+                        ignore_empty=False,
+                        backend='threads',
+                        date_columns=None,
+                        date_sample_rows=DATE_SAMPLE_ROWS_DEFAULT,
+                        line_numbers=False,
+                        ndjson=False,
+                        read_mode='sequential',
+                        manifest=False,
+                        binary=False,
+                        sheet=None,
+                        column_transforms=None,
+                        fingerprint_file=None,
+                        fingerprint_key=None,
+                        deletions_file=None):
+    """
+    Convert a CSV to JSON array-of-objects, but split output into ~100 MB files.
+
+    Args:
+        input_file   (str): Path to the input CSV file.
+        output_file  (str): Base path for the output JSON files.
+        num_threads  (int): Number of workers (threads or processes) for parallel chunk parsing.
+        chunk_size   (int): Number of CSV rows to read per chunk.
+        enc          (str): (Optional) Encoding to use. If None, try fallback encodings.
+        parse_dates  (bool): If True, the first 'date_sample_rows' rows are sampled to infer
+            which columns hold dates and in which format; only those columns are parsed.
+        person_transform_columns (list[str]): Optional list of CSV header names for which
+            the person transformation should be applied (alias of a 'person' column transform).
+        ignore_empty (bool): If True, empty values will be excluded from the output.
+        backend      (str): 'threads' (default) or 'processes'. Chunk parsing is pure Python,
+            so only the processes backend scales with the number of cores.
+        date_columns (dict): Overrides of the inferred date columns, {header: [formats]};
+            an empty list (or None) marks the column as not a date column. Implies parse_dates.
+        date_sample_rows (int): Rows sampled for date inference.
+        line_numbers (bool): If True, every record gets the CSV line it starts on
+            under LINE_NUMBER_FIELD ('_csvline').
+        ndjson       (bool): If True, write NDJSON (one object per line) instead of JSON arrays.
+        read_mode    (str): 'sequential' (default) or 'mmap', see iter_csv_chunks.
+        manifest     (bool): If True, also write '<base>.manifest.json' and '<base>.idx',
+            mapping every record index to its part file, byte offset and length.
+        binary       (bool): If True, write a single '<base>.mpk' binary record file
+            (length-prefixed MessagePack with an offset index, see record_io) instead
+            of JSON; needs the optional 'msgpack' package.
+        sheet        (str): For an Excel workbook input (.xlsx/.xlsm), the sheet name or
+            1-based number (default: the active sheet); needs the optional 'openpyxl' package.
+        column_transforms (dict): {column: (steps, memo_size)} chains of registered column
+            transforms (see column_transforms.py), e.g. from load_transform_spec.
+        fingerprint_file (str): Fingerprint index of the previous run (see fingerprint_index.py):
+            only records that are new or changed since then are written, and the index is
+            updated once the output is complete.
+        fingerprint_key (list[str]): Business key fields of the records, for fingerprint_file.
+        deletions_file (str): With fingerprint_file, write the keys of the previous run that
+            are no longer in the input to this JSON file.
+
+    Records are written in CSV order whatever the number of workers, so record
+    indices (records_to_process, start_index) always match the source rows.
+    """
+    chunks = iter_csv_chunks(
+        input_file,
+        num_threads=num_threads,
+        chunk_size=chunk_size,
+        enc=enc,
+        parse_dates=parse_dates,
+        person_transform_columns=person_transform_columns,
+        ignore_empty=ignore_empty,
+        backend=backend,
+        date_columns=date_columns,
+        date_sample_rows=date_sample_rows,
+        line_numbers=line_numbers,
+        # Fingerprints are taken on the records, so workers can't hand back serialized bytes.
+        serialize=None if fingerprint_file else 'msgpack' if binary else 'json',
+        read_mode=read_mode,
+        sheet=sheet,
+        column_transforms=column_transforms
+    )
+
+    fingerprints = None
+    if fingerprint_file:
+        fingerprints = FingerprintIndex(fingerprint_file, fingerprint_key, ignore_fields=(LINE_NUMBER_FIELD,))
+        chunks = fingerprints.filter_chunks(chunks)
+
+    try:
+        if binary:
+            record_writer = BinaryRecordWriter(os.path.splitext(output_file)[0] + BINARY_SUFFIX)
+            try:
+                for chunk_of_rows in chunks:
+                    for row in chunk_of_rows:
+                        record_writer.write_packed(row if isinstance(row, bytes) else pack_record(row))
+            finally:
+                record_writer.close()
+        else:
+            write_split_output(chunks, output_file, ndjson, manifest)
+    except BaseException:
+        if fingerprints is not None:
+            fingerprints.abort()
+        raise
+    if fingerprints is not None:
+        fingerprints.commit(deletions_file)
 
 
 def main():
@@ -352,26 +1151,97 @@ def main():
             "Output may be split into multiple ~100MB JSON files."
         )
     )
-    parser.add_argument('input_csv', help='Path to the input CSV file')
+    parser.add_argument('input_csv', help='Path to the input CSV file, or an Excel workbook (.xlsx/.xlsm)')
     parser.add_argument('output_base', help='Base path/filename for the output JSON (e.g., output.json).')
     parser.add_argument('--threads', type=int, default=THREADS_DEFAULT,
-                        help=f'Number of worker threads (default: {THREADS_DEFAULT})')
+                        help=f'Number of worker threads, or processes with --backend processes (default: {THREADS_DEFAULT})')
+    parser.add_argument('--backend', choices=BACKENDS, default='threads',
+                        help=(
+                            "Run chunk parsing in worker 'threads' (default) or worker 'processes'. "
+                            "Parsing is pure Python, so use 'processes' to scale with the number of cores."
+                        ))
+    parser.add_argument('--read-mode', choices=READ_MODES, default='sequential',
+                        help=(
+                            "'sequential' (default): a single reader tokenizes the CSV. 'mmap': memory-map the file "
+                            "and let every worker tokenize its own byte range; use with --backend processes on "
+                            "multi-GB files. Falls back to 'sequential' when the file can't be split safely."
+                        ))
     parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE_DEFAULT,
                         help=f'Rows per chunk (default: {CHUNK_SIZE_DEFAULT})')
+    parser.add_argument('--sheet', type=str, default=None,
+                        help=(
+                            "For an Excel workbook, the sheet to convert, by name or 1-based number "
+                            "(default: the active sheet). Needs 'pip install openpyxl'."
+                        ))
     parser.add_argument('--encoding', type=str, default=None,
                         help='Optional file encoding. If omitted, the script tries multiple encodings.')
     parser.add_argument('--parse-dates', action='store_true',
                         help=(
-                            "If set, only fields matching known date/time formats "
-                            "are converted to UTC ISO 8601 strings."
+                            "If set, the date columns and their format are inferred from a sample "
+                            "of rows, and only those columns are converted to UTC ISO 8601 strings."
+                        ))
+    parser.add_argument('--date-columns', nargs='+', default=None, metavar='COLUMN=FORMAT',
+                        help=(
+                            "Override the inferred date columns (implies --parse-dates), e.g. "
+                            "'reportdate=%%d/%%m/%%Y' or 'description=none'. Separate several formats with '|'."
+                        ))
+    parser.add_argument('--date-sample-rows', type=int, default=DATE_SAMPLE_ROWS_DEFAULT,
+                        help=f'Rows sampled to infer the date columns (default: {DATE_SAMPLE_ROWS_DEFAULT})')
+    parser.add_argument('--ndjson', action='store_true',
+                        help=(
+                            "Write NDJSON (one JSON object per line) instead of JSON arrays. "
+                            "The sender reads .ndjson files as a stream."
+                        ))
+    parser.add_argument('--manifest', action='store_true',
+                        help=(
+                            "Also write <base>.manifest.json and <base>.idx, mapping every record index to its "
+                            "part file, byte offset and length, so single records can be read without loading "
+                            "the parts. The sender, transform.py and records_to_process reruns accept the manifest."
+                        ))
+    parser.add_argument('--binary', action='store_true',
+                        help=(
+                            "Write a single compact binary record file (<base>.mpk, length-prefixed MessagePack "
+                            "with an index) instead of JSON, for use as input of transform.py or the sender. "
+                            "Needs 'pip install msgpack'."
+                        ))
+    parser.add_argument('--line-numbers', action='store_true',
+                        help=(
+                            f"Add the CSV line each record starts on as '{LINE_NUMBER_FIELD}', so failures "
+                            "can be traced back to the source row. The sender strips it before sending."
+                        ))
+    parser.add_argument('--transform', nargs='+', default=None, metavar='COLUMN=NAME[:ARG]',
+                        help=(
+                            "Column transforms applied in order, separated with '|', e.g. 'siteid=trim|upper' "
+                            "or 'location=prefix:BEDFORD-'. Available: " + ", ".join(sorted(TRANSFORMS)) + ". "
+                            "Overrides --transform-spec for the same column."
+                        ))
+    parser.add_argument('--transform-spec', type=str, default=None,
+                        help=(
+                            "JSON file of column transforms, e.g. "
+                            "{\"siteid\": [\"trim\", \"upper\"], \"reportedby\": {\"transforms\": [\"person\"], \"memo\": 10000}}. "
+                            "'memo' bounds the cache of results for columns with many repeated values."
                         ))
     parser.add_argument('--person-transform', nargs='+', default=None,
                         help=(
-                            "One or more CSV column names for which person transformation should be applied. "
+                            "One or more CSV column names for which person transformation should be applied "
+                            "(same as --transform COLUMN=person). "
                             "For each value in these columns, the first letter of the first name will be concatenated "
                             "with the entire last name, and the result will be in uppercase. "
                             "For example, 'Karl Humphrey' becomes 'KHUMPHREY'."
                         ))
+    parser.add_argument('--fingerprint-index', type=str, default=None,
+                        help=(
+                            "Incremental conversion of a refreshed full export: only write the records that are "
+                            "new or changed since the run that wrote this index (per-record content fingerprints "
+                            "by --key). The file is created on the first run and updated on every run."
+                        ))
+    parser.add_argument('--key', nargs='+', default=None, metavar='FIELD',
+                        help="Business key field(s) of the records, for --fingerprint-index (e.g. assetnum siteid).")
+    parser.add_argument('--deletions', type=str, default=None,
+                        help=(
+                            "With --fingerprint-index, write the keys of the records that are no longer in the "
+                            "input to this JSON file."
+                        ))
     parser.add_argument('--ignore-empty', action='store_true',
                         help=(
                             "If set, empty values will be excluded from the output. "
@@ -381,10 +1251,54 @@ def main():
 
     args = parser.parse_args()
 
+    if args.binary:
+        if args.ndjson or args.manifest:
+            parser.error("--binary writes its own indexed file and can't be combined with --ndjson or --manifest.")
+        try:
+            require_msgpack()
+        except RuntimeError as ex:
+            parser.error(str(ex))
+
+    if args.fingerprint_index and not args.key:
+        parser.error("--fingerprint-index needs --key.")
+    if (args.key or args.deletions) and not args.fingerprint_index:
+        parser.error("--key and --deletions need --fingerprint-index.")
+
+    if is_workbook(args.input_csv):
+        try:
+            require_openpyxl()
+        except RuntimeError as ex:
+            parser.error(str(ex))
+    elif args.sheet:
+        parser.error("--sheet only applies to Excel workbooks (.xlsx/.xlsm).")
+
     person_transform_columns = None
     if args.person_transform:
         person_transform_columns = [col.lower() for col in args.person_transform]
 
+    column_transforms = {}
+    try:
+        if args.transform_spec:
+            column_transforms.update(load_transform_spec(args.transform_spec))
+        for spec in args.transform or ():
+            column, sep, steps = spec.partition('=')
+            if not sep or not column or not steps:
+                parser.error(f"Invalid --transform entry '{spec}', expected COLUMN=NAME[:ARG].")
+            column_transforms.update(normalize_column_transforms({column: steps}))
+        for spec in column_transforms.values():
+            compile_column_transform(*spec)
+    except (OSError, ValueError) as ex:
+        parser.error(str(ex))
+
+    date_columns = None
+    if args.date_columns:
+        date_columns = {}
+        for spec in args.date_columns:
+            column, sep, formats = spec.partition('=')
+            if not sep or not column:
+                parser.error(f"Invalid --date-columns entry '{spec}', expected COLUMN=FORMAT.")
+            date_columns[column] = [] if formats.lower() == 'none' else formats.split('|')
+
     csv_to_json_threads(
         input_file=args.input_csv,
         output_file=args.output_base,
@@ -393,7 +1307,20 @@ def main():
         enc=args.encoding,
         parse_dates=args.parse_dates,
         person_transform_columns=person_transform_columns,
-        ignore_empty=args.ignore_empty
+        ignore_empty=args.ignore_empty,
+        backend=args.backend,
+        date_columns=date_columns,
+        date_sample_rows=args.date_sample_rows,
+        line_numbers=args.line_numbers,
+        ndjson=args.ndjson,
+        read_mode=args.read_mode,
+        manifest=args.manifest,
+        binary=args.binary,
+        sheet=args.sheet,
+        column_transforms=column_transforms,
+        fingerprint_file=args.fingerprint_index,
+        fingerprint_key=args.key,
+        deletions_file=args.deletions
     )
 
 
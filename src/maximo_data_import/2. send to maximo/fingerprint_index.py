@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+
+from record_dedup import extract_key, key_digest
+
+FINGERPRINT_INDEX_VERSION = 1
+PREVIOUS_SUFFIX = ".prev"
+
+
+def record_fingerprint(record, ignore_fields=()):
+    """
+    64-bit digest of a record's content: same fields and values, same
+    fingerprint, whatever the key order. 'ignore_fields' (e.g. the CSV line
+    number) don't count, so rows that only moved in the file are unchanged.
+    """
+    if ignore_fields:
+        record = {field: value for field, value in record.items() if field not in ignore_fields}
+    raw = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+
+def spec_fingerprint(*specs):
+    """
+    Hex digest of JSON-able specs, stored as the index context: an index built
+    with other specs is not compared against.
+    """
+    raw = json.dumps(specs, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def iter_index_entries(path):
+    """
+    Yield the header, then (key, fingerprint) for every row of an index file:
+    a JSON header line, then one '<fingerprint hex>\\t<JSON key list>' line per row.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        yield json.loads(f.readline())
+        for line in f:
+            fingerprint, _, key = line.rstrip("\n").partition("\t")
+            yield tuple(json.loads(key)), int(fingerprint, 16)
+
+
+class FingerprintIndex:
+    """
+    Content fingerprints of the rows of the last run, by business key, so a
+    run over a refreshed full export only outputs new and changed rows.
+
+    The previous index is loaded as {key digest: fingerprint}; every row seen
+    is popped from it, so what is left at the end are the deleted keys. The
+    new index is written next to the old one while the run goes and only
+    replaces it on commit(), once the output is complete; the replaced index
+    is kept as '<index>.prev' so a failed load can be redone against it.
+    Rows without a business key are always output, and so are rows repeating
+    a key already seen in this run: only the first occurrence is indexed and
+    compared, the repeats are counted and left to the sender's dedup.
+    """
+
+    def __init__(self, path, key_fields, context="", ignore_fields=()):
+        self.path = path
+        self.key_fields = list(key_fields)
+        self.ignore_fields = frozenset(ignore_fields)
+        self.previous = {}
+        self.previous_path = None
+        self.seen = set()  # key digests of this run
+        self.new = self.changed = self.unchanged = self.unkeyed = self.repeated = 0
+
+        if os.path.exists(path):
+            entries = iter_index_entries(path)
+            header = next(entries)
+            if header.get("key") != self.key_fields:
+                print(f"Fingerprint index '{path}' was built on key {'+'.join(header.get('key') or [])}, "
+                      f"not {'+'.join(self.key_fields)}: every row is output.")
+            elif header.get("context", "") != context:
+                print(f"Fingerprint index '{path}' was built with other specs or reference files: every row is output.")
+            else:
+                self.previous = {key_digest(key): fingerprint for key, fingerprint in entries}
+                self.previous_path = path
+            entries.close()
+        else:
+            print(f"No fingerprint index '{path}' yet: every row is output and the index is created.")
+
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        header = {"version": FINGERPRINT_INDEX_VERSION, "key": self.key_fields, "context": context}
+        self.file.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+    def is_changed(self, record):
+        """
+        Record the row in the new index; True if it is new or changed.
+        """
+        key = extract_key(record, self.key_fields) if isinstance(record, dict) else None
+        if key is None:
+            self.unkeyed += 1
+            return True
+        digest = key_digest(key)
+        if digest in self.seen:
+            self.repeated += 1
+            return True
+        self.seen.add(digest)
+        fingerprint = record_fingerprint(record, self.ignore_fields)
+        self.file.write(f"{fingerprint:016x}\t{json.dumps(key, ensure_ascii=False)}\n")
+        old = self.previous.pop(digest, None)
+        if old is None:
+            self.new += 1
+            return True
+        if old == fingerprint:
+            self.unchanged += 1
+            return False
+        self.changed += 1
+        return True
+
+    def filter(self, records):
+        for record in records:
+            if self.is_changed(record):
+                yield record
+
+    def filter_chunks(self, chunks):
+        """
+        Chunks of records, keeping only new and changed ones (empty chunks are skipped).
+        """
+        for chunk in chunks:
+            kept = [record for record in chunk if self.is_changed(record)]
+            if kept:
+                yield kept
+
+    def deleted_keys(self):
+        """
+        Business keys of the previous run that were not seen in this one.
+        """
+        if not self.previous or self.previous_path is None:
+            return
+        entries = iter_index_entries(self.previous_path)
+        next(entries)
+        for key, _ in entries:
+            # Popped so a key repeated in the old index is only reported once.
+            if self.previous.pop(key_digest(key), None) is not None:
+                yield key
+
+    def commit(self, deletions_file=None):
+        """
+        Write the deletions list (if asked), then replace the index with the
+        new one and print a summary.
+        """
+        self.file.close()
+        deleted = 0
+        if deletions_file:
+            with open(deletions_file, "w", encoding="utf-8") as f:
+                f.write("[")
+                for key in self.deleted_keys():
+                    f.write(("," if deleted else "") + "\n" + json.dumps(dict(zip(self.key_fields, key)), ensure_ascii=False))
+                    deleted += 1
+                f.write("\n]\n")
+        else:
+            deleted = len(self.previous)
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + PREVIOUS_SUFFIX)
+        os.replace(self.tmp_path, self.path)
+
+        print(f"Fingerprints: {self.new} new, {self.changed} changed, {self.unchanged} unchanged (skipped), "
+              f"{deleted} deleted" + (f", {self.unkeyed} without key" if self.unkeyed else "")
+              + (f", {self.repeated} repeating a key of this run (output, not indexed)" if self.repeated else "") + ".")
+        if deletions_file:
+            print(f"Deleted keys written to '{deletions_file}'.")
+
+    def abort(self):
+        """
+        Leave the index as it was (the run failed).
+        """
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
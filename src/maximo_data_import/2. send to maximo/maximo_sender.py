@@ -1,15 +1,32 @@
+import re
 import sys
 import json
 import requests
 import time
+import itertools
+import os
+
+from collections.abc import Sequence
 
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.exceptions import RequestException
+from reference_validator import run_reference_checks
+from canary import run_canary
+from record_dedup import run_dedup
+from csv_to_json import iter_csv_records
+from record_io import is_record_file, iter_ndjson, open_records
+from xlsx_reader import is_workbook
 
 timestamp = datetime.now().timestamp()
 MAXAUTH_TOKEN = "<your_maximo_token>"
 FAILED_LOG_FILE = f"{timestamp}_failed_requests.log"
+FAILED_JSONL_FILE = f"{timestamp}_failed_requests.jsonl"
+
+BMXAA_CODE_PATTERN = re.compile(r'BMXAA\d{4}[A-Z]')
+BULK_CHUNK_SIZE = 200
+SOURCE_LINE_FIELD = "_csvline"  # added by csv_to_json.py --line-numbers, never sent to Maximo
+MAX_WORKERS = 3 # Process X at a time; NOT RECOMMENDED TO CHANGE SINCE MAXIMO SEEMS TO NOT HANDLE WELL MULTIPLE DATABASE CHANGES AT THE SAME TIME
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
@@ -26,6 +43,69 @@ def parse_response(response):
         return True, data
     return False, data
 
+def extract_error(parsed_resp):
+    """
+    Return (error_code, message) from a Maximo error response.
+    Looks for an 'Error' object (directly or under '_responsedata' for bulk
+    responses) and falls back to the first BMXAA code found in the text.
+    """
+    error_data = None
+    if isinstance(parsed_resp, dict):
+        error_data = parsed_resp.get("Error")
+        if error_data is None:
+            error_data = parsed_resp.get("_responsedata", {}).get("Error")
+
+    if isinstance(error_data, dict):
+        message = error_data.get("message", "")
+        code = error_data.get("reasonCode")
+        if not code:
+            match = BMXAA_CODE_PATTERN.search(message)
+            code = match.group(0) if match else None
+        return code, message
+
+    text = parsed_resp if isinstance(parsed_resp, str) else json.dumps(parsed_resp, ensure_ascii=False)
+    match = BMXAA_CODE_PATTERN.search(text)
+    return (match.group(0) if match else None), text[:500]
+
+def split_source_line(record):
+    """
+    Return (record without the CSV line number field, CSV line number or None).
+    """
+    if isinstance(record, dict) and SOURCE_LINE_FIELD in record:
+        record = dict(record)
+        return record, record.pop(SOURCE_LINE_FIELD)
+    return record, None
+
+def log_failure(err_msg, index=None, action=None, key=None, error_code=None,
+                message=None, status=None, record=None, log_prefix=None, line=None):
+    """
+    Append a failure to the human-readable log and a structured line
+    (one JSON object per failure) to the JSONL log used by the triage tools.
+    With `log_prefix`, the logs are '<log_prefix>_failed_requests.log/.jsonl'.
+    `line` is the CSV line the record came from, when known.
+    """
+    log_file = f"{log_prefix}_failed_requests.log" if log_prefix else FAILED_LOG_FILE
+    jsonl_file = f"{log_prefix}_failed_requests.jsonl" if log_prefix else FAILED_JSONL_FILE
+
+    with open(log_file, "a", encoding="utf-8") as fail_log:
+        fail_log.write(err_msg + "\n")
+        if line is not None:
+            fail_log.write(f"  Source line: {line}\n")
+
+    entry = {
+        "run": log_prefix or str(timestamp),
+        "index": index,
+        "action": action,
+        "key": key,
+        "error_code": error_code,
+        "message": message if message is not None else err_msg,
+        "status": status,
+        "record": record,
+        "line": line,
+    }
+    with open(jsonl_file, "a", encoding="utf-8") as fail_log:
+        fail_log.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
 def build_oslc_query_url(config, record):
     """
     Build the GET URL for searching an existing record.
@@ -83,6 +163,18 @@ def process_one_record(index, record, session, config, action, create_url, timeo
     Process a single record (create/update/merge).
     Log errors if they occur. Returns True on success, False on error.
     """
+    success, _ = send_one_record(index, record, session, config, action, create_url, timeout_seconds)
+    return success
+
+def send_one_record(index, record, session, config, action, create_url, timeout_seconds, log_prefix=None,
+                    rate_limiter=None):
+    """
+    Same as process_one_record, but returns (success, error_code) so callers
+    can tell failures apart (error_code is None on success).
+    The caller acquires `rate_limiter` for the write; the id lookup of an
+    update/delete is a second request and acquires its own token here.
+    """
+    record, line = split_source_line(record)
     request_body_str = json.dumps(record, ensure_ascii=False)
     
     if action == "-c":
@@ -93,16 +185,19 @@ def process_one_record(index, record, session, config, action, create_url, timeo
             "Content-Type": "application/json"
         }
     else:
+        if rate_limiter:
+            rate_limiter.acquire()
         obj_id = fetch_object_id(session, record, config, timeout=timeout_seconds)
         if not obj_id:
             msg = (
-                f"No existing record found for "
+                f"Record {index} (action={action}) - No existing record found for "
                 f"{config['obj_search_attr']}={record.get(config['obj_search_attr'])}."
             )
             print(f"  {msg}")
-            with open(FAILED_LOG_FILE, "a", encoding="utf-8") as fail_log:
-                fail_log.write(msg + "\n")
-            return False
+            log_failure(msg, index=index, action=action,
+                        key=record.get(config['obj_search_attr']),
+                        error_code="NOT_FOUND", record=record, log_prefix=log_prefix, line=line)
+            return False, "NOT_FOUND"
 
         resource_url = f"{config['base_url']}/{config['obj_structure']}/{obj_id}?lean=1"
         url = resource_url
@@ -144,16 +239,18 @@ def process_one_record(index, record, session, config, action, create_url, timeo
             f"  Request Body: {record}"
         )
         print(err_msg)
-        with open(FAILED_LOG_FILE, "a", encoding="utf-8") as fail_log:
-            fail_log.write(err_msg + "\n")
-        return False
+        log_failure(err_msg, index=index, action=action,
+                    key=record.get(config.get('obj_search_attr', '')),
+                    error_code="REQUEST_EXCEPTION", message=str(ex), record=record,
+                    log_prefix=log_prefix, line=line)
+        return False, "REQUEST_EXCEPTION"
 
     is_error, parsed_resp = parse_response(resp)
     if is_error:
         error_data = parsed_resp["Error"]
         error_msg = error_data.get("message", "")
         if "already exists" in error_msg.lower():
-            return True  # Not considered as a failure
+            return True, None  # Not considered as a failure
 
         err_msg = (
             f"Record {index} (action={action}) had error.\n"
@@ -161,108 +258,154 @@ def process_one_record(index, record, session, config, action, create_url, timeo
             f"  Response: {json.dumps(parsed_resp, indent=2, ensure_ascii=False)}"
         )
         print(err_msg)
-        with open(FAILED_LOG_FILE, "a", encoding="utf-8") as fail_log:
-            fail_log.write(err_msg + "\n")
-        return False
+        error_code, message = extract_error(parsed_resp)
+        log_failure(err_msg, index=index, action=action,
+                    key=record.get(config.get('obj_search_attr', '')),
+                    error_code=error_code, message=message,
+                    status=resp.status_code, record=record, log_prefix=log_prefix, line=line)
+        return False, error_code or "UNKNOWN"
 
     print(f"  Success for record {index}. Status code: {resp.status_code}")
-    return True
+    return True, None
+
+def select_pairs(data_array, records_to_process, start_index=0):
+    """
+    Return the (index, record) pairs to send: the listed indices if
+    records_to_process is given, otherwise everything from start_index on.
+    When `data_array` is a stream of records (not a sequence), the pairs are
+    streamed as well.
+    """
+    if not isinstance(data_array, Sequence):
+        if records_to_process:
+            wanted = set(records_to_process)
+            return ((i, rec) for i, rec in enumerate(data_array) if i in wanted)
+        return ((i, rec) for i, rec in enumerate(data_array) if i >= start_index)
+    if records_to_process:
+        return [(i, data_array[i]) for i in records_to_process if 0 <= i < len(data_array)]
+    return [(i, data_array[i]) for i in range(start_index, len(data_array))]
 
-def process_in_bulk(records_to_process, data_array, start_index, create_url):
+def send_bulk_chunk(session, chunk, create_url, timeout_seconds, log_prefix=None):
+    """
+    Send one chunk of (index, record) pairs as a single BULK request.
+    Failed records are logged. Returns a list of (index, success, error_code).
+    Raises RequestException or ValueError if the request itself fails.
+    """
+    payload_list = []
+    indices_chunk = []
+    records = {}
+    for orig_index, rec in chunk:
+        records[orig_index] = split_source_line(rec)
+        payload_list.append({"_data": records[orig_index][0]})
+        indices_chunk.append(orig_index)
+    payload_str = json.dumps(payload_list, ensure_ascii=False)
+    headers = {
+        "maxauth": MAXAUTH_TOKEN,
+        "Content-Type": "application/json",
+        "x-method-override": "BULK"
+    }
+    resp = session.request(
+        method="POST",
+        url=create_url,
+        headers=headers,
+        data=payload_str,
+        timeout=timeout_seconds
+    )
+
+    is_error, parsed_resp = parse_response(resp)
+    try:
+        response_list = parsed_resp if isinstance(parsed_resp, list) else json.loads(resp.text)
+    except Exception as e:
+        raise ValueError(f"Failed to parse bulk create response: {e}")
+
+    if not isinstance(response_list, list):
+        raise ValueError(f"Unexpected response format: {parsed_resp}")
+
+    results = []
+    for pos, item in enumerate(response_list):
+        orig_index = indices_chunk[pos]
+        status = item.get("_responsemeta", {}).get("status")
+        if status != "201":
+            log_message = (
+                f"Record {orig_index} (bulk create) had error.\n"
+                f"  Response: {json.dumps(item, indent=2, ensure_ascii=False)}"
+            )
+            error_code, message = extract_error(item)
+            record, line = records[orig_index]
+            log_failure(log_message, index=orig_index, action="-bc",
+                        error_code=error_code, message=message,
+                        status=status, record=record, log_prefix=log_prefix, line=line)
+            results.append((orig_index, False, error_code or "UNKNOWN"))
+        else:
+            results.append((orig_index, True, None))
+    return results
+
+def process_in_bulk(records_to_process, data_array, start_index, create_url, chunk_size=BULK_CHUNK_SIZE,
+                    rate_limiter=None, log_prefix=None):
+    """
+    Send records with BULK requests of `chunk_size` records.
+    Returns (success_count, failure_count).
+    """
+    return send_pairs_in_bulk(select_pairs(data_array, records_to_process, start_index), create_url,
+                              chunk_size=chunk_size, rate_limiter=rate_limiter, log_prefix=log_prefix)
+
+def send_pairs_in_bulk(pairs, create_url, chunk_size=BULK_CHUNK_SIZE, rate_limiter=None, log_prefix=None):
+    """
+    Send (index, record) pairs (a list or a stream) with BULK requests of
+    `chunk_size` records. The records are sent as they are in the pairs, so
+    records rebuilt by dedup (merge policy) are sent in their merged form.
+    Returns (success_count, failure_count).
+    """
     session = requests.Session()
     timeout_seconds = 1800
 
-    if records_to_process:
-        selected = [(i, data_array[i]) for i in records_to_process if 0 <= i < len(data_array)]
-    else:
-        selected = [(i, data_array[i]) for i in range(start_index, len(data_array))]
+    selected = iter(pairs)
 
-    chunk_size = 200
     total_responses = 0
-
-    for chunk_start in range(0, len(selected), chunk_size):
-        chunk = selected[chunk_start:chunk_start + chunk_size]
-        payload_list = []
-        indices_chunk = []
-        for orig_index, rec in chunk:
-            payload_list.append({"_data": rec})
-            indices_chunk.append(orig_index)
-        payload_str = json.dumps(payload_list, ensure_ascii=False)
-        headers = {
-            "maxauth": MAXAUTH_TOKEN,
-            "Content-Type": "application/json",
-            "x-method-override": "BULK"
-        }
+    success_count = 0
+
+    while True:
+        chunk = list(itertools.islice(selected, chunk_size))
+        if not chunk:
+            break
+        if rate_limiter:
+            rate_limiter.acquire()
         try:
-            resp = session.request(
-                method="POST",
-                url=create_url,
-                headers=headers,
-                data=payload_str,
-                timeout=timeout_seconds
-            )
+            results = send_bulk_chunk(session, chunk, create_url, timeout_seconds, log_prefix=log_prefix)
         except RequestException as ex:
             print(f"Bulk create failed: {ex}")
             sys.exit(1)
-
-        is_error, parsed_resp = parse_response(resp)
-        try:
-            response_list = parsed_resp if isinstance(parsed_resp, list) else json.loads(resp.text)
-        except Exception as e:
-            print(f"Failed to parse bulk create response: {e}")
-            sys.exit(1)
-
-        if not isinstance(response_list, list):
-            print(f"Unexpected response format: {parsed_resp}")
+        except ValueError as ex:
+            print(ex)
             sys.exit(1)
 
-        total_responses += len(response_list)
-        for pos, item in enumerate(response_list):
-            orig_index = indices_chunk[pos]
-            status = item.get("_responsemeta", {}).get("status")
-            if status != "201":
-                log_message = (
-                    f"Record {orig_index} (bulk create) had error.\n"
-                    f"  Response: {json.dumps(item, indent=2, ensure_ascii=False)}"
-                )
-                with open(FAILED_LOG_FILE, "a", encoding="utf-8") as fail_log:
-                    fail_log.write(log_message + "\n")
-        print(f"Processed {len(response_list)} responses in current chunk.")
+        total_responses += len(results)
+        success_count += sum(1 for (_, ok, _) in results if ok)
+        print(f"Processed {len(results)} responses in current chunk.")
     print(f"Bulk create completed with {total_responses} responses processed.")
-    sys.exit(0)
+    return success_count, total_responses - success_count
 
-def main():
+def load_data(data_json):
     """
-    Usage:
-      python maximo_sender.py <-c|-u|-mu|-d|-bc> config.json data.json [start_index]
-
-    Also supports data.json containing either:
-      1) A plain JSON array, or
-      2) A JSON object with "records_to_process" (list of indices) and "data" (the array).
-    If "records_to_process" is provided, only those indices will be processed.
-    Otherwise, we process all records (optionally starting from start_index).
+    Load a data file containing either a plain JSON array or an object with
+    "data" (the array) and optionally "records_to_process" (list of indices).
+    A .csv or Excel workbook (.xlsx/.xlsm, active sheet; converted on the fly,
+    as the UI does) or .ndjson file is not loaded but streamed: data_array is then an iterator of records, so sending
+    starts right away.
+    A '.manifest.json' (csv_to_json.py --manifest) or '.mpk' binary record file
+    (--binary), or an object with "records_to_process" and "manifest" /
+    "records_file" (the path of one), gives a data_array that reads each record
+    on demand, so reruns only read the listed records. An object with
+    "data_file" (the path of any other data file) loads that file instead of
+    embedding its data. Paths are relative to the rerun file.
+    Returns (data_array, records_to_process).
     """
-    if len(sys.argv) < 4:
-        print("Usage: python maximo_sender.py <-c|-u|-mu|-d|-bc> config.json data.json [start_index]")
-        sys.exit(1)
-
-    action = sys.argv[1]
-    config_json = sys.argv[2]
-    data_json = sys.argv[3]
+    if is_record_file(data_json):
+        return open_records(data_json), None
+    if data_json.lower().endswith(".csv") or is_workbook(data_json):
+        return iter_csv_records(data_json, parse_dates=True), None
+    if data_json.lower().endswith((".ndjson", ".jsonl")):
+        return iter_ndjson(data_json), None
 
-    start_index = 0
-    if len(sys.argv) == 5:
-        try:
-            start_index = int(sys.argv[4])
-        except ValueError:
-            print("start_index must be an integer.")
-            sys.exit(1)
-
-    if action not in ("-c", "-u", "-mu", "-d", "-bc"):
-        print("Invalid action. Must be one of: -c, -u, -mu, -d, -bc")
-        sys.exit(1)
-
-    config = load_json(config_json)
     raw_data = load_json(data_json)
 
     if isinstance(raw_data, list):
@@ -271,6 +414,14 @@ def main():
     elif isinstance(raw_data, dict):
         records_to_process = raw_data.get("records_to_process")
         data_array = raw_data.get("data")
+        records_file = raw_data.get("records_file") or raw_data.get("manifest")
+        if data_array is None and records_file:
+            records_file = os.path.join(os.path.dirname(os.path.abspath(data_json)), records_file)
+            return open_records(records_file), records_to_process
+        data_file = raw_data.get("data_file")
+        if data_array is None and data_file:
+            data_file = os.path.join(os.path.dirname(os.path.abspath(data_json)), data_file)
+            return load_data(data_file)[0], records_to_process
         if data_array is None:
             print("No 'data' key found in JSON. Aborting.")
             sys.exit(1)
@@ -282,53 +433,144 @@ def main():
         print("The 'data' portion of the JSON is not an array. Aborting.")
         sys.exit(1)
 
-    print(f"Action: {action}, Config: {config_json}, Data length: {len(data_array)}")
-    print(f"Starting from index {start_index}...")
+    return data_array, records_to_process
 
+def send_records(action, config, data_array, records_to_process=None, start_index=0,
+                 rate_limiter=None, log_prefix=None):
+    """
+    Run `action` over the selected records of `data_array`: dedup, reference
+    validation and canary (when configured), then the main run.
+    `data_array` can also be an iterator of records (see load_data); it is
+    only loaded in full when dedup, reference checks or the canary need it.
+
+    Args:
+        rate_limiter: Optional object with an acquire() method, called before each
+            request instead of the default 0.1 s pause (shared between pipeline stages).
+        log_prefix (str): Optional prefix for the failure logs of this run.
+
+    Returns:
+        tuple: (success_count, failure_count)
+    """
     base_url = config["base_url"]
     obj_structure = config["obj_structure"]
     create_url = f"{base_url}/{obj_structure}?lean=1"
 
-    if action == "-bc":
-       process_in_bulk(records_to_process, data_array, start_index, create_url)
+    if not isinstance(data_array, Sequence) and (
+            config.get("dedup") or config.get("reference_checks") or config.get("canary")):
+        print("Dedup, reference checks and canary need every record: loading the whole stream first.")
+        data_array = list(data_array)
 
-    all_pairs = []
-    if records_to_process:
-        for i in records_to_process:
-            if 0 <= i < len(data_array):
-                all_pairs.append((i, data_array[i]))
-    else:
-        for i in range(start_index, len(data_array)):
-            all_pairs.append((i, data_array[i]))
+    all_pairs = select_pairs(data_array, records_to_process, start_index)
+
+    if config.get("dedup"):
+        try:
+            all_pairs = run_dedup(all_pairs, config)
+        except ValueError as ex:
+            print(ex)
+            sys.exit(1)
 
-    print(f"Number of records to process: {len(all_pairs)}")
+    if config.get("reference_checks"):
+        try:
+            all_pairs = run_reference_checks(all_pairs, config, MAXAUTH_TOKEN)
+        except RequestException as ex:
+            print(f"Failed to fetch reference values: {ex}")
+            sys.exit(1)
+        if not all_pairs:
+            print("No records left to send after reference validation.")
+            sys.exit(1)
 
     session = requests.Session()
     timeout_seconds = 30
 
-    max_workers = 3 # Process X at a time; NOT RECOMMENDED TO CHANGE SINCE MAXIMO SEEMS TO NOT HANDLE WELL MULTIPLE DATABASE CHANGES AT THE SAME TIME
+    max_workers = MAX_WORKERS
+    chunk_size = BULK_CHUNK_SIZE
+    canary_success = 0
+    canary_failure = 0
+
+    if config.get("canary"):
+        def canary_send_chunk(chunk):
+            if rate_limiter:
+                rate_limiter.acquire()
+            return send_bulk_chunk(session, chunk, create_url, 1800, log_prefix=log_prefix)
+
+        def canary_send_record(idx, rec):
+            if rate_limiter:
+                rate_limiter.acquire()
+            return send_one_record(idx, rec, session, config, action, create_url, timeout_seconds,
+                                   log_prefix=log_prefix, rate_limiter=rate_limiter)
+
+        if action == "-bc":
+            report = run_canary(all_pairs, config["canary"], send_chunk=canary_send_chunk)
+        else:
+            report = run_canary(all_pairs, config["canary"], send_record=canary_send_record,
+                                submit_interval=0 if rate_limiter else 0.1)
+
+        print(f"Canary: {len(report['sample'])} record(s) sent, error rate {report['error_rate']:.1%}, "
+              f"errors by code: {report['errors'] or 'none'}")
+        if report["abort"]:
+            print("Canary error rate is above 'max_error_rate'. Stopping before the main run.")
+            sys.exit(1)
+
+        if report["concurrency"]:
+            max_workers = report["concurrency"]
+            print(f"Using concurrency {max_workers} for the main run.")
+        if report["chunk_size"]:
+            chunk_size = report["chunk_size"]
+            print(f"Using bulk chunk size {chunk_size} for the main run.")
+
+        canary_failure = sum(report["errors"].values())
+        canary_success = len(report["sample"]) - canary_failure
+        sent = set(report["sample"])
+        all_pairs = [pair for pair in all_pairs if pair[0] not in sent]
+        if not all_pairs:
+            print("Every record was sent by the canary. Done!")
+            return canary_success, canary_failure
+
+    if action == "-bc":
+        if not isinstance(all_pairs, list):
+            # Streamed records: let process_in_bulk select and chunk them as they are read.
+            return process_in_bulk(
+                records_to_process, data_array, start_index, create_url, chunk_size=chunk_size,
+                rate_limiter=rate_limiter, log_prefix=log_prefix
+            )
+        if not all_pairs:
+            return canary_success, canary_failure
+        success_count, failure_count = send_pairs_in_bulk(
+            all_pairs, create_url, chunk_size=chunk_size, rate_limiter=rate_limiter, log_prefix=log_prefix
+        )
+        return success_count + canary_success, failure_count + canary_failure
+
+    if isinstance(all_pairs, list):
+        print(f"Number of records to process: {len(all_pairs)}")
+    else:
+        print("Records are sent as they are read.")
 
     results = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_index = {}
         for (idx, rec) in all_pairs:
-            time.sleep(0.1)
+            if rate_limiter:
+                rate_limiter.acquire()
+            else:
+                time.sleep(0.1)
             fut = executor.submit(
-                process_one_record,
+                send_one_record,
                 idx,
                 rec,
                 session,
                 config,
                 action,
                 create_url,
-                timeout_seconds
+                timeout_seconds,
+                log_prefix,
+                rate_limiter
             )
             future_to_index[fut] = idx
 
         for fut in as_completed(future_to_index):
             i = future_to_index[fut]
             try:
-                success = fut.result()
+                success, _ = fut.result()
             except Exception as e:
                 print(f"Record {i} raised an unexpected exception: {e}")
                 success = False
@@ -338,6 +580,48 @@ def main():
     failure_count = len(results) - success_count
 
     print(f"Done! Processed {len(results)} records => {success_count} success, {failure_count} failure.")
+    return success_count + canary_success, failure_count + canary_failure
+
+def main():
+    """
+    Usage:
+      python maximo_sender.py <-c|-u|-mu|-d|-bc> config.json data.json [start_index]
+
+    Also supports data.json containing either:
+      1) A plain JSON array, or
+      2) A JSON object with "records_to_process" (list of indices) and "data" (the array).
+    A .csv, .xlsx or .ndjson data file is streamed instead, so sending starts right away.
+    If "records_to_process" is provided, only those indices will be processed.
+    Otherwise, we process all records (optionally starting from start_index).
+    """
+    if len(sys.argv) < 4:
+        print("Usage: python maximo_sender.py <-c|-u|-mu|-d|-bc> config.json data.json [start_index]")
+        sys.exit(1)
+
+    action = sys.argv[1]
+    config_json = sys.argv[2]
+    data_json = sys.argv[3]
+
+    start_index = 0
+    if len(sys.argv) == 5:
+        try:
+            start_index = int(sys.argv[4])
+        except ValueError:
+            print("start_index must be an integer.")
+            sys.exit(1)
+
+    if action not in ("-c", "-u", "-mu", "-d", "-bc"):
+        print("Invalid action. Must be one of: -c, -u, -mu, -d, -bc")
+        sys.exit(1)
+
+    config = load_json(config_json)
+    data_array, records_to_process = load_data(data_json)
+
+    data_length = len(data_array) if isinstance(data_array, Sequence) else "streamed"
+    print(f"Action: {action}, Config: {config_json}, Data length: {data_length}")
+    print(f"Starting from index {start_index}...")
+
+    send_records(action, config, data_array, records_to_process, start_index)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
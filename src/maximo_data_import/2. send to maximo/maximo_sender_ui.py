@@ -5,7 +5,8 @@ import os
 import threading
 import base64
 import requests
-from csv_to_json import csv_to_json_threads
+from csv_to_json import csv_to_json_threads, iter_csv_records
+from xlsx_reader import is_workbook, sheet_names
 from PIL import Image, ImageTk
 import sys
 
@@ -156,6 +157,7 @@ class MaximoSenderUI:
         
         # Variables
         self.data_file_path = tk.StringVar()
+        self.data_sheet = tk.StringVar()
         self.config_file_path = tk.StringVar()
         self.maxauth_token = tk.StringVar()
         self.base_url = tk.StringVar()
@@ -226,6 +228,10 @@ class MaximoSenderUI:
         ttk.Entry(file_frame, textvariable=self.data_file_path, width=50).grid(row=0, column=1, sticky=tk.W)
         ttk.Button(file_frame, text="Browse", command=self.browse_data_file).grid(row=0, column=2, padx=5)
         
+        # Sheet selection, only shown for Excel workbooks
+        self.sheet_label = ttk.Label(file_frame, text="Sheet:")
+        self.sheet_combobox = ttk.Combobox(file_frame, textvariable=self.data_sheet, state="readonly", width=30)
+        
         # Request Type Section
         request_frame = ttk.LabelFrame(main_frame, text="Request Type", padding="5")
         request_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
@@ -416,6 +422,7 @@ class MaximoSenderUI:
                 title="Select Data File",
                 filetypes=[
                     ("CSV files", "*.csv"),
+                    ("Excel workbooks", "*.xlsx *.xlsm"),
                     ("JSON files", "*.json")
                 ]
             )
@@ -423,16 +430,31 @@ class MaximoSenderUI:
             if not file_path:
                 return
                 
-            if not (file_path.lower().endswith('.csv') or file_path.lower().endswith('.json')):
-                messagebox.showwarning("Warning", "Please select a CSV or JSON file")
+            if not (file_path.lower().endswith('.csv') or file_path.lower().endswith('.json') or is_workbook(file_path)):
+                messagebox.showwarning("Warning", "Please select a CSV, Excel or JSON file")
                 return
                 
             self.data_file_path.set(file_path)
+            self.update_sheet_selection(file_path)
             
         except Exception as e:
             messagebox.showerror("Error", f"Error selecting file: {str(e)}")
             print(f"File dialog error: {str(e)}")  # For debugging
     
+    def update_sheet_selection(self, file_path):
+        # Workbooks are streamed like CSV files; let the user pick the sheet
+        if not is_workbook(file_path):
+            self.data_sheet.set("")
+            self.sheet_label.grid_remove()
+            self.sheet_combobox.grid_remove()
+            return
+        
+        names = sheet_names(file_path)
+        self.sheet_combobox['values'] = names
+        self.data_sheet.set(names[0] if names else "")
+        self.sheet_label.grid(row=1, column=0, sticky=tk.W)
+        self.sheet_combobox.grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
+    
     def show_csv_conversion_dialog(self, csv_path):
         dialog = tk.Toplevel(self.root)
         dialog.title("CSV to JSON Conversion")
@@ -585,69 +607,46 @@ class MaximoSenderUI:
             print("Starting data processing...")
             
             # Import here to avoid circular imports
-            from maximo_sender import process_one_record, process_in_bulk
+            from maximo_sender import process_one_record, process_in_bulk, select_pairs
             
             # Override the MAXAUTH_TOKEN in maximo_sender module
             import maximo_sender
             maximo_sender.MAXAUTH_TOKEN = self.maxauth_token.get()
             
-            # Handle CSV file conversion if needed
-            temp_json_path = None
             if data_path.lower().endswith('.csv'):
+                # Records are converted as they are sent, no intermediate JSON file
+                print(f"Streaming CSV file: {data_path}")
+                data_array = iter_csv_records(data_path, parse_dates=True)  # Enable date parsing by default
+                records_to_process = None
+            elif is_workbook(data_path):
+                sheet = self.data_sheet.get() or None
+                print(f"Streaming Excel workbook: {data_path} (sheet: {sheet or 'active'})")
+                data_array = iter_csv_records(data_path, parse_dates=True, sheet=sheet)
+                records_to_process = None
+            else:
+                print(f"Loading data from: {data_path}")
+                # Load data
                 try:
-                    print(f"Converting CSV file: {data_path}")
-                    # Create a temporary JSON file for the converted data
-                    temp_json_path = data_path.rsplit('.', 1)[0] + '_temp.json'
-                    
-                    # Convert CSV to JSON with default settings
-                    csv_to_json_threads(
-                        input_file=data_path,
-                        output_file=temp_json_path,
-                        parse_dates=True  # Enable date parsing by default
-                    )
-                    
-                    # Wait for the file to exist
-                    import time
-                    max_retries = 10
-                    retries = 0
-                    while not os.path.exists(temp_json_path) and retries < max_retries:
-                        time.sleep(0.5)
-                        retries += 1
+                    # Ensure the file exists before trying to read it
+                    if not os.path.exists(data_path):
+                        raise FileNotFoundError(f"Data file not found: {data_path}")
                     
-                    if not os.path.exists(temp_json_path):
-                        raise Exception("Timeout waiting for CSV conversion to complete")
-                    
-                    print(f"CSV conversion completed. Using: {temp_json_path}")
-                    # Use the converted JSON file for processing
-                    data_path = temp_json_path
+                    with open(data_path, "r") as f:
+                        data = json.load(f)
+                    print(f"Data loaded successfully. Type: {type(data)}")
                 except Exception as e:
-                    print(f"CSV conversion error: {str(e)}")
-                    self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to convert CSV file: {str(e)}"))
+                    print(f"Error loading data: {str(e)}")
+                    self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to load data file: {str(e)}"))
                     return
-            
-            print(f"Loading data from: {data_path}")
-            # Load data
-            try:
-                # Ensure the file exists before trying to read it
-                if not os.path.exists(data_path):
-                    raise FileNotFoundError(f"Data file not found: {data_path}")
                 
-                with open(data_path, "r") as f:
-                    data = json.load(f)
-                print(f"Data loaded successfully. Type: {type(data)}")
-            except Exception as e:
-                print(f"Error loading data: {str(e)}")
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to load data file: {str(e)}"))
-                return
-            
-            if isinstance(data, list):
-                data_array = data
-                records_to_process = None
-            else:
-                data_array = data.get("data", [])
-                records_to_process = data.get("records_to_process")
-            
-            print(f"Data array length: {len(data_array)}")
+                if isinstance(data, list):
+                    data_array = data
+                    records_to_process = None
+                else:
+                    data_array = data.get("data", [])
+                    records_to_process = data.get("records_to_process")
+                
+                print(f"Data array length: {len(data_array)}")
             
             # Load config
             try:
@@ -672,27 +671,21 @@ class MaximoSenderUI:
                 process_in_bulk(records_to_process, data_array, 0, f"{config['base_url']}/{config['obj_structure']}?lean=1")
             else:
                 print(f"Starting {action} process...")
-                all_pairs = []
-                if records_to_process:
-                    for i in records_to_process:
-                        if 0 <= i < len(data_array):
-                            all_pairs.append((i, data_array[i]))
-                else:
-                    for i in range(len(data_array)):
-                        all_pairs.append((i, data_array[i]))
+                all_pairs = select_pairs(data_array, records_to_process)
                 
-                total_records = len(all_pairs)
+                # Unknown up front when the records are streamed from a CSV
+                total_records = len(all_pairs) if isinstance(all_pairs, list) else None
                 processed = 0
                 failed = 0
 
                 def queue_progress_update():
                     """Queue a progress update"""
                     nonlocal processed, failed, total_records
-                    progress = (processed / total_records) * 100
+                    progress = (processed / total_records) * 100 if total_records else 0
                     
                     def update():
                         self.progress_var.set(progress)
-                        self.current_entry.set(f"{processed}/{total_records}")
+                        self.current_entry.set(f"{processed}/{total_records or '?'}")
                         self.failed_entries.set(f"Failed: {failed}")
                         self.progress_frame.update()
                     
@@ -711,13 +704,15 @@ class MaximoSenderUI:
                             failed += 1
                         
                         queue_progress_update()
-                        print(f"Processed record {idx + 1}/{total_records}")
+                        print(f"Processed record {idx + 1}/{total_records or '?'}")
                     except Exception as e:
                         print(f"Error processing record {idx}: {str(e)}")
                         failed += 1
                         processed += 1
                         queue_progress_update()
 
+                total_records = processed
+
                 # Queue final summary update
                 def queue_summary_update():
                     def update():
@@ -755,17 +750,16 @@ class MaximoSenderUI:
             print("Cleaning up temporary files...")
             # Clean up temporary files
             try:
-                print(f"Cleaning up files: {config_path}, {temp_json_path}")
+                print(f"Cleaning up files: {config_path}")
                 
                 if os.path.exists(config_path):
                     os.remove(config_path)
-                if temp_json_path and os.path.exists(temp_json_path):
-                    os.remove(temp_json_path)
             except Exception as e:
                 print(f"Error cleaning up files: {str(e)}")
 
     def clear_all(self):
         self.data_file_path.set("")
+        self.update_sheet_selection("")
         self.maximo_instance.set("")
         self.obj_structure.set("")
         self.obj_search_attr.set("")
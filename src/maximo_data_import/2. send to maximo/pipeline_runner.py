@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import maximo_sender
+from maximo_sender import load_json, load_data, send_records
+
+REQUESTS_PER_SECOND_DEFAULT = 10
+MAX_PARALLEL_STAGES_DEFAULT = 3
+VALID_ACTIONS = ("-c", "-u", "-mu", "-d", "-bc")
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every stage of a pipeline, so running stages
+    concurrently never sends more than `requests_per_second` overall.
+    """
+
+    def __init__(self, requests_per_second, burst=1):
+        self.interval = 1.0 / requests_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) / self.interval)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) * self.interval
+            time.sleep(wait_time)
+
+
+def resolve_path(base_dir, path):
+    return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+
+def load_pipeline(pipeline_json):
+    """
+    Load and check a pipeline file. Stage configs given as paths are loaded,
+    and top-level "base_url" is used for stages that don't set their own.
+    Exits if a stage is invalid, a dependency is unknown or there is a cycle.
+    """
+    pipeline = load_json(pipeline_json)
+    base_dir = os.path.dirname(os.path.abspath(pipeline_json))
+
+    stages = {}
+    for stage in pipeline.get("stages", []):
+        name = stage.get("name")
+        if not name or name in stages:
+            print(f"Every stage needs a unique 'name' (got '{name}').")
+            sys.exit(1)
+        if stage.get("action") not in VALID_ACTIONS:
+            print(f"Stage '{name}': invalid action. Must be one of: {', '.join(VALID_ACTIONS)}")
+            sys.exit(1)
+
+        if not stage.get("data"):
+            print(f"Stage '{name}': missing 'data' (the data file to send).")
+            sys.exit(1)
+
+        config = stage.get("config", {})
+        if isinstance(config, str):
+            config = load_json(resolve_path(base_dir, config))
+        config = dict(config)
+        if "base_url" not in config and "base_url" in pipeline:
+            config["base_url"] = pipeline["base_url"]
+
+        stages[name] = {
+            "name": name,
+            "action": stage["action"],
+            "config": config,
+            "data": resolve_path(base_dir, stage["data"]),
+            "depends_on": stage.get("depends_on", []),
+            "max_failed_records": stage.get("max_failed_records"),
+        }
+
+    for stage in stages.values():
+        for dep in stage["depends_on"]:
+            if dep not in stages:
+                print(f"Stage '{stage['name']}' depends on unknown stage '{dep}'.")
+                sys.exit(1)
+
+    # Kahn's algorithm, only to reject cycles up front.
+    remaining = {name: set(stage["depends_on"]) for name, stage in stages.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            print(f"Dependency cycle between stages: {', '.join(sorted(remaining))}")
+            sys.exit(1)
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    return pipeline, stages
+
+
+def run_stage(stage, rate_limiter, run_id):
+    """
+    Run one stage. Returns (ok, success_count, failure_count).
+    """
+    name = stage["name"]
+    print(f"[{name}] Starting {stage['action']} with {stage['data']}")
+    try:
+        data_array, records_to_process = load_data(stage["data"])
+        success_count, failure_count = send_records(
+            stage["action"], stage["config"], data_array, records_to_process,
+            rate_limiter=rate_limiter, log_prefix=f"{run_id}_{name}"
+        )
+    except SystemExit as ex:
+        if ex.code in (0, None):
+            print(f"[{name}] Done => nothing to send, the stage sent no record.")
+            return True, 0, 0
+        print(f"[{name}] Stage aborted.")
+        return False, 0, 0
+    except Exception as ex:
+        print(f"[{name}] Stage failed: {ex}")
+        return False, 0, 0
+
+    limit = stage["max_failed_records"]
+    ok = limit is None or failure_count <= limit
+    print(f"[{name}] Done => {success_count} success, {failure_count} failure.")
+    return ok, success_count, failure_count
+
+
+def run_pipeline(stages, requests_per_second=REQUESTS_PER_SECOND_DEFAULT,
+                 max_parallel_stages=MAX_PARALLEL_STAGES_DEFAULT):
+    """
+    Run stages as soon as all of their dependencies have succeeded, with
+    independent stages running concurrently on one shared rate budget.
+    Stages depending on a failed stage are skipped.
+
+    Returns:
+        dict: { stage_name: "ok" | "failed" | "skipped" }
+    """
+    rate_limiter = RateLimiter(requests_per_second)
+    run_id = maximo_sender.timestamp
+    status = {}
+    pending = dict(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_parallel_stages) as executor:
+        while pending or running:
+            for name in list(pending):
+                deps = pending[name]["depends_on"]
+                if any(status.get(dep) in ("failed", "skipped") for dep in deps):
+                    print(f"[{name}] Skipped because a prerequisite failed.")
+                    status[name] = "skipped"
+                    del pending[name]
+                elif all(status.get(dep) == "ok" for dep in deps):
+                    running[executor.submit(run_stage, pending.pop(name), rate_limiter, run_id)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                ok, _, _ = fut.result()
+                status[name] = "ok" if ok else "failed"
+
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Run a chain of sender stages (e.g. items -> inventory -> inventory balances) declared in a "
+            "pipeline file. Each stage starts as soon as its prerequisites are done, and independent "
+            "stages run concurrently on a shared request rate."
+        )
+    )
+    parser.add_argument('pipeline_json', help='Pipeline file declaring the stages, their configs and dependencies.')
+    args = parser.parse_args()
+
+    pipeline, stages = load_pipeline(args.pipeline_json)
+    if not stages:
+        print("No stages found in the pipeline file.")
+        sys.exit(1)
+
+    status = run_pipeline(
+        stages,
+        requests_per_second=pipeline.get("requests_per_second", REQUESTS_PER_SECOND_DEFAULT),
+        max_parallel_stages=pipeline.get("max_parallel_stages", MAX_PARALLEL_STAGES_DEFAULT),
+    )
+
+    print("\nPipeline summary:")
+    for name in stages:
+        print(f"  {name}: {status.get(name)}")
+
+    if any(s != "ok" for s in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
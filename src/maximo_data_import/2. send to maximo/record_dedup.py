@@ -0,0 +1,127 @@
+import json
+import hashlib
+
+DEDUP_POLICIES = ("last", "first", "merge")
+
+
+def key_digest(key_values):
+    """
+    Compact 64-bit digest of a business key, used as the index entry.
+    """
+    raw = "\x1f".join(key_values).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+
+def extract_key(record, key_fields):
+    """
+    Return the business key of `record` as a tuple of strings,
+    or None when every key field is missing/empty.
+    """
+    values = tuple("" if record.get(f) is None else str(record.get(f)).strip() for f in key_fields)
+    if not any(values):
+        return None
+    return values
+
+
+def merge_records(base, newer):
+    """
+    Merge `newer` into a copy of `base`: every non-empty field of `newer`
+    overwrites the one of `base`, nested objects are merged the same way.
+    """
+    merged = dict(base)
+    for field, val in newer.items():
+        if val is None or val == "" or val == [] or val == {}:
+            continue
+        if isinstance(val, dict) and isinstance(merged.get(field), dict):
+            merged[field] = merge_records(merged[field], val)
+        else:
+            merged[field] = val
+    return merged
+
+
+def dedup_pairs(pairs, key_fields, policy="last"):
+    """
+    Remove duplicate records (same business key) from (index, record) pairs.
+
+    Policies:
+      - 'last':  the last occurrence wins and keeps its own index.
+      - 'first': the first occurrence wins.
+      - 'merge': non-empty fields of later occurrences are merged into the
+                 first one, which keeps the index of the first occurrence.
+
+    The index is a dict of 64-bit key digests pointing at the kept slot. On a
+    digest hit the full key is re-read from the kept record and compared, so
+    collisions can't merge two records; only colliding keys are stored in full.
+
+    Returns:
+        tuple: (kept_pairs in index order, list of (dropped_index, kept_index))
+    """
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f"Unknown dedup policy '{policy}'. Must be one of: {', '.join(DEDUP_POLICIES)}")
+
+    index = {}
+    collisions = {}
+    kept = []
+    dropped = []
+
+    for idx, rec in pairs:
+        key = extract_key(rec, key_fields) if isinstance(rec, dict) else None
+        if key is None:
+            kept.append((idx, rec))
+            continue
+
+        digest = key_digest(key)
+        slot = index.get(digest)
+        if slot is not None and extract_key(kept[slot][1], key_fields) != key:
+            slot = collisions.get(key)
+
+        if slot is None:
+            if digest in index:
+                collisions[key] = len(kept)
+            else:
+                index[digest] = len(kept)
+            kept.append((idx, rec))
+            continue
+
+        kept_idx, kept_rec = kept[slot]
+        if policy == "first":
+            dropped.append((idx, slot))
+        elif policy == "last":
+            dropped.append((kept_idx, slot))
+            kept[slot] = (idx, rec)
+        else:
+            dropped.append((idx, slot))
+            kept[slot] = (kept_idx, merge_records(kept_rec, rec))
+
+    dropped = [(dropped_idx, kept[slot][0]) for dropped_idx, slot in dropped]
+    if policy == "last":
+        kept.sort(key=lambda pair: pair[0])
+    return kept, dropped
+
+
+def run_dedup(pairs, config):
+    """
+    Apply the 'dedup' entry of the sender config to (index, record) pairs.
+    The key defaults to config['obj_search_attr'].
+    """
+    dedup_config = config.get("dedup")
+    if not dedup_config:
+        return pairs
+    if not isinstance(dedup_config, dict):
+        raise ValueError("'dedup' in the config must be an object, e.g. {\"key\": [\"wonum\", \"siteid\"]}.")
+
+    key_fields = dedup_config.get("key") or [config.get("obj_search_attr")]
+    if isinstance(key_fields, str):
+        key_fields = [key_fields]
+    if not all(key_fields):
+        raise ValueError("'dedup' needs a 'key' (or 'obj_search_attr' in the config).")
+
+    policy = dedup_config.get("policy", "last")
+    kept, dropped = dedup_pairs(pairs, key_fields, policy)
+    print(f"Dedup on {'+'.join(key_fields)} ({policy} wins): {len(dropped)} duplicate(s) removed, {len(kept)} record(s) left.")
+
+    report_file = dedup_config.get("report_file")
+    if report_file and dropped:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump([{"dropped": d, "kept": k} for d, k in dropped], f)
+    return kept
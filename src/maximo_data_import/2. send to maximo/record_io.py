@@ -0,0 +1,352 @@
+import os
+import json
+import mmap
+import struct
+import threading
+
+from collections.abc import Sequence
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for the binary record format
+    msgpack = None
+
+JSON_READ_BUFFER = 1 << 20  # characters read at a time by iter_json_array
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+MANIFEST_SUFFIX = ".manifest.json"
+INDEX_SUFFIX = ".idx"
+# One entry per record: part number, byte offset in the part, byte length.
+INDEX_ENTRY = struct.Struct("<IQI")
+
+# Binary record file (.mpk): MAGIC, then per record a RECORD_LENGTH prefix and the
+# MessagePack bytes, then one OFFSET_ENTRY per record (offset of its length prefix),
+# then the TRAILER: offset of that index, number of records, MAGIC.
+BINARY_SUFFIX = ".mpk"
+BINARY_MAGIC = b"SW2MPK01"
+RECORD_LENGTH = struct.Struct("<I")
+OFFSET_ENTRY = struct.Struct("<Q")
+TRAILER = struct.Struct("<QQ8s")
+
+
+def manifest_path(base_filename):
+    """
+    '<prefix>.manifest.json' for an output base such as 'out.json'.
+    """
+    prefix, _ = os.path.splitext(base_filename)
+    return prefix + MANIFEST_SUFFIX
+
+
+def is_manifest(path):
+    return path.lower().endswith(MANIFEST_SUFFIX)
+
+
+def is_ndjson(path):
+    return path.lower().endswith(NDJSON_SUFFIXES)
+
+
+def is_binary(path):
+    return path.lower().endswith(BINARY_SUFFIX)
+
+
+def is_record_file(path):
+    """
+    True for the files open_records() can read on demand.
+    """
+    return is_manifest(path) or is_binary(path)
+
+
+def open_records(path):
+    """
+    Open a manifest or a binary record file as a lazy Sequence of records.
+    """
+    if is_binary(path):
+        return BinaryRecords(path)
+    return ManifestRecords(path)
+
+
+def iter_ndjson(path):
+    """
+    Stream the records of an NDJSON file (one JSON object per line).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(path, buffer_size=JSON_READ_BUFFER):
+    """
+    Stream the elements of a JSON array file one by one, reading it
+    'buffer_size' characters at a time, so memory is bounded by the largest
+    element rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(buffer_size)
+        eof = len(buf) < buffer_size
+        pos = 0
+        expect_start = True
+        while True:
+            # Skip whitespace and separators, refilling the buffer as needed.
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n" + ("" if expect_start else ","):
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = f.read(buffer_size), 0
+                eof = len(buf) < buffer_size
+
+            if expect_start:
+                if buf[pos:pos + 1] != "[":
+                    raise ValueError(f"File '{path}' is not a JSON array.")
+                pos += 1
+                expect_start = False
+                continue
+            if pos >= len(buf):
+                raise ValueError(f"File '{path}' ends before the JSON array is closed.")
+            if buf[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+                # A scalar cut at the end of the buffer would decode too early.
+                complete = end < len(buf) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                more = f.read(buffer_size)
+                eof = len(more) < buffer_size
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield element
+            pos = end
+
+
+def require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("The binary record format (.mpk) needs the 'msgpack' package: pip install msgpack")
+
+
+def pack_record(record):
+    """
+    MessagePack bytes of one record, as stored in a binary record file.
+    """
+    require_msgpack()
+    return msgpack.packb(record, use_bin_type=True)
+
+
+class ManifestWriter:
+    """
+    Record the position of every record written to a split output, so any
+    record can be read back later without loading the parts.
+
+    Writes '<prefix>.idx' (INDEX_ENTRY per record, in record order) while the
+    parts are written, and '<prefix>.manifest.json' on close():
+        {
+          "format": "json" | "ndjson",
+          "records": total number of records,
+          "index_file": "<prefix>.idx",
+          "parts": [{"file": "...", "first_index": n, "records": n, "bytes": n}, ...]
+        }
+    File names are relative to the manifest.
+    """
+
+    def __init__(self, base_filename, fmt="json"):
+        self.path = manifest_path(base_filename)
+        self.index_path = self.path[:-len(MANIFEST_SUFFIX)] + INDEX_SUFFIX
+        self.format = fmt
+        self.parts = []
+        self.part_paths = []
+        self.records = 0
+        self.index_file = open(self.index_path, "wb")
+
+    def start_part(self, filename):
+        self.part_paths.append(filename)
+        self.parts.append({
+            "file": os.path.basename(filename),
+            "first_index": self.records,
+            "records": 0,
+            "bytes": 0,
+        })
+
+    def add(self, offset, length):
+        """
+        Register the next record, written at `offset` of the current part.
+        """
+        part = self.parts[-1]
+        self.index_file.write(INDEX_ENTRY.pack(len(self.parts) - 1, offset, length))
+        part["records"] += 1
+        self.records += 1
+
+    def close(self):
+        """
+        Call once the parts are closed: their final sizes go into the manifest.
+        """
+        self.index_file.close()
+        for part, part_path in zip(self.parts, self.part_paths):
+            part["bytes"] = os.path.getsize(part_path)
+        manifest = {
+            "format": self.format,
+            "records": self.records,
+            "index_file": os.path.basename(self.index_path),
+            "parts": self.parts,
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+class ManifestRecords(Sequence):
+    """
+    The records of a split output, read on demand through its manifest.
+
+    Supports len(), indexing (one seek + one read per record) and iteration,
+    so the sender, transform.py and records_to_process reruns can go straight
+    to the records they need instead of loading every part.
+    """
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.path = os.path.abspath(path)
+        self.directory = os.path.dirname(self.path)
+        self.part_files = [os.path.join(self.directory, part["file"]) for part in self.manifest["parts"]]
+        self.handles = {}
+        self.lock = threading.Lock()
+
+        index_path = os.path.join(self.directory, self.manifest["index_file"])
+        self._index_file = open(index_path, "rb")
+        if os.fstat(self._index_file.fileno()).st_size:
+            self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._index = b""
+
+    def __len__(self):
+        return self.manifest["records"]
+
+    def locate(self, index):
+        """
+        Return (part_file, byte_offset, byte_length) of record `index`.
+        """
+        part, offset, length = INDEX_ENTRY.unpack_from(self._index, index * INDEX_ENTRY.size)
+        return self.part_files[part], offset, length
+
+    def read_raw(self, index):
+        """
+        Return the UTF-8 JSON bytes of record `index`.
+        """
+        part_file, offset, length = self.locate(index)
+        with self.lock:
+            handle = self.handles.get(part_file)
+            if handle is None:
+                handle = self.handles[part_file] = open(part_file, "rb")
+            handle.seek(offset)
+            return handle.read(length)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        return json.loads(self.read_raw(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield json.loads(self.read_raw(index))
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+        if isinstance(self._index, mmap.mmap):
+            self._index.close()
+        self._index_file.close()
+
+
+class BinaryRecordWriter:
+    """
+    Write records to a binary record file (see BINARY_MAGIC): length-prefixed
+    MessagePack records followed by an offset index, so the file can be both
+    streamed and read at random. Much smaller and faster to decode than JSON,
+    meant for the intermediate files between csv_to_json.py, transform.py and
+    the sender; keep JSON for the files people read.
+    """
+
+    def __init__(self, path):
+        require_msgpack()
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(BINARY_MAGIC)
+        self.position = len(BINARY_MAGIC)
+        self.offsets = []
+
+    def write_packed(self, packed):
+        """
+        Append one record already packed with pack_record (e.g. in a worker process).
+        """
+        self.offsets.append(self.position)
+        self.file.write(RECORD_LENGTH.pack(len(packed)))
+        self.file.write(packed)
+        self.position += RECORD_LENGTH.size + len(packed)
+
+    def write(self, record):
+        self.write_packed(pack_record(record))
+
+    def close(self):
+        index_offset = self.position
+        for offset in self.offsets:
+            self.file.write(OFFSET_ENTRY.pack(offset))
+        self.file.write(TRAILER.pack(index_offset, len(self.offsets), BINARY_MAGIC))
+        self.file.close()
+
+
+class BinaryRecords(Sequence):
+    """
+    The records of a binary record file, read on demand: len(), indexing
+    (through the offset index at the end of the file) and streaming iteration.
+    """
+
+    def __init__(self, path):
+        require_msgpack()
+        self.path = os.path.abspath(path)
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(BINARY_MAGIC)] != BINARY_MAGIC or len(self.mm) < len(BINARY_MAGIC) + TRAILER.size:
+            raise ValueError(f"'{path}' is not a binary record file.")
+        self.index_offset, self.count, magic = TRAILER.unpack_from(self.mm, len(self.mm) - TRAILER.size)
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"'{path}' is truncated (no record index).")
+
+    def __len__(self):
+        return self.count
+
+    def _read_at(self, offset):
+        (length,) = RECORD_LENGTH.unpack_from(self.mm, offset)
+        start = offset + RECORD_LENGTH.size
+        return msgpack.unpackb(self.mm[start:start + length], raw=False), start + length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        (offset,) = OFFSET_ENTRY.unpack_from(self.mm, self.index_offset + index * OFFSET_ENTRY.size)
+        return self._read_at(offset)[0]
+
+    def __iter__(self):
+        mm, end, unpack, read_length = self.mm, self.index_offset, msgpack.unpackb, RECORD_LENGTH.unpack_from
+        offset = len(BINARY_MAGIC)
+        while offset < end:
+            (length,) = read_length(mm, offset)
+            offset += RECORD_LENGTH.size
+            yield unpack(mm[offset:offset + length], raw=False)
+            offset += length
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import requests
+
+from requests.exceptions import RequestException
+
+PAGE_SIZE_DEFAULT = 1000
+CACHE_DIR_DEFAULT = "reference_cache"
+CACHE_MAX_AGE_DEFAULT = 24 * 60 * 60  # 1 day
+
+
+def collect_values(record, path):
+    """
+    Collect every value found at the dot-notation `path` inside `record`.
+    Lists are walked transparently, so 'woadditionalresource.personid'
+    returns the personid of every entry of the array.
+    Empty strings and None are skipped.
+    """
+    current = [record]
+    for part in path.split('.'):
+        next_level = []
+        for obj in current:
+            if isinstance(obj, list):
+                for item in obj:
+                    if isinstance(item, dict) and part in item:
+                        next_level.append(item[part])
+            elif isinstance(obj, dict) and part in obj:
+                next_level.append(obj[part])
+        current = next_level
+
+    values = []
+    for val in current:
+        if isinstance(val, list):
+            values.extend(v for v in val if v not in (None, ""))
+        elif val not in (None, ""):
+            values.append(val)
+    return values
+
+
+def reference_set_key(check):
+    """
+    Return the identity of the value set a check needs.
+    Checks pointing at the same object structure/attribute/where clause
+    (e.g. 'reportedby' and 'owner' against persons) share one download.
+    """
+    return (check["obj_structure"].lower(), check["attr"].lower(), check.get("oslc.where", ""))
+
+
+def lookup_set_key(check):
+    """
+    Return the key of the in-memory set a check probes: its value set, plus
+    whether it compares without case, since the set is stored normalized.
+    """
+    return reference_set_key(check), bool(check.get("ignore_case", True))
+
+
+def cache_file_path(cache_dir, set_key):
+    obj_structure, attr, where = set_key
+    where_hash = hashlib.sha1(where.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(cache_dir, f"{obj_structure}_{attr}_{where_hash}.json")
+
+
+def load_cached_values(path, max_age):
+    """
+    Return the cached value list stored at `path`, or None if it is
+    missing, unreadable or older than `max_age` seconds.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if time.time() - cached.get("fetched_at", 0) > max_age:
+        return None
+    return cached.get("values")
+
+
+def save_cached_values(path, values):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "values": sorted(values)}, f, ensure_ascii=False)
+
+
+def fetch_reference_values(session, base_url, token, set_key, page_size=PAGE_SIZE_DEFAULT, timeout=60):
+    """
+    Page through an object structure selecting a single attribute and
+    return every value found. Follows 'responseInfo.nextPage.href' until
+    Maximo stops returning a next page.
+    """
+    obj_structure, attr, where = set_key
+    url = (
+        f"{base_url}/{obj_structure}"
+        f"?lean=1"
+        f"&oslc.select={attr}"
+        f"&oslc.pageSize={page_size}"
+    )
+    if where:
+        url += f"&oslc.where={where}"
+
+    headers = {"maxauth": token}
+    values = []
+    while url:
+        resp = session.get(url, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.json()
+
+        for member in data.get("member", []):
+            val = member.get(attr)
+            if isinstance(val, dict):
+                val = val.get("content")
+            if val not in (None, ""):
+                values.append(val)
+
+        url = data.get("responseInfo", {}).get("nextPage", {}).get("href")
+        print(f"  {obj_structure}.{attr}: {len(values)} values fetched...")
+    return values
+
+
+def load_reference_sets(checks, base_url, token, cache_dir=CACHE_DIR_DEFAULT,
+                        max_age=CACHE_MAX_AGE_DEFAULT, refresh=False):
+    """
+    Build one in-memory hash set per distinct reference set and case mode used
+    by `checks`. Each reference set is fetched once; values come from the disk
+    cache when it's fresh enough, otherwise from Maximo.
+
+    Returns:
+        dict: { (set_key, ignore_case): set_of_values } (see lookup_set_key)
+    """
+    session = requests.Session()
+    reference_sets = {}
+    fetched = {}
+
+    for check in checks:
+        set_key, ignore_case = lookup_set_key(check)
+        if (set_key, ignore_case) in reference_sets:
+            continue
+
+        values = fetched.get(set_key)
+        if values is None:
+            path = cache_file_path(cache_dir, set_key)
+            values = None if refresh else load_cached_values(path, max_age)
+            if values is None:
+                print(f"Fetching reference values for {set_key[0]}.{set_key[1]}...")
+                values = fetch_reference_values(session, base_url, token, set_key)
+                save_cached_values(path, values)
+            else:
+                print(f"Using cached reference values for {set_key[0]}.{set_key[1]} ({len(values)} values).")
+            fetched[set_key] = values
+
+        reference_sets[(set_key, ignore_case)] = (
+            {str(v).upper() for v in values} if ignore_case else {str(v) for v in values}
+        )
+
+    return reference_sets
+
+
+def validate_record(record, checks, reference_sets):
+    """
+    Check every referenced value of `record` against the loaded sets.
+    Returns a list of problems, empty if the record is valid.
+    """
+    problems = []
+    for check in checks:
+        set_key, ignore_case = lookup_set_key(check)
+        known = reference_sets[(set_key, ignore_case)]
+        for val in collect_values(record, check["field"]):
+            probe = str(val).upper() if ignore_case else str(val)
+            if probe not in known:
+                problems.append({
+                    "field": check["field"],
+                    "value": val,
+                    "obj_structure": check["obj_structure"],
+                })
+    return problems
+
+
+def validate_records(pairs, checks, reference_sets):
+    """
+    Split (index, record) pairs into valid pairs and rejected entries.
+    """
+    valid = []
+    rejected = []
+    for idx, rec in pairs:
+        problems = validate_record(rec, checks, reference_sets)
+        if problems:
+            rejected.append({"index": idx, "problems": problems, "record": rec})
+        else:
+            valid.append((idx, rec))
+    return valid, rejected
+
+
+def write_reject_file(rejected, reject_file):
+    with open(reject_file, "w", encoding="utf-8") as f:
+        json.dump(rejected, f, ensure_ascii=False, indent=2)
+    print(f"{len(rejected)} record(s) failed reference validation. See '{reject_file}'.")
+
+
+def run_reference_checks(pairs, config, token, refresh=False):
+    """
+    Validate (index, record) pairs using the 'reference_checks' of `config`.
+    Invalid records are written to config['reject_file'] and left out of
+    the returned list.
+    """
+    checks = config.get("reference_checks")
+    if not checks:
+        return pairs
+
+    reference_sets = load_reference_sets(
+        checks,
+        config["base_url"],
+        token,
+        cache_dir=config.get("reference_cache_dir", CACHE_DIR_DEFAULT),
+        max_age=config.get("reference_cache_max_age", CACHE_MAX_AGE_DEFAULT),
+        refresh=refresh
+    )
+
+    start = time.perf_counter()
+    valid, rejected = validate_records(pairs, checks, reference_sets)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Validated {len(pairs)} record(s) in {elapsed_ms:.1f} ms => {len(valid)} valid, {len(rejected)} rejected.")
+
+    if rejected:
+        write_reject_file(rejected, config.get("reject_file", "rejected_records.json"))
+    return valid
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Check the referenced values (locations, persons, companies, items...) of every record "
+            "against value sets bulk-fetched from Maximo, before anything is sent. "
+            "Checks are read from the 'reference_checks' entry of the sender config."
+        )
+    )
+    parser.add_argument('config_json', help='Sender config containing "reference_checks".')
+    parser.add_argument('data_json', help='Data file, as accepted by maximo_sender.py (JSON, .csv, .ndjson, manifest, .mpk '
+                             'or records_to_process file).')
+    parser.add_argument('--output', default=None,
+                        help='Where to write the valid record indices as a records_to_process file pointing '
+                             'at the data file (default: <data>_valid.json).')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore the disk cache and re-fetch every reference set.')
+    args = parser.parse_args()
+
+    from maximo_sender import MAXAUTH_TOKEN, load_json, load_data, select_pairs
+
+    config = load_json(args.config_json)
+    if not config.get("reference_checks"):
+        print("No 'reference_checks' found in config. Nothing to validate.")
+        sys.exit(1)
+
+    data_array, records_to_process = load_data(args.data_json)
+    pairs = list(select_pairs(data_array, records_to_process))
+
+    try:
+        valid = run_reference_checks(pairs, config, MAXAUTH_TOKEN, refresh=args.refresh)
+    except RequestException as ex:
+        print(f"Failed to fetch reference values: {ex}")
+        sys.exit(1)
+
+    output = args.output or os.path.splitext(args.data_json)[0] + "_valid.json"
+    data_file = os.path.relpath(os.path.abspath(args.data_json), os.path.dirname(os.path.abspath(output)))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"records_to_process": [i for i, _ in valid], "data_file": data_file}, f, ensure_ascii=False)
+    print(f"Wrote {len(valid)} valid record index(es) to '{output}'.")
+
+
+if __name__ == "__main__":
+    main()
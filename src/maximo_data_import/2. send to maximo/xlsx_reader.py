@@ -0,0 +1,106 @@
+from datetime import date, datetime, time
+
+try:
+    import openpyxl
+except ImportError:  # optional: only needed to read Excel workbooks
+    openpyxl = None
+
+WORKBOOK_SUFFIXES = (".xlsx", ".xlsm")
+TYPED_DATE_TYPES = (datetime, date, time)
+
+
+def is_workbook(path):
+    return path.lower().endswith(WORKBOOK_SUFFIXES)
+
+
+def require_openpyxl():
+    if openpyxl is None:
+        raise RuntimeError("Reading Excel workbooks needs the 'openpyxl' package: pip install openpyxl")
+
+
+def open_sheet(path, sheet=None):
+    """
+    Open a workbook in read-only mode and return (workbook, worksheet).
+
+    Read-only workbooks parse the sheet XML as rows are requested, so memory
+    stays constant whatever the size of the sheet. 'sheet' is a sheet name or
+    a 1-based sheet number; by default the active sheet is used. Cached formula
+    results are read, not the formulas. Close the workbook when done.
+    """
+    require_openpyxl()
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet is None:
+            worksheet = workbook.active
+        elif sheet in workbook.sheetnames:
+            worksheet = workbook[sheet]
+        elif str(sheet).isdigit() and 1 <= int(sheet) <= len(workbook.sheetnames):
+            worksheet = workbook.worksheets[int(sheet) - 1]
+        else:
+            raise ValueError(f"Sheet '{sheet}' not found in {path}. Sheets: {', '.join(workbook.sheetnames)}")
+    except Exception:
+        workbook.close()
+        raise
+    return workbook, worksheet
+
+
+def sheet_names(path):
+    require_openpyxl()
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def iter_sheet_rows(worksheet):
+    """
+    Yield (row_number, values) for every row of the sheet, with the raw cell
+    values (str, int, float, bool, datetime or None). Blank rows are skipped
+    but still counted, so row numbers match the sheet.
+    """
+    for row_number, values in enumerate(worksheet.iter_rows(values_only=True), start=1):
+        if any(value is not None and value != "" for value in values):
+            yield row_number, values
+
+
+def cell_text(value):
+    """
+    Text of a cell value, as a CSV export would have it, except that typed
+    dates and times are written as ISO 8601 directly, without string parsing.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, TYPED_DATE_TYPES):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def row_text(values):
+    return [cell_text(value) for value in values]
+
+
+def untyped_row_text(values):
+    """
+    Like row_text, but with typed date cells left empty: what string date
+    inference has to look at, since typed dates need no parsing.
+    """
+    return ["" if isinstance(value, TYPED_DATE_TYPES) else cell_text(value) for value in values]
+
+
+def typed_date_positions(rows):
+    """
+    Positions of the columns holding typed date cells in the given raw rows.
+    """
+    positions = set()
+    for values in rows:
+        for position, value in enumerate(values):
+            if isinstance(value, TYPED_DATE_TYPES):
+                positions.add(position)
+    return positions
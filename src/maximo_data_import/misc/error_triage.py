@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+
+from failure_log import iter_failures, find_offending_value, prefer_structured_logs, run_id_from_path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "2. send to maximo"))
+from record_io import ManifestRecords, BinaryRecords, is_record_file, open_records
+
+# Field holding the identifier of each referenced object in its stub dataset.
+STUB_ID_FIELDS = {
+    "location": "location",
+    "person": "personid",
+    "item": "itemnum",
+    "asset": "assetnum",
+    "company": "company",
+    "vendor": "company",
+    "labor": "laborcode",
+    "craft": "craft",
+    "storeroom": "location",
+}
+
+# Fields copied from the failing record into the stub so it lands in the right site/org.
+STUB_CONTEXT_FIELDS = ["siteid", "orgid"]
+
+
+def triage(log_files, run_data=None):
+    """
+    Stream every failure of `log_files` once and group them by error class,
+    keeping the indices of each run apart: an index only means something
+    within the data file its run sent.
+
+    Args:
+        log_files (list): Failure logs (.log or .jsonl).
+        run_data  (dict): { run: data_array } used to fill the stubs of
+                          failures whose log line has no record.
+
+    Returns:
+        tuple: (classes, stubs)
+          classes -> { error_code: { "indices": { run: set }, "values": { value: count }, "count": int } }
+          stubs   -> { referenced_object: { value: stub_record } }
+    """
+    run_data = run_data or {}
+    classes = {}
+    stubs = {}
+
+    for path in log_files:
+        print(f"Scanning {path}...")
+        for failure in iter_failures(path):
+            code = failure.get("error_code") or "UNKNOWN"
+            run = failure.get("run")
+            group = classes.setdefault(code, {"indices": {}, "values": {}, "count": 0})
+            group["count"] += 1
+
+            index = failure.get("index")
+            if index is not None:
+                group["indices"].setdefault(run, set()).add(index)
+
+            record = failure.get("record")
+            data_array = run_data.get(run)
+            if record is None and data_array is not None and index is not None and 0 <= index < len(data_array):
+                record = data_array[index]
+
+            referenced, value = find_offending_value(code, failure.get("message"))
+            if value is None and code == "NOT_FOUND":
+                value = failure.get("key")
+            if value is not None:
+                group["values"][value] = group["values"].get(value, 0) + 1
+
+            if referenced and value is not None:
+                by_value = stubs.setdefault(referenced, {})
+                if value not in by_value:
+                    stub = {STUB_ID_FIELDS.get(referenced, referenced): value}
+                    if isinstance(record, dict):
+                        for field in STUB_CONTEXT_FIELDS:
+                            if record.get(field):
+                                stub[field] = record[field]
+                    by_value[value] = stub
+
+    return classes, stubs
+
+
+def _data_reference(data_array, data_path, output_dir):
+    """
+    The key of a rerun file pointing at the data a run sent, paths relative
+    to `output_dir`, or None when the data is unknown.
+    """
+    if isinstance(data_array, ManifestRecords):
+        return {"manifest": os.path.relpath(data_array.path, output_dir)}
+    if isinstance(data_array, BinaryRecords):
+        return {"records_file": os.path.relpath(data_array.path, output_dir)}
+    if data_path is not None:
+        return {"data_file": os.path.relpath(data_path, output_dir)}
+    return None
+
+
+def _file_label(run):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(run))
+
+
+def write_artifacts(classes, stubs, output_dir, run_data=None, run_paths=None):
+    """
+    Write the summary, one records_to_process file per error class (and per
+    run when the logs come from several runs) and one stub dataset per
+    missing referenced object into `output_dir`. The records_to_process
+    files point at the data file of their run (`run_paths`) rather than
+    embedding a copy of it each. Returns the runs whose data is unknown:
+    their files only list the indices.
+    """
+    run_data = run_data or {}
+    run_paths = run_paths or {}
+    os.makedirs(output_dir, exist_ok=True)
+
+    runs = {run for group in classes.values() for run in group["indices"]}
+    missing_data = set()
+
+    summary = {}
+    for code, group in sorted(classes.items(), key=lambda kv: -kv[1]["count"]):
+        summary[code] = {
+            "failures": group["count"],
+            "records": sum(len(indices) for indices in group["indices"].values()),
+            "values": dict(sorted(group["values"].items(), key=lambda kv: -kv[1])),
+        }
+        if len(runs) > 1:
+            summary[code]["records_per_run"] = {
+                str(run): len(indices) for run, indices in sorted(group["indices"].items(), key=lambda kv: str(kv[0]))
+            }
+
+        for run, indices in sorted(group["indices"].items(), key=lambda kv: str(kv[0])):
+            rerun = {"records_to_process": sorted(indices)}
+            reference = _data_reference(run_data.get(run), run_paths.get(run), output_dir)
+            if reference:
+                rerun.update(reference)
+            else:
+                missing_data.add(run)
+
+            name = f"records_to_process_{code}.json" if len(runs) == 1 else \
+                f"records_to_process_{code}_{_file_label(run)}.json"
+            path = os.path.join(output_dir, name)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rerun, f, ensure_ascii=False)
+            print(f"  {code} ({run}): {len(indices)} record(s) -> {path}")
+
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    for referenced, by_value in stubs.items():
+        path = os.path.join(output_dir, f"missing_{referenced}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([by_value[v] for v in sorted(by_value)], f, ensure_ascii=False, indent=2)
+        print(f"  {len(by_value)} missing {referenced} value(s) -> {path}")
+
+    return missing_data
+
+
+def load_data_array(path):
+    if is_record_file(path):
+        return open_records(path)
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if isinstance(raw, dict):
+        return raw.get("data")
+    return raw
+
+
+def parse_run_data(values):
+    """
+    { run: path } from the 'RUN=PATH' values of --run-data.
+    """
+    run_paths = {}
+    for value in values:
+        run, sep, path = value.partition("=")
+        if not sep or not run or not path:
+            raise ValueError(f"--run-data expects RUN=PATH, got '{value}'.")
+        run_paths[run] = path
+    return run_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Group the failures of one or more sender logs by BMXAA code and offending value, "
+            "and write records_to_process files (one per error class and run) plus stub datasets "
+            "for missing referenced objects (e.g. the missing locations)."
+        )
+    )
+    parser.add_argument('log_files', nargs='+',
+                        help='Failure logs (*_failed_requests.log or *_failed_requests.jsonl). Supports wildcards. '
+                             'The .log of a run is skipped when its .jsonl is given too.')
+    parser.add_argument('-o', '--output-dir', default='triage',
+                        help='Folder for the generated files. Defaults to "triage".')
+    parser.add_argument('-d', '--data', default=None,
+                        help='Data file that was sent, for logs of a single run. The records_to_process '
+                             'files point at it, so they can be re-sent as they are.')
+    parser.add_argument('--run-data', action='append', default=[], metavar='RUN=PATH',
+                        help='Data file sent by one run (the prefix of its <RUN>_failed_requests log). '
+                             'Repeat it for logs of several runs.')
+    args = parser.parse_args()
+
+    log_files = []
+    for pattern in args.log_files:
+        matched = glob.glob(pattern)
+        if not matched:
+            print(f"Warning: No files matched the pattern '{pattern}'.")
+        log_files.extend(matched)
+    log_files = prefer_structured_logs(list(dict.fromkeys(log_files)))
+
+    if not log_files:
+        print("Error: No log files to process.")
+        sys.exit(1)
+
+    try:
+        run_paths = parse_run_data(args.run_data)
+    except ValueError as e:
+        parser.error(str(e))
+
+    log_runs = {run_id_from_path(path) for path in log_files}
+    if args.data:
+        if len(log_runs) > 1:
+            parser.error(
+                f"-d applies to a single run, the logs come from {len(log_runs)}: "
+                f"give the data file of each one with --run-data RUN=PATH."
+            )
+        for run in log_runs:
+            run_paths.setdefault(run, args.data)
+
+    loaded = {}
+    for path in set(run_paths.values()):
+        loaded[path] = load_data_array(path)
+    run_data = {run: loaded[path] for run, path in run_paths.items()}
+
+    classes, stubs = triage(log_files, run_data)
+    if not classes:
+        print("No failures found.")
+        return
+
+    missing_data = write_artifacts(classes, stubs, args.output_dir, run_data, run_paths)
+    print(f"\nTriage written to '{args.output_dir}'.")
+    if missing_data:
+        print(
+            f"Warning: no data file given for run(s) {', '.join(sorted(map(str, missing_data)))}: "
+            f"their records_to_process files only list the indices. Add the \"data_file\" of the run "
+            f"to them (or rerun the triage with -d / --run-data) before re-sending them."
+        )
+
+
+if __name__ == "__main__":
+    main()
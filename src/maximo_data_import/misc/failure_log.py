@@ -0,0 +1,192 @@
+import os
+import re
+import ast
+import json
+
+RECORD_HEADER_PATTERN = re.compile(r'^Record (\d+) \((?:action=(-\w+)|(bulk create))\)(.*)$')
+NOT_FOUND_PATTERN = re.compile(r'No existing record found for (\w+)=(.*)\.$')
+BMXAA_CODE_PATTERN = re.compile(r'BMXAA\d{4}[A-Z]')
+MESSAGE_PATTERN = re.compile(r'"message"\s*:\s*"((?:[^"\\]|\\.)*)"')
+STATUS_PATTERN = re.compile(r'"(?:statusCode|status)"\s*:\s*"?(\d{3})"?')
+RUN_PATTERN = re.compile(r'^(.+?)_failed_requests')
+
+# Messages telling which referenced value Maximo could not find.
+# Each entry: error code -> (message regex capturing the value, referenced object).
+KNOWN_INVALID_VALUE_ERRORS = {
+    "BMXAA2661E": (re.compile(r'Location\s*([^\s]+)\s*is not a valid location'), "location"),
+}
+GENERIC_INVALID_VALUE_PATTERN = re.compile(
+    r'\b(Location|Person|Item|Asset|Company|Vendor|Labor|Craft|Storeroom)\s+"?([^\s"]+?)"?\s+is not (?:a )?valid',
+    re.IGNORECASE
+)
+
+
+def run_id_from_path(path):
+    """
+    Return the run identifier of a log file, i.e. the prefix of
+    '<prefix>_failed_requests.log' (the run timestamp, followed by the stage
+    name for pipeline runs), or the file name when there is none.
+    """
+    name = os.path.basename(path)
+    match = RUN_PATTERN.match(name)
+    return match.group(1) if match else name
+
+
+def find_offending_value(error_code, message):
+    """
+    Return (referenced_object, value) for "X is not a valid Y" errors,
+    or (None, None) if the message doesn't name an offending value.
+    """
+    if not message:
+        return None, None
+
+    known = KNOWN_INVALID_VALUE_ERRORS.get(error_code)
+    if known:
+        match = known[0].search(message)
+        if match:
+            return known[1], match.group(1)
+
+    match = GENERIC_INVALID_VALUE_PATTERN.search(message)
+    if match:
+        return match.group(1).lower(), match.group(2)
+    return None, None
+
+
+def _decode_message(raw):
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return raw
+
+
+def _parse_text_block(lines, run):
+    """
+    Turn the lines of one free-text failure block into a failure entry.
+    """
+    header = lines[0]
+    text = "\n".join(lines)
+    entry = {
+        "run": run,
+        "index": None,
+        "action": None,
+        "key": None,
+        "error_code": None,
+        "message": None,
+        "status": None,
+        "record": None,
+        "line": None,
+    }
+
+    match = RECORD_HEADER_PATTERN.match(header)
+    if match:
+        entry["index"] = int(match.group(1))
+        entry["action"] = match.group(2) or "-bc"
+
+    not_found = NOT_FOUND_PATTERN.search(header)
+    if not_found:
+        entry["error_code"] = "NOT_FOUND"
+        entry["key"] = not_found.group(2)
+        entry["message"] = header.strip()
+    elif "RequestException" in header:
+        entry["error_code"] = "REQUEST_EXCEPTION"
+        entry["message"] = lines[1].strip() if len(lines) > 1 else header
+    else:
+        message = MESSAGE_PATTERN.search(text)
+        if message:
+            entry["message"] = _decode_message(message.group(1))
+        code = BMXAA_CODE_PATTERN.search(text)
+        if code:
+            entry["error_code"] = code.group(0)
+        status = STATUS_PATTERN.search(text)
+        if status:
+            entry["status"] = int(status.group(1))
+
+    for line in lines[1:]:
+        stripped = line.strip()
+        if stripped.startswith("Request Body: ") and entry["record"] is None:
+            try:
+                entry["record"] = ast.literal_eval(stripped[len("Request Body: "):])
+            except (ValueError, SyntaxError):
+                pass
+        elif stripped.startswith("Source line: "):
+            try:
+                entry["line"] = int(stripped[len("Source line: "):])
+            except ValueError:
+                pass
+    return entry
+
+
+def iter_text_failures(path):
+    """
+    Stream failure entries out of a free-text '_failed_requests.log'.
+    Only the lines of the failure being parsed are kept in memory.
+    """
+    run = run_id_from_path(path)
+    block = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for raw_line in f:
+            line = raw_line.rstrip("\n")
+            starts_block = RECORD_HEADER_PATTERN.match(line) or NOT_FOUND_PATTERN.search(line)
+            if starts_block:
+                if block:
+                    yield _parse_text_block(block, run)
+                block = [line]
+            elif block:
+                block.append(line)
+    if block:
+        yield _parse_text_block(block, run)
+
+
+def iter_jsonl_failures(path):
+    """
+    Stream failure entries out of a structured '_failed_requests.jsonl'.
+    """
+    run = run_id_from_path(path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entry.setdefault("run", run)
+            entry.setdefault("line", None)
+            yield entry
+
+
+def iter_failures(path):
+    """
+    Stream failure entries from either log format, chosen by extension.
+    Every entry is a dict with: run, index, action, key, error_code,
+    message, status, record and line (CSV line, when the data had one).
+    """
+    if path.lower().endswith(".jsonl"):
+        return iter_jsonl_failures(path)
+    return iter_text_failures(path)
+
+
+def structured_sibling(path):
+    """
+    The '.jsonl' log written next to a free-text '.log' by the same run, or None.
+    """
+    if path.lower().endswith(".log"):
+        return path[:-len(".log")] + ".jsonl"
+    return None
+
+
+def prefer_structured_logs(paths):
+    """
+    Drop every free-text .log whose .jsonl is in `paths` too: both hold the
+    same failures, so reading both would count each one twice.
+    """
+    given = {os.path.abspath(path) for path in paths}
+    kept = []
+    for path in paths:
+        sibling = structured_sibling(os.path.abspath(path))
+        if sibling in given:
+            print(f"Skipping '{path}': the .jsonl of the same run is read instead.")
+            continue
+        kept.append(path)
+    return kept
@@ -1,11 +1,12 @@
-import re
 import argparse
 import os
 
+from log_scanner import load_patterns, scan_logs
+
 def extract_unique_location_ids(file_path):
     """
     Extracts all unique Location IDs from the log file where the error message is BMXAA2661E.
-    Processes the file line by line for efficiency with large files.
+    The file is memory-mapped and scanned by log_scanner.
     
     Args:
         file_path (str): Path to the log file.
@@ -13,16 +14,9 @@ def extract_unique_location_ids(file_path):
     Returns:
         set: A set of unique extracted Location IDs.
     """
-    pattern = re.compile(
-        r'"message"\s*:\s*"BMXAA2661E\s*-\s*Location\s*([A-Za-z0-9]+)\s*is not a valid location."'
-    )
-    location_ids = set()
-    
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
-            matches = pattern.findall(line)
-            if matches:
-                location_ids.update(matches)
+    results = scan_logs([file_path], load_patterns(only=["invalid_locations"]))
+    _, values = results["invalid_locations"]
+    location_ids = values.get("", set())
     
     return location_ids
 
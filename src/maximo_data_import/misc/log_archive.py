@@ -0,0 +1,379 @@
+import os
+import sys
+import glob
+import json
+import sqlite3
+import argparse
+
+from failure_log import iter_failures, prefer_structured_logs, run_id_from_path, structured_sibling
+
+DEFAULT_ARCHIVE = "failure_logs.sqlite"
+INGEST_BATCH = 5000
+DEFAULT_LIMIT = 50
+MESSAGE_WIDTH = 100  # characters of the message shown per failure in the table output
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    run TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    failures INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    run TEXT NOT NULL,
+    record_index INTEGER,
+    action TEXT,
+    key TEXT,
+    error_code TEXT,
+    status INTEGER,
+    message TEXT,
+    record TEXT,
+    line INTEGER
+);
+CREATE INDEX IF NOT EXISTS failures_run ON failures(run);
+CREATE INDEX IF NOT EXISTS failures_record_index ON failures(record_index);
+CREATE INDEX IF NOT EXISTS failures_key ON failures(key);
+CREATE INDEX IF NOT EXISTS failures_action ON failures(action);
+CREATE INDEX IF NOT EXISTS failures_error_code ON failures(error_code);
+CREATE INDEX IF NOT EXISTS failures_file ON failures(file_id);
+"""
+
+# Full-text index over the message and the record of every failure. It is an
+# external-content table: the text is only stored once, in 'failures'.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS failures_fts USING fts5(
+    message, record, content='failures', content_rowid='id'
+);
+"""
+
+FAILURE_COLUMNS = ("run", "record_index", "action", "key", "error_code", "status", "message", "record", "line")
+
+
+def open_archive(path):
+    """
+    Open (or create) the archive database. Returns (connection, has_fts):
+    without FTS5 in the local SQLite build, search falls back to LIKE.
+    """
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    try:
+        connection.executescript(FTS_SCHEMA)
+        has_fts = True
+    except sqlite3.OperationalError:
+        has_fts = False
+    return connection, has_fts
+
+
+def expand_log_files(patterns):
+    """
+    Log files matched by the patterns. The free-text .log of a run is left out
+    when its structured .jsonl is matched too, so no failure is stored twice.
+    """
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"Warning: No files matched the pattern '{pattern}'.")
+        files.extend(matches)
+    return prefer_structured_logs(list(dict.fromkeys(os.path.abspath(path) for path in files)))
+
+
+def _failure_row(file_id, failure):
+    record = failure.get("record")
+    key = failure.get("key")
+    index = failure.get("index")
+    return (
+        file_id,
+        failure.get("run"),
+        index if isinstance(index, int) else None,
+        failure.get("action"),
+        None if key is None else str(key),
+        failure.get("error_code"),
+        failure.get("status"),
+        failure.get("message"),
+        None if record is None else json.dumps(record, ensure_ascii=False, sort_keys=True),
+        failure.get("line"),
+    )
+
+
+def _remove_file(connection, has_fts, file_id):
+    if has_fts:
+        connection.execute(
+            "INSERT INTO failures_fts(failures_fts, rowid, message, record) "
+            "SELECT 'delete', id, message, record FROM failures WHERE file_id = ?", (file_id,)
+        )
+    connection.execute("DELETE FROM failures WHERE file_id = ?", (file_id,))
+    connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def ingest_file(connection, has_fts, path):
+    """
+    Store the failures of one log. A file already ingested with the same size
+    and modification time is skipped; a file that changed since (e.g. a log
+    still being written at the last ingest) is replaced. Each file is one
+    transaction. Returns the number of failures stored, or None if skipped.
+
+    The .log and .jsonl of a run hold the same failures, so only one of them
+    is kept across ingests as well: a .log is skipped once its .jsonl is in
+    the archive, and ingesting a .jsonl removes the .log of its run.
+    """
+    sibling = structured_sibling(path)
+    if sibling is not None and connection.execute("SELECT 1 FROM files WHERE path = ?", (sibling,)).fetchone():
+        print(f"Skipping '{path}': the .jsonl of the same run is already ingested.")
+        return None
+
+    stat = os.stat(path)
+    known = connection.execute("SELECT id, size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+    if known is not None and known[1] == stat.st_size and known[2] == stat.st_mtime:
+        return None
+
+    text_log = None
+    if path.lower().endswith(".jsonl"):
+        text_log = connection.execute(
+            "SELECT id, path FROM files WHERE path = ?", (path[:-len(".jsonl")] + ".log",)
+        ).fetchone()
+
+    with connection:
+        if known is not None:
+            _remove_file(connection, has_fts, known[0])
+        if text_log is not None:
+            print(f"Replacing '{text_log[1]}' with the .jsonl of the same run.")
+            _remove_file(connection, has_fts, text_log[0])
+        file_id = connection.execute(
+            "INSERT INTO files (path, run, size, mtime, failures) VALUES (?, ?, ?, ?, 0)",
+            (path, run_id_from_path(path), stat.st_size, stat.st_mtime)
+        ).lastrowid
+        insert = (f"INSERT INTO failures (file_id, {', '.join(FAILURE_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * (len(FAILURE_COLUMNS) + 1))})")
+        count = 0
+        batch = []
+        for failure in iter_failures(path):
+            batch.append(_failure_row(file_id, failure))
+            if len(batch) == INGEST_BATCH:
+                connection.executemany(insert, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            connection.executemany(insert, batch)
+            count += len(batch)
+        # Indexed once per file rather than row by row: one pass over the new rows.
+        if has_fts:
+            connection.execute(
+                "INSERT INTO failures_fts(rowid, message, record) "
+                "SELECT id, message, record FROM failures WHERE file_id = ?", (file_id,)
+            )
+        connection.execute("UPDATE files SET failures = ? WHERE id = ?", (count, file_id))
+    return count
+
+
+def ingest(connection, has_fts, log_files):
+    added = skipped = 0
+    for path in log_files:
+        count = ingest_file(connection, has_fts, path)
+        if count is None:
+            skipped += 1
+        else:
+            added += count
+            print(f"Ingested {count} failure(s) from '{path}'.")
+    connection.execute("PRAGMA optimize")
+    print(f"\n{added} failure(s) added, {skipped} unchanged or duplicate file(s) skipped.")
+
+
+def recent_runs(connection, count):
+    """
+    The last 'count' runs, by the modification time of their logs.
+    """
+    rows = connection.execute(
+        "SELECT run FROM files GROUP BY run ORDER BY MAX(mtime) DESC LIMIT ?", (count,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def build_filters(connection, args):
+    """
+    WHERE clauses and parameters for the filters common to the query commands.
+    """
+    clauses = []
+    params = []
+    runs = list(args.run or [])
+    if args.last_runs:
+        runs.extend(recent_runs(connection, args.last_runs))
+    if runs:
+        clauses.append(f"f.run IN ({', '.join('?' * len(runs))})")
+        params.extend(runs)
+    for column, values in (("record_index", args.index), ("key", args.key),
+                           ("action", args.action), ("error_code", args.code)):
+        if values:
+            clauses.append(f"f.{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    return clauses, params
+
+
+def fts_phrase(text):
+    """
+    Quote text as one FTS5 phrase, so identifiers like PUMP-001 are searched
+    as they are instead of being read as query syntax.
+    """
+    return '"' + text.replace('"', '""') + '"'
+
+
+def query_failures(connection, has_fts, args, text=None, raw=False):
+    """
+    Failures matching the filters (and the full-text query 'text'), newest run
+    first. 'text' is searched as a phrase unless 'raw' (FTS5 query syntax).
+    """
+    clauses, params = build_filters(connection, args)
+    source = "failures f"
+    if text is not None:
+        if has_fts:
+            source = "failures_fts JOIN failures f ON f.id = failures_fts.rowid"
+            clauses.insert(0, "failures_fts MATCH ?")
+            params.insert(0, text if raw else fts_phrase(text))
+        else:
+            clauses.insert(0, "(f.message LIKE ? OR f.record LIKE ?)")
+            params[:0] = [f"%{text}%", f"%{text}%"]
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = (f"SELECT {', '.join('f.' + column for column in FAILURE_COLUMNS)} FROM {source}{where} "
+           f"ORDER BY f.run DESC, f.record_index LIMIT ?")
+    cursor = connection.execute(sql, params + [args.limit])
+    return (dict(zip(FAILURE_COLUMNS, row)) for row in cursor)
+
+
+def print_failures(failures, as_json):
+    shown = 0
+    for failure in failures:
+        shown += 1
+        if as_json:
+            if failure["record"] is not None:
+                failure["record"] = json.loads(failure["record"])
+            print(json.dumps(failure, ensure_ascii=False))
+            continue
+        message = " ".join((failure["message"] or "").split())
+        if len(message) > MESSAGE_WIDTH:
+            message = message[:MESSAGE_WIDTH - 3] + "..."
+        print("\t".join("" if value is None else str(value) for value in (
+            failure["run"], failure["record_index"], failure["action"], failure["key"],
+            failure["error_code"], message)))
+    if not as_json:
+        print(f"\n{shown} failure(s) shown.")
+
+
+def print_summary(connection, args):
+    """
+    Failure counts per run and error code, with the number of distinct records.
+    """
+    clauses, params = build_filters(connection, args)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = connection.execute(
+        f"SELECT f.run, COALESCE(f.error_code, 'UNKNOWN'), COUNT(*), COUNT(DISTINCT f.record_index) "
+        f"FROM failures f{where} GROUP BY 1, 2 ORDER BY 1 DESC, 3 DESC", params
+    ).fetchall()
+    if not rows:
+        print("No failure found.")
+        return
+    for run, code, count, records in rows:
+        print(f"{run}\t{code}\t{count} failure(s)\t{records} record(s)")
+
+
+def print_runs(connection):
+    rows = connection.execute(
+        "SELECT run, COUNT(*), SUM(failures), MAX(mtime) FROM files GROUP BY run ORDER BY 4 DESC"
+    ).fetchall()
+    if not rows:
+        print("The archive is empty.")
+        return
+    for run, files, failures, _ in rows:
+        print(f"{run}\t{failures} failure(s)\t{files} file(s)")
+
+
+def add_filter_arguments(parser):
+    parser.add_argument("--run", nargs="+", default=None, help="Only these runs (see the 'runs' command).")
+    parser.add_argument("--last-runs", type=int, default=None, metavar="N",
+                        help="Only the N most recent runs.")
+    parser.add_argument("--index", nargs="+", type=int, default=None, help="Only these record indices.")
+    parser.add_argument("--key", nargs="+", default=None, help="Only these record keys.")
+    parser.add_argument("--action", nargs="+", default=None, help="Only these actions, e.g. -mu -bc.")
+    parser.add_argument("--code", nargs="+", default=None,
+                        help="Only these error codes, e.g. BMXAA2661E NOT_FOUND.")
+
+
+def add_output_arguments(parser):
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help=f"Maximum number of failures shown (default: {DEFAULT_LIMIT}).")
+    parser.add_argument("--json", action="store_true",
+                        help="Print one JSON object per failure, with its record, instead of a table.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Archive failure logs (free-text .log and structured .jsonl) in a local SQLite database, "
+            "indexed by run, record index, key, action and error code with full-text search over the "
+            "messages and records, and query it across runs."
+        )
+    )
+    parser.add_argument("--db", default=DEFAULT_ARCHIVE, help=f"Archive database (default: {DEFAULT_ARCHIVE}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser(
+        "ingest", help="Add new or changed logs to the archive (unchanged files are skipped)."
+    )
+    ingest_parser.add_argument("logs", nargs="+", help="Log files or glob patterns, e.g. '*_failed_requests.jsonl'.")
+
+    search_parser = commands.add_parser(
+        "search", help="Full-text search of the messages and records, e.g. 'not a valid location' or PUMP-001."
+    )
+    search_parser.add_argument("text", help="Text to search for, as a phrase (see --raw).")
+    search_parser.add_argument("--raw", action="store_true",
+                               help="Read the text as an FTS5 query, e.g. '\"not a valid location\" AND BEDFORD'.")
+    add_filter_arguments(search_parser)
+    add_output_arguments(search_parser)
+
+    failures_parser = commands.add_parser("failures", help="List the failures matching the filters.")
+    add_filter_arguments(failures_parser)
+    add_output_arguments(failures_parser)
+
+    summary_parser = commands.add_parser("summary", help="Failure counts per run and error code.")
+    add_filter_arguments(summary_parser)
+
+    commands.add_parser("runs", help="List the archived runs, most recent first.")
+    args = parser.parse_args()
+
+    if args.command != "ingest" and not os.path.exists(args.db):
+        print(f"Error: archive '{args.db}' does not exist. Ingest logs first.")
+        sys.exit(1)
+
+    connection, has_fts = open_archive(args.db)
+    try:
+        if args.command == "ingest":
+            log_files = expand_log_files(args.logs)
+            if not log_files:
+                print("Error: No log files to ingest.")
+                sys.exit(1)
+            if not has_fts:
+                print("Warning: this SQLite build has no FTS5, search will scan the messages instead.")
+            ingest(connection, has_fts, log_files)
+        elif args.command == "search":
+            try:
+                print_failures(query_failures(connection, has_fts, args, args.text, args.raw), args.json)
+            except sqlite3.OperationalError as ex:
+                print(f"Error: bad search query '{args.text}': {ex}")
+                sys.exit(1)
+        elif args.command == "failures":
+            print_failures(query_failures(connection, has_fts, args), args.json)
+        elif args.command == "summary":
+            print_summary(connection, args)
+        else:
+            print_runs(connection)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
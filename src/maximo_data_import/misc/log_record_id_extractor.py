@@ -1,18 +1,16 @@
-import re
 import sys
 
-def extract_record_ids(file_path):
+from log_scanner import load_patterns, scan_logs
+
+def extract_record_ids(file_path, action="-mu"):
+    """
+    Unique record indices of the failures of 'action' in a log, in order
+    (the log is memory-mapped and scanned by log_scanner).
+    """
     try:
-        with open(file_path, 'r') as file:
-            log_data = file.read()
-        
-        pattern = r"Record (\d+) \(action=-mu\)"
-        
-        record_ids = re.findall(pattern, log_data)
-        
-        record_ids = [int(record_id) for record_id in record_ids]
-        
-        return record_ids
+        results = scan_logs([file_path], load_patterns(only=["record_ids"]))
+        _, values = results["record_ids"]
+        return sorted(values.get(action, ()))
     except FileNotFoundError:
         print(f"File not found: {file_path}")
         return []
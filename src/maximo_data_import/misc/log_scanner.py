@@ -0,0 +1,301 @@
+import os
+import re
+import sys
+import glob
+import json
+import mmap
+import argparse
+import multiprocessing
+
+from failure_log import GENERIC_INVALID_VALUE_PATTERN
+
+SCAN_RANGE_SIZE = 64 * 1024 * 1024  # bytes of log handed to a worker at a time
+
+# name -> pattern spec:
+#   regex       - matched against the log bytes, line by line ('^' / '$' are line anchors)
+#   value       - group holding the extracted value (default: 1 if the regex has a group, else the whole match)
+#   by          - optional group the values are grouped by (e.g. the action of a record)
+#   type        - "str" (default) or "int"
+#   ignore_case - match without case
+#   contains    - optional text every matching line contains (case-sensitive): only
+#                 the lines containing it are run through the regex, found with a
+#                 plain substring search, which is much faster than a regex scan
+DEFAULT_PATTERNS = {
+    # Records whose request failed; not-found records (nothing sent) are listed apart.
+    "record_ids": {
+        "regex": r"^Record (\d+) \((?:action=(-\w+)|(bulk create))\)(?! - No existing record found)",
+        "value": 1, "by": [2, 3], "type": "int", "contains": "Record ",
+    },
+    "not_found_ids": {
+        "regex": r"^Record (\d+) \(action=(-\w+)\) - No existing record found",
+        "value": 1, "by": 2, "type": "int", "contains": "No existing record found",
+    },
+    "bmxaa_codes": {
+        "regex": r"BMXAA\d{4}[A-Z]",
+    },
+    "invalid_locations": {
+        "regex": r'BMXAA2661E\s*-\s*Location\s*([A-Za-z0-9]+)\s*is not a valid location',
+    },
+    "offending_values": {
+        "regex": GENERIC_INVALID_VALUE_PATTERN.pattern,
+        "value": 2, "by": 1, "ignore_case": True, "contains": "valid",
+    },
+}
+PATTERN_TYPES = ("str", "int")
+
+# Set in every worker process by init_worker.
+_worker_patterns = None
+
+
+def load_patterns(path=None, only=None):
+    """
+    The default patterns, updated with the ones of a JSON file
+    ({name: spec}, see DEFAULT_PATTERNS), optionally restricted to 'only'.
+    """
+    patterns = dict(DEFAULT_PATTERNS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+        if not isinstance(extra, dict):
+            raise ValueError(f"Pattern file '{path}' must contain a JSON object of name: pattern spec.")
+        patterns.update(extra)
+    if only:
+        unknown = [name for name in only if name not in patterns]
+        if unknown:
+            raise ValueError(f"Unknown pattern(s): {', '.join(unknown)}. Available: {', '.join(sorted(patterns))}")
+        patterns = {name: patterns[name] for name in only}
+    for name, spec in patterns.items():
+        compile_pattern(name, spec)
+    return patterns
+
+
+def compile_pattern(name, spec):
+    """
+    Compile a pattern spec into (regex, value group, by groups, type, contains).
+    The regex is compiled for bytes, so it runs directly on the mapped log.
+    """
+    if not isinstance(spec, dict) or "regex" not in spec:
+        raise ValueError(f"Pattern '{name}' needs a \"regex\".")
+    flags = re.MULTILINE | (re.IGNORECASE if spec.get("ignore_case") else 0)
+    try:
+        regex = re.compile(spec["regex"].encode("utf-8"), flags)
+    except re.error as ex:
+        raise ValueError(f"Pattern '{name}': bad regex: {ex}") from None
+    value = spec.get("value", 1 if regex.groups else 0)
+    by = spec.get("by")
+    by = () if by is None else tuple(by) if isinstance(by, list) else (by,)
+    value_type = spec.get("type", "str")
+    if value_type not in PATTERN_TYPES:
+        raise ValueError(f"Pattern '{name}': \"type\" must be one of: {', '.join(PATTERN_TYPES)}")
+    for group in (value,) + by:
+        if isinstance(group, int) and group > regex.groups:
+            raise ValueError(f"Pattern '{name}': the regex has no group {group}.")
+        if isinstance(group, str) and group not in regex.groupindex:
+            raise ValueError(f"Pattern '{name}': the regex has no group '{group}'.")
+    contains = spec.get("contains")
+    return regex, value, by, value_type, contains.encode("utf-8") if contains else None
+
+
+def split_ranges(path, range_size=SCAN_RANGE_SIZE):
+    """
+    Split a log into (path, start, end) byte ranges of about 'range_size',
+    cut right after a newline so no line is split between two ranges.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    ranges = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + range_size, size)
+            if end < size:
+                newline = mm.find(b"\n", end)
+                end = size if newline == -1 else newline + 1
+            ranges.append((path, start, end))
+            start = end
+    return ranges
+
+
+def iter_matches(mm, regex, contains, start, end):
+    """
+    Matches of 'regex' in bytes start..end of the mapped log. With 'contains',
+    only the lines holding that text are matched.
+    """
+    if contains is None:
+        yield from regex.finditer(mm, start, end)
+        return
+    pos = start
+    while True:
+        hit = mm.find(contains, pos, end)
+        if hit == -1:
+            return
+        newline = mm.rfind(b"\n", start, hit)
+        line_start = start if newline == -1 else newline + 1
+        newline = mm.find(b"\n", hit, end)
+        line_end = end if newline == -1 else newline
+        yield from regex.finditer(mm, line_start, line_end)
+        pos = line_end + 1
+
+
+def scan_range(patterns, path, start, end):
+    """
+    Run every pattern over bytes start..end of a log. The range is mapped,
+    not read, and each regex scans the same pages in turn while they are
+    still in the cache. Returns {name: (match count, {by: set of values})}.
+    """
+    results = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for name, (regex, value_group, by_groups, value_type, contains) in patterns.items():
+            count = 0
+            values = {}
+            for match in iter_matches(mm, regex, contains, start, end):
+                value = match.group(value_group)
+                if value is None:
+                    continue
+                value = value.decode("utf-8", errors="replace")
+                if value_type == "int":
+                    try:
+                        value = int(value)
+                    except ValueError:
+                        continue
+                by = ""
+                for group in by_groups:
+                    found = match.group(group)
+                    if found is not None:
+                        by = found.decode("utf-8", errors="replace")
+                        break
+                values.setdefault(by, set()).add(value)
+                count += 1
+            results[name] = (count, values)
+    return results
+
+
+def init_worker(pattern_specs):
+    global _worker_patterns
+    _worker_patterns = {name: compile_pattern(name, spec) for name, spec in pattern_specs.items()}
+
+
+def scan_task(task):
+    return scan_range(_worker_patterns, *task)
+
+
+def merge_results(total, results):
+    for name, (count, values) in results.items():
+        total_count, total_values = total.setdefault(name, (0, {}))
+        for by, found in values.items():
+            total_values.setdefault(by, set()).update(found)
+        total[name] = (total_count + count, total_values)
+
+
+def scan_logs(log_files, pattern_specs, workers=1, range_size=SCAN_RANGE_SIZE):
+    """
+    Scan every log once with all the patterns, the byte ranges of the logs
+    being spread over 'workers' processes. Values are deduplicated per
+    pattern (and per 'by' group). Returns {name: (match count, {by: set})}.
+    """
+    tasks = [task for path in log_files for task in split_ranges(path, range_size)]
+    total = {name: (0, {}) for name in pattern_specs}
+    if workers <= 1 or len(tasks) <= 1:
+        init_worker(pattern_specs)
+        for task in tasks:
+            merge_results(total, scan_task(task))
+        return total
+
+    with multiprocessing.Pool(min(workers, len(tasks)), initializer=init_worker, initargs=(pattern_specs,)) as pool:
+        for results in pool.imap_unordered(scan_task, tasks):
+            merge_results(total, results)
+    return total
+
+
+def sorted_values(values):
+    return sorted(values, key=lambda value: (isinstance(value, str), value))
+
+
+def results_json(results, log_files):
+    """
+    JSON-able results: values sorted, grouped by their 'by' value when the pattern has one.
+    """
+    patterns = {}
+    for name, (count, values) in results.items():
+        if set(values) <= {""}:
+            unique = sorted_values(values.get("", ()))
+        else:
+            unique = {by: sorted_values(found) for by, found in sorted(values.items())}
+        patterns[name] = {"matches": count, "values": unique}
+    return {"files": log_files, "patterns": patterns}
+
+
+def write_text_files(results, directory):
+    """
+    One '<pattern>[_<by>].txt' file per pattern (and 'by' value), one value per
+    line, like the output of the single-pattern extractors.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for name, (_, values) in results.items():
+        for by, found in sorted(values.items()):
+            suffix = re.sub(r"[^A-Za-z0-9]+", "_", by).strip("_")
+            path = os.path.join(directory, f"{name}_{suffix}.txt" if suffix else f"{name}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                for value in sorted_values(found):
+                    f.write(f"{value}\n")
+            written.append(path)
+    return written
+
+
+def print_summary(results):
+    for name, (count, values) in results.items():
+        groups = ", ".join(f"{by or '(all)'}: {len(found)}" for by, found in sorted(values.items()))
+        print(f"{name}: {count} match(es), unique values - {groups or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Scan failure logs once with a set of patterns (record indices per action, BMXAA codes, offending "
+            "values, ...) and save the deduplicated results of every pattern. Logs are memory-mapped and split "
+            "into byte ranges scanned in parallel processes."
+        )
+    )
+    parser.add_argument("logs", nargs="+", help="Log files or glob patterns, e.g. '*_failed_requests.log'.")
+    parser.add_argument("-o", "--output", default="scan_results.json",
+                        help="JSON file of the results (default: scan_results.json).")
+    parser.add_argument("--text-dir", default=None,
+                        help="Also write one text file per pattern (and per action for record_ids), one value per line.")
+    parser.add_argument("--patterns", default=None,
+                        help="JSON file of extra or overriding patterns: "
+                             "{\"name\": {\"regex\": \"...\", \"value\": 1, \"by\": 2, \"type\": \"int\", "
+                             "\"ignore_case\": false, \"contains\": \"literal\"}}.")
+    parser.add_argument("--only", nargs="+", default=None, metavar="NAME",
+                        help=f"Only run these patterns (default ones: {', '.join(DEFAULT_PATTERNS)}).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs).")
+    args = parser.parse_args()
+
+    log_files = []
+    for pattern in args.logs:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"Error: no file matches '{pattern}'.")
+            sys.exit(1)
+        log_files.extend(matches)
+
+    try:
+        pattern_specs = load_patterns(args.patterns, args.only)
+    except (OSError, ValueError) as ex:
+        parser.error(str(ex))
+
+    results = scan_logs(log_files, pattern_specs, args.workers)
+    print_summary(results)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results_json(results, log_files), f, ensure_ascii=False, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+    if args.text_dir:
+        written = write_text_files(results, args.text_dir)
+        print(f"{len(written)} text file(s) written to '{args.text_dir}'.")
+
+
+if __name__ == "__main__":
+    main()
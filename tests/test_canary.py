@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "2. send to maximo"))
+
+from canary import _fillable_levels, allocate_shares, stratified_sample
+
+
+class AllocateSharesTest(unittest.TestCase):
+
+    def check(self, sizes, budget):
+        shares = allocate_shares(sizes, budget)
+        self.assertEqual(len(shares), len(sizes))
+        self.assertEqual(sum(shares), min(budget, sum(sizes)))
+        for size, share in zip(sizes, shares):
+            self.assertLessEqual(share, size)
+        return shares
+
+    def test_shares_add_up_to_the_budget(self):
+        for sizes, budget in [
+            ([10, 10, 10], 20),
+            ([1000, 1], 3),
+            ([7, 5, 3, 1], 9),
+            ([334, 333, 333], 100),
+            ([50] * 7, 20),
+            ([100, 90, 1, 1, 1, 1, 1], 10),
+        ]:
+            with self.subTest(sizes=sizes, budget=budget):
+                self.check(sizes, budget)
+
+    def test_every_stratum_gets_a_record_when_the_budget_allows(self):
+        shares = self.check([1000, 1, 1, 1], 10)
+        self.assertEqual(shares, [7, 1, 1, 1])
+
+    def test_budget_smaller_than_the_strata_goes_to_the_largest(self):
+        self.assertEqual(allocate_shares([9, 5, 2, 1], 2), [1, 1, 0, 0])
+
+    def test_proportional_with_largest_remainder(self):
+        self.assertEqual(self.check([60, 30, 10], 10), [6, 3, 1])
+        self.assertEqual(self.check([5, 3, 2], 7), [4, 2, 1])
+
+    def test_stratified_sample_has_the_budget(self):
+        pairs = [(i, {"siteid": "S1" if i % 3 else "S2"}) for i in range(300)]
+        sample = stratified_sample(pairs, ["siteid"], 0.1, 1, 100)
+        self.assertEqual(len(sample), 30)
+        self.assertEqual(sample, sorted(sample, key=lambda pair: pair[0]))
+
+    def test_fillable_levels(self):
+        self.assertEqual(_fillable_levels([50, 100, 200], 500), [50, 100])
+        self.assertEqual(_fillable_levels([50, 100, 200], 20), [50])
+        self.assertEqual(_fillable_levels([10, 20], 1000), [10, 20])
+
+
+if __name__ == "__main__":
+    unittest.main()
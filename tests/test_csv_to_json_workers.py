@@ -0,0 +1,94 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "2. send to maximo"))
+
+from column_transforms import register_transform
+from csv_to_json import iter_csv_records
+
+PIPELINE_TIMEOUT = 60  # seconds; a hung pipeline fails the test instead of the run
+
+
+@register_transform("fail_on_bad")
+def fail_on_bad_transform(arg=None):
+    def check(value):
+        if value == "bad":
+            raise ValueError(f"cannot convert '{value}'")
+        return value
+    return check
+
+
+def run_pipeline(path, **kwargs):
+    """
+    Drain iter_csv_records in a thread; returns ('ok', records) or ('error', exception).
+    """
+    outcome = []
+
+    def drain():
+        try:
+            outcome.append(("ok", list(iter_csv_records(path, **kwargs))))
+        except Exception as ex:
+            outcome.append(("error", ex))
+
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    thread.join(PIPELINE_TIMEOUT)
+    if thread.is_alive():
+        raise AssertionError("The conversion pipeline hung.")
+    return outcome[0]
+
+
+class WorkerFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def write_csv(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def write_rows(self, bad_row):
+        lines = ["assetnum,description"]
+        lines += [f"A{i},{'bad' if i == bad_row else 'ok'}" for i in range(5000)]
+        self.write_csv(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def test_transform_error_is_raised(self):
+        self.write_rows(bad_row=450)
+        for backend in ("threads", "processes"):
+            with self.subTest(backend=backend):
+                status, result = run_pipeline(
+                    self.path, backend=backend, num_threads=2, chunk_size=100, enc="utf-8",
+                    column_transforms={"description": ((("fail_on_bad", None),), 0)}
+                )
+                self.assertEqual(status, "error")
+                self.assertIsInstance(result, ValueError)
+                self.assertIn("cannot convert 'bad'", str(result))
+
+    def test_records_without_error(self):
+        self.write_rows(bad_row=None)
+        for backend in ("threads", "processes"):
+            with self.subTest(backend=backend):
+                status, result = run_pipeline(self.path, backend=backend, num_threads=2, chunk_size=100,
+                                              enc="utf-8")
+                self.assertEqual(status, "ok")
+                self.assertEqual([record["assetnum"] for record in result], [f"A{i}" for i in range(5000)])
+
+    def test_mmap_decode_error_keeps_its_message(self):
+        rows = b"".join(b"A%d,ok\n" % i for i in range(20000))
+        self.write_csv(b"assetnum,description\n" + rows + b"A-bad,\xff\xfe\n")
+        for backend in ("threads", "processes"):
+            with self.subTest(backend=backend):
+                status, result = run_pipeline(self.path, backend=backend, num_threads=2, chunk_size=100,
+                                              enc="utf-8", read_mode="mmap")
+                self.assertEqual(status, "error")
+                self.assertIsInstance(result, UnicodeDecodeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
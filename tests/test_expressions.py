@@ -0,0 +1,103 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "1.1. field mapper transform (if needed)"))
+
+import expressions
+from expressions import ExpressionError, compile_expression, expression_function, set_date_formats
+
+calls = []
+
+
+@expression_function("counted")
+def counted(value):
+    calls.append(value)
+    return f"<{value}>"
+
+
+def compile_path(path):
+    def get(obj):
+        for part in path.split("."):
+            obj = obj.get(part) if isinstance(obj, dict) else None
+        return obj
+    return get
+
+
+class ConstantFoldingTest(unittest.TestCase):
+
+    def setUp(self):
+        del calls[:]
+
+    def test_constant_call_is_evaluated_once_at_compile_time(self):
+        evaluate = compile_expression("counted('a') + '-' + counted(upper('b'))", compile_path)
+        self.assertEqual(calls, ["a", "B"])
+        for _ in range(3):
+            self.assertEqual(evaluate({}), "<a>-<B>")
+        self.assertEqual(calls, ["a", "B"])
+
+    def test_field_reference_is_not_folded(self):
+        evaluate = compile_expression("counted(site) + counted('x')", compile_path)
+        self.assertEqual(calls, ["x"])
+        self.assertEqual(evaluate({"site": "S1"}), "<S1><x>")
+        self.assertEqual(evaluate({"site": "S2"}), "<S2><x>")
+        self.assertEqual(calls, ["x", "S1", "S2"])
+
+    def test_constant_condition_keeps_only_its_branch(self):
+        evaluate = compile_expression("counted(a) if 1 > 2 else counted('b')", compile_path)
+        self.assertEqual(calls, ["b"])
+        self.assertEqual(evaluate({"a": "never"}), "<b>")
+        self.assertEqual(calls, ["b"])
+
+    def test_folded_constants(self):
+        for text, expected in [
+            ("round(2.5)", 3),
+            ("1 + 2 * 3", 7),
+            ("[1, 2][-1]", 2),
+            ("null + 1", None),
+            ("'a' in ['a', 'b'] and not false", True),
+            ("10 // 0", None),
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(compile_expression(text, compile_path)({}), expected)
+
+    def test_errors_are_reported_at_compile_time(self):
+        for text in ("unknown(1)", "left('a')", "__import__('os')", "a ** 2", "lambda: 1"):
+            with self.subTest(text=text):
+                with self.assertRaises(ExpressionError):
+                    compile_expression(text, compile_path)
+
+
+class SingleExprObjectTest(unittest.TestCase):
+
+    def test_bare_path_is_refused(self):
+        from transform import compile_mapping
+        with self.assertRaises(ValueError):
+            compile_mapping({"out": {"expr": "asset.assetnum"}}, {})
+        map_record = compile_mapping({"out": {"expr": "upper(site)"}, "nested": {"expr": "site", "x": "x"},
+                                      "none": {"expr": "null"}}, {})
+        self.assertEqual(map_record({"site": "s1", "x": 1}),
+                         {"out": "S1", "nested": {"expr": "s1", "x": 1}, "none": None})
+
+
+class DateFormatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = expressions._date_formats
+
+    def tearDown(self):
+        set_date_formats(self.previous)
+
+    def test_date_formats_are_passed_in(self):
+        evaluate = compile_expression("date(d)", compile_path)
+        set_date_formats(())
+        self.assertEqual(evaluate({"d": "2024-03-15"}), "2024-03-15T00:00:00")
+        self.assertIsNone(evaluate({"d": "03/15/2024"}))
+        set_date_formats(["%m/%d/%Y"])
+        self.assertEqual(evaluate({"d": "03/15/2024"}), "2024-03-15T00:00:00")
+        self.assertEqual(expressions._date_formats, ("%m/%d/%Y",))
+
+
+if __name__ == "__main__":
+    unittest.main()
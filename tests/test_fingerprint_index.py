@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "2. send to maximo"))
+
+from fingerprint_index import PREVIOUS_SUFFIX, FingerprintIndex, iter_index_entries
+
+
+def run_index(path, records, commit=True, deletions_file=None, context=""):
+    """
+    Filter `records` through a fingerprint index; returns the records output.
+    """
+    with redirect_stdout(StringIO()):
+        index = FingerprintIndex(path, ["assetnum"], context=context)
+        kept = list(index.filter(records))
+        if commit:
+            index.commit(deletions_file)
+        else:
+            index.abort()
+    return kept
+
+
+class FingerprintIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "assets.fpi")
+        self.first = [{"assetnum": "A1", "desc": "pump"}, {"assetnum": "A2", "desc": "fan"}]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_commit_keeps_only_new_and_changed_rows(self):
+        self.assertEqual(run_index(self.path, self.first), self.first)
+        self.assertFalse(os.path.exists(self.path + PREVIOUS_SUFFIX))
+
+        second = [{"assetnum": "A1", "desc": "pump"}, {"assetnum": "A2", "desc": "big fan"},
+                  {"assetnum": "A3", "desc": "valve"}, {"desc": "no key"}]
+        deletions = os.path.join(self.tmp.name, "deleted.json")
+        self.assertEqual(run_index(self.path, second, deletions_file=deletions), second[1:])
+        with open(deletions, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), [])
+
+        self.assertEqual(run_index(self.path, second[:1], deletions_file=deletions), [])
+        with open(deletions, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), [{"assetnum": "A2"}, {"assetnum": "A3"}])
+
+    def test_commit_rotates_the_replaced_index(self):
+        run_index(self.path, self.first)
+        with open(self.path, encoding="utf-8") as f:
+            first_index = f.read()
+        run_index(self.path, self.first[:1])
+
+        with open(self.path + PREVIOUS_SUFFIX, encoding="utf-8") as f:
+            self.assertEqual(f.read(), first_index)
+        entries = iter_index_entries(self.path)
+        next(entries)
+        self.assertEqual([key for key, _ in entries], [("A1",)])
+
+    def test_abort_leaves_the_index_as_it_was(self):
+        run_index(self.path, self.first)
+        with open(self.path, encoding="utf-8") as f:
+            before = f.read()
+
+        self.assertEqual(run_index(self.path, [{"assetnum": "A1", "desc": "changed"}], commit=False),
+                         [{"assetnum": "A1", "desc": "changed"}])
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), before)
+        self.assertFalse(os.path.exists(self.path + PREVIOUS_SUFFIX))
+        self.assertEqual(os.listdir(self.tmp.name), ["assets.fpi"])
+        self.assertEqual(run_index(self.path, self.first), [])
+
+    def test_repeated_key_is_indexed_once(self):
+        repeated = self.first + [{"assetnum": "A1", "desc": "pump, second row"}]
+        self.assertEqual(run_index(self.path, repeated), repeated)
+        entries = iter_index_entries(self.path)
+        next(entries)
+        self.assertEqual([key for key, _ in entries], [("A1",), ("A2",)])
+
+        # The first occurrence is compared, the repeat is always output.
+        self.assertEqual(run_index(self.path, repeated), repeated[2:])
+
+    def test_other_context_outputs_every_row(self):
+        run_index(self.path, self.first)
+        self.assertEqual(run_index(self.path, self.first, context="other specs"), self.first)
+
+
+if __name__ == "__main__":
+    unittest.main()
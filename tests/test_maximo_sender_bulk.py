@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "2. send to maximo"))
+
+import maximo_sender
+
+
+class FakeResponse:
+
+    def __init__(self, data):
+        self.data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """
+    Records the BULK payloads and answers every record with a 201.
+    """
+
+    def __init__(self):
+        self.payloads = []
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        payload = json.loads(data)
+        self.payloads.append(payload)
+        return FakeResponse([{"_responsemeta": {"status": "201"}} for _ in payload])
+
+
+class BulkDedupTest(unittest.TestCase):
+
+    def send(self, data_array, policy):
+        session = FakeSession()
+        config = {"base_url": "https://maximo/os", "obj_structure": "mxapiwodetail",
+                  "obj_search_attr": "wonum", "dedup": {"policy": policy}}
+        with mock.patch.object(maximo_sender.requests, "Session", return_value=session):
+            counts = maximo_sender.send_records("-bc", config, data_array)
+        return counts, [item["_data"] for payload in session.payloads for item in payload]
+
+    def test_merged_records_are_sent_merged(self):
+        data = [{"wonum": "1", "a": "A"}, {"wonum": "2"}, {"wonum": "1", "b": "B"}]
+        counts, sent = self.send(data, "merge")
+        self.assertEqual(counts, (2, 0))
+        self.assertEqual(sent, [{"wonum": "1", "a": "A", "b": "B"}, {"wonum": "2"}])
+
+    def test_last_occurrence_is_sent(self):
+        data = [{"wonum": "1", "a": "A"}, {"wonum": "2"}, {"wonum": "1", "b": "B"}]
+        counts, sent = self.send(data, "last")
+        self.assertEqual(counts, (2, 0))
+        self.assertEqual(sent, [{"wonum": "2"}, {"wonum": "1", "b": "B"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
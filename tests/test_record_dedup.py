@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "2. send to maximo"))
+
+import record_dedup
+from record_dedup import dedup_pairs, merge_records, run_dedup
+
+PAIRS = [
+    (0, {"wonum": "W1", "siteid": "S", "description": "first", "status": "WAPPR"}),
+    (1, {"wonum": "W2", "siteid": "S", "description": "other"}),
+    (2, {"wonum": "W1", "siteid": "S", "description": "", "priority": 2}),
+    (3, {"description": "no key"}),
+    (4, {"wonum": " W1 ", "siteid": "S", "status": "APPR", "location": {"location": "L1"}}),
+]
+KEY = ["wonum", "siteid"]
+
+
+class DedupPairsTest(unittest.TestCase):
+
+    def test_last(self):
+        kept, dropped = dedup_pairs(PAIRS, KEY, "last")
+        self.assertEqual([idx for idx, _ in kept], [1, 3, 4])
+        self.assertEqual(kept[2][1], PAIRS[4][1])
+        self.assertEqual(dropped, [(0, 4), (2, 4)])
+
+    def test_first(self):
+        kept, dropped = dedup_pairs(PAIRS, KEY, "first")
+        self.assertEqual(kept, [PAIRS[0], PAIRS[1], PAIRS[3]])
+        self.assertEqual(dropped, [(2, 0), (4, 0)])
+
+    def test_merge(self):
+        kept, dropped = dedup_pairs(PAIRS, KEY, "merge")
+        self.assertEqual([idx for idx, _ in kept], [0, 1, 3])
+        self.assertEqual(kept[0][1], {
+            "wonum": " W1 ", "siteid": "S", "description": "first", "status": "APPR",
+            "priority": 2, "location": {"location": "L1"},
+        })
+        self.assertEqual(dropped, [(2, 0), (4, 0)])
+        # The records passed in are left as they were.
+        self.assertEqual(PAIRS[0][1]["status"], "WAPPR")
+
+    def test_digest_collision_keeps_both_records(self):
+        with mock.patch.object(record_dedup, "key_digest", return_value=1):
+            kept, dropped = dedup_pairs(PAIRS, KEY, "last")
+        self.assertEqual([idx for idx, _ in kept], [1, 3, 4])
+        self.assertEqual(dropped, [(0, 4), (2, 4)])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            dedup_pairs(PAIRS, KEY, "newest")
+
+    def test_merge_records_merges_nested_objects(self):
+        merged = merge_records({"a": {"x": 1, "y": 2}, "b": 1}, {"a": {"y": 3}, "b": None, "c": []})
+        self.assertEqual(merged, {"a": {"x": 1, "y": 3}, "b": 1})
+
+    def test_run_dedup_key_defaults_to_search_attr(self):
+        with redirect_stdout(StringIO()):
+            kept = run_dedup(PAIRS, {"obj_search_attr": "wonum", "dedup": {"policy": "first"}})
+        self.assertEqual([idx for idx, _ in kept], [0, 1, 3])
+        with self.assertRaises(ValueError):
+            run_dedup(PAIRS, {"obj_search_attr": "wonum", "dedup": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
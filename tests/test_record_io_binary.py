@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "2. send to maximo"))
+
+import record_io
+from record_io import BINARY_MAGIC, OFFSET_ENTRY, RECORD_LENGTH, TRAILER, BinaryRecords, BinaryRecordWriter
+
+
+@unittest.skipIf(record_io.msgpack is None, "msgpack is not installed")
+class BinaryRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "records.mpk")
+        # Records of very different sizes, so every offset is different.
+        self.records = [
+            {"assetnum": "A1"},
+            {"assetnum": "Ä2", "description": "pompe à eau " * 200, "qty": 3.5},
+            {},
+            {"assetnum": "A4", "spareparts": [{"itemnum": str(i)} for i in range(50)], "active": True},
+            {"assetnum": "A5", "note": None},
+        ]
+        writer = BinaryRecordWriter(self.path)
+        for record in self.records:
+            writer.write(record)
+        writer.close()
+        self.binary = BinaryRecords(self.path)
+
+    def tearDown(self):
+        self.binary.close()
+        self.tmp.cleanup()
+
+    def test_offset_index_points_at_each_record(self):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        index_offset, count, magic = TRAILER.unpack_from(raw, len(raw) - TRAILER.size)
+        self.assertEqual((count, magic), (len(self.records), BINARY_MAGIC))
+        self.assertEqual(index_offset + count * OFFSET_ENTRY.size + TRAILER.size, len(raw))
+
+        offsets = [OFFSET_ENTRY.unpack_from(raw, index_offset + i * OFFSET_ENTRY.size)[0] for i in range(count)]
+        self.assertEqual(offsets[0], len(BINARY_MAGIC))
+        for i in range(count - 1):
+            (length,) = RECORD_LENGTH.unpack_from(raw, offsets[i])
+            self.assertEqual(offsets[i + 1], offsets[i] + RECORD_LENGTH.size + length)
+
+    def test_random_access(self):
+        self.assertEqual(len(self.binary), len(self.records))
+        for i in reversed(range(len(self.records))):
+            self.assertEqual(self.binary[i], self.records[i])
+        self.assertEqual(self.binary[-1], self.records[-1])
+        self.assertEqual(self.binary[1:4], self.records[1:4])
+        with self.assertRaises(IndexError):
+            self.binary[len(self.records)]
+
+    def test_iteration(self):
+        self.assertEqual(list(self.binary), self.records)
+
+    def test_truncated_file_is_rejected(self):
+        truncated = os.path.join(self.tmp.name, "truncated.mpk")
+        with open(self.path, "rb") as f, open(truncated, "wb") as out:
+            out.write(f.read()[:-3])
+        with self.assertRaises(ValueError):
+            BinaryRecords(truncated)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "maximo_data_import",
+                                "1.1. field mapper transform (if needed)"))
+
+from value_rules import RULES_KEY, RuleMatcher, compile_value_map
+
+
+def regex(pattern, value, **extra):
+    return dict({"match": "regex", "pattern": pattern, "value": value}, **extra)
+
+
+class RuleMatcherOrderTest(unittest.TestCase):
+
+    def test_separate_rule_before_combined_rule_wins(self):
+        matcher = RuleMatcher("f", [regex(r"(a)\1", "backref"), regex(r"a+", "combined")])
+        self.assertEqual(matcher.separate_rules[0][0], 0)
+        self.assertEqual(matcher.match("aa"), (True, "backref"))
+        self.assertEqual(matcher.match("aaa"), (True, "combined"))
+
+    def test_combined_rule_before_separate_rule_wins(self):
+        matcher = RuleMatcher("f", [regex(r"a+", "combined"), regex(r"(a)\1", "backref")])
+        self.assertEqual(matcher.match("aa"), (True, "combined"))
+
+    def test_first_of_several_separate_rules_wins(self):
+        matcher = RuleMatcher("f", [
+            regex(r"x+", "combined"),
+            regex(r"(?P<c>b)(?P=c)", "named"),
+            regex(r"(b)\1", "backref"),
+        ])
+        self.assertEqual([index for index, _ in matcher.separate_rules], [1, 2])
+        self.assertEqual(matcher.match("bb"), (True, "named"))
+
+    def test_exact_and_prefix_rules_keep_spec_order_with_regexes(self):
+        matcher = RuleMatcher("f", [
+            regex(r"(p)\1.*", "backref"),
+            {"match": "prefix", "pattern": "pp", "value": "prefix"},
+            {"pattern": "ppq", "value": "exact"},
+        ])
+        self.assertEqual(matcher.match("ppq"), (True, "backref"))
+        matcher = RuleMatcher("f", [
+            {"pattern": "ppq", "value": "exact"},
+            regex(r"(p)\1.*", "backref"),
+        ])
+        self.assertEqual(matcher.match("ppq"), (True, "exact"))
+
+    def test_groups_inside_combined_rules_keep_their_rule(self):
+        matcher = RuleMatcher("f", [regex(r"(a)(b)", "ab"), regex(r"(c)", "c", ignore_case=True)])
+        self.assertEqual(matcher.match("ab"), (True, "ab"))
+        self.assertEqual(matcher.match("C"), (True, "c"))
+        self.assertEqual(matcher.match("d"), (False, None))
+
+    def test_compile_value_map(self):
+        map_value = compile_value_map("f", {"X": "exact", RULES_KEY: [regex(r"\d+", "number")]})
+        self.assertEqual(map_value("X"), "exact")
+        self.assertEqual(map_value(42), "number")
+        self.assertEqual(map_value("other"), "other")
+
+
+if __name__ == "__main__":
+    unittest.main()